@@ -1,22 +1,21 @@
 # app.py - Gradio UI for Smart Building Access Control System
 
-import gradio as gr
-from dfa import AccessControlDFA
-from zones import ZoneConfig
+from policy_lang import describe_policy
+from sessions import SessionManager
 
-# Initialize the system
-dfa = AccessControlDFA()
-config = ZoneConfig()
+# Initialize the system (one session per door, safe across concurrent requests)
+sessions = SessionManager(cache_size=4096)
+config = sessions.config
 
 def format_zone_policies():
     """Format zone policies for display"""
     policies_text = "🏢 **ZONE ACCESS POLICIES**\n\n"
     for zone, policy in config.zone_policies.items():
         zone_name = zone.replace('_', ' ')
-        policy_names = [config.get_auth_name(symbol) for symbol in policy]
+        policy_names, policy_symbols = describe_policy(config, policy)
         policies_text += f"**{zone_name}:**\n"
-        policies_text += f"  • Sequence: {' → '.join(policy_names)}\n"
-        policies_text += f"  • Symbols: {' → '.join(policy)}\n\n"
+        policies_text += f"  • Sequence: {policy_names}\n"
+        policies_text += f"  • Symbols: {policy_symbols}\n\n"
     return policies_text
 
 def format_auth_methods():
@@ -26,7 +25,7 @@ def format_auth_methods():
         methods_text += f"**{symbol}** - {name}\n"
     return methods_text
 
-def process_authentication(zone, sequence_input):
+def process_authentication(zone, sequence_input, door_id=None):
     """Process authentication sequence and return results"""
     if not zone:
         return "❌ Please select a zone first!", "", "DENIED"
@@ -44,12 +43,12 @@ def process_authentication(zone, sequence_input):
     if not expected_policy:
         return f"❌ Invalid zone: {zone}", "", "DENIED"
     
-    # Process the sequence
-    results = dfa.process_sequence(sequence, zone_key)
+    # Process the sequence on this door's session (defaults to the zone's door)
+    results = sessions.process_sequence(door_id or zone_key, sequence, zone_key)
     
     # Format results
     result_text = f"🎯 **AUTHENTICATION FOR {zone}**\n\n"
-    result_text += f"**Expected Sequence:** {' → '.join([config.get_auth_name(s) for s in expected_policy])}\n"
+    result_text += f"**Expected Sequence:** {describe_policy(config, expected_policy)[0]}\n"
     result_text += f"**Your Input:** {' '.join(sequence)}\n\n"
     result_text += "**Processing Steps:**\n"
     
@@ -59,7 +58,7 @@ def process_authentication(zone, sequence_input):
         result_text += f"   {result['message']}\n\n"
     
     # Final result
-    if dfa.is_accepted():
+    if results and results[-1]['state'] == 'ACCEPTED':
         final_result = "✅ **ACCESS GRANTED**"
         status = "GRANTED"
         result_color = "success"
@@ -103,6 +102,8 @@ def run_test_cases():
 
 def create_demo():
     """Create Gradio interface"""
+    # Imported here so the handlers above can be used without the UI stack
+    import gradio as gr
     
     # Custom CSS for better styling
     custom_css = """
@@ -263,6 +264,8 @@ def find_available_port(start_port=7860, max_attempts=10):
 def main():
     """Launch the Gradio app"""
     demo = create_demo()
+    # Sessions are per door, so requests no longer need to be serialized
+    demo.queue(default_concurrency_limit=32)
     port = find_available_port(7860)
     if port is None:
         print("Error: Could not find an available port. Please close other applications using ports 7860-7870 and try again.")
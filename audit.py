@@ -0,0 +1,243 @@
+# audit.py - Fixed-Width Binary Audit Records With an mmap Reader
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+
+from engine import REJECTED, ACCEPTED
+from reasons import REASON_NONE, REASON_NAMES, render_message
+from zones import ZoneConfig
+
+# <path>:        header (magic, version, record size) then fixed-width records
+# <path>.names:  append-only string table, one "<kind>\t<name>" line per entry;
+#                kinds are d (door), z (zone), s (symbol), ids count per kind
+# Record fields: timestamp (unix seconds), door id, zone id, step (symbols
+# matched so far), symbol id, state code, reason code.
+MAGIC = b'ACAR'
+VERSION = 2
+HEADER = struct.Struct('<4sHH')
+RECORD = struct.Struct('<dIIIBBBx')
+
+# Zone ids are 32-bit, so large policy stores (over 65,535 zones) fit
+NO_ZONE = 0xFFFFFFFF
+# Symbols outside the configured alphabet (e.g. garbage input under attack)
+# and ids past the table limit; only configured names enter the string table
+OTHER_SYMBOL = 0xFF
+
+# State codes; an in-progress state is STEP_<step>
+STATE_REJECTED = REJECTED
+STATE_ACCEPTED = ACCEPTED
+STATE_STEP = 2
+STATE_CODES = {'REJECTED': STATE_REJECTED, 'ACCEPTED': STATE_ACCEPTED}
+
+
+def _names_path(path):
+    return path + '.names'
+
+
+def _load_names(path):
+    names = {'d': [], 'z': [], 's': []}
+    try:
+        with open(_names_path(path), encoding='utf-8') as f:
+            for line in f:
+                kind, _, name = line.rstrip('\n').partition('\t')
+                names[kind].append(name)
+    except FileNotFoundError:
+        pass
+    return names
+
+
+class AuditWriter:
+    """
+    Append-only writer of fixed-width audit records; safe across threads.
+    Only symbols and zones of `config` (or of the config passed to append)
+    are named in the string table: other symbols are stored as OTHER_SYMBOL
+    and other zones as NO_ZONE, so hostile input cannot grow it.
+    """
+
+    def __init__(self, path, config=None):
+        self.path = path
+        self.config = config or ZoneConfig()
+        names = _load_names(path)
+        self._ids = {kind: {name: i for i, name in enumerate(values)} for kind, values in names.items()}
+
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        if exists:
+            with open(path, 'rb') as f:
+                magic, version, size = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or version != VERSION or size != RECORD.size:
+                raise ValueError(f"Not an audit record file: {path}")
+        self._file = open(path, 'ab')
+        self._names = open(_names_path(path), 'a', encoding='utf-8')
+        if not exists:
+            self._file.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+        self._lock = threading.Lock()
+
+    def _id(self, kind, name):
+        ids = self._ids[kind]
+        value = ids.get(name)
+        if value is None:
+            value = ids[name] = len(ids)
+            self._names.write(f"{kind}\t{name}\n")
+        return value
+
+    def append(self, door_id, zone, step, symbol, state, reason, timestamp=None, config=None):
+        """
+        Write one transition; state is a state name or code, reason a code
+        config overrides the writer's for this record (e.g. a session's snapshot)
+        """
+        if isinstance(state, str):
+            state = STATE_CODES.get(state, STATE_STEP)
+        config = config or self.config
+        with self._lock:
+            symbol_id = self._id('s', symbol) if symbol in config.auth_symbols else OTHER_SYMBOL
+            self._file.write(RECORD.pack(
+                time.time() if timestamp is None else timestamp,
+                self._id('d', door_id),
+                self._id('z', zone) if zone is not None and config.has_zone(zone) else NO_ZONE,
+                step,
+                symbol_id if symbol_id < OTHER_SYMBOL else OTHER_SYMBOL,
+                state,
+                reason,
+            ))
+
+    def append_results(self, door_id, zone, results, reason, timestamp=None, config=None):
+        """Write process_sequence results; reason is the code of the last step"""
+        last = len(results) - 1
+        for i, result in enumerate(results):
+            step = result['step'] - 1 if result['state'] == 'REJECTED' else result['step']
+            self.append(door_id, zone, step, result['input'], result['state'],
+                        reason if i == last else REASON_NONE, timestamp, config)
+
+    def flush(self):
+        with self._lock:
+            self._names.flush()
+            self._file.flush()
+
+    def close(self):
+        self.flush()
+        self._file.close()
+        self._names.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class AuditReader:
+    """
+    Memory-mapped view of an audit file. Records are unpacked straight from
+    the mapping; nothing is copied until a caller asks for a dict.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.names = _load_names(path)
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, size = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION or size != RECORD.size:
+            self.close()
+            raise ValueError(f"Not an audit record file: {path}")
+        self._view = memoryview(self._map)[HEADER.size:]
+        # Ignore a trailing partial record from a writer that is mid-append
+        self._view = self._view[:len(self._view) - len(self._view) % RECORD.size]
+
+    def __len__(self):
+        return len(self._view) // RECORD.size
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return RECORD.unpack_from(self._view, index * RECORD.size)
+
+    def __iter__(self):
+        """Yield raw record tuples (timestamp, door, zone, step, symbol, state, reason)"""
+        return RECORD.iter_unpack(self._view)
+
+    def array(self):
+        """Zero-copy numpy structured array over the records (requires numpy; drop it before close())"""
+        import numpy as np
+
+        dtype = np.dtype([('timestamp', '<f8'), ('door', '<u4'), ('zone', '<u4'), ('step', '<u4'),
+                          ('symbol', 'u1'), ('state', 'u1'), ('reason', 'u1'), ('pad', 'u1')])
+        return np.frombuffer(self._view, dtype=dtype)
+
+    def decode(self, record):
+        """Record tuple -> dict with names instead of ids"""
+        timestamp, door, zone, step, symbol, state, reason = record
+        names = self.names
+        symbols = names['s']
+        return {
+            'timestamp': timestamp,
+            'door': names['d'][door],
+            'zone': None if zone == NO_ZONE else names['z'][zone],
+            'step': step,
+            'symbol': symbols[symbol] if symbol < len(symbols) and symbol != OTHER_SYMBOL else '?',
+            'state': 'REJECTED' if state == STATE_REJECTED else 'ACCEPTED' if state == STATE_ACCEPTED
+                     else f'STEP_{step}',
+            'reason': reason,
+        }
+
+    def to_result(self, record, config=None):
+        """
+        Record tuple -> the dict form returned by process_sequence
+        Messages are re-rendered against config; records do not keep engine
+        states, so in-progress steps and wrong-method rejections of expression
+        policies are rendered without the symbols they expected next.
+        """
+        decoded = self.decode(record)
+        state = decoded['state']
+        return {
+            'step': decoded['step'] + 1 if state == 'REJECTED' else decoded['step'],
+            'input': decoded['symbol'],
+            'state': state,
+            'message': render_message(config or ZoneConfig(), decoded['reason'], decoded['zone'],
+                                      decoded['step'], decoded['symbol'],
+                                      () if state == 'ACCEPTED' else None),
+        }
+
+    def close(self):
+        if getattr(self, '_view', None) is not None:
+            self._view.release()
+            self._view = None
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect a binary audit record file")
+    parser.add_argument('path')
+    parser.add_argument('--dump', action='store_true', help="Print every record as JSON")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    with AuditReader(args.path) as reader:
+        totals = [0] * len(REASON_NAMES)
+        for record in reader:
+            totals[record[6]] += 1
+            if args.dump:
+                print(json.dumps(reader.decode(record)))
+        elapsed = time.perf_counter() - started
+        print(f"{len(reader):,} records in {elapsed:.2f}s", file=sys.stderr)
+        for code, count in enumerate(totals):
+            if count:
+                print(f"{REASON_NAMES[code]:<18} {count:,}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+# benchmark.py - Performance Benchmarks for the DFA Core, Sessions and UI Handlers
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from dfa import AccessControlDFA
+from engine import CompiledPolicyEngine
+from policy_store import PolicyStore, generate_policies
+from sessions import SessionManager
+
+# Results file layout:
+#   {"meta": {...}, "results": [{"benchmark", "zones", "length", <metrics>}, ...]}
+# Metrics ending in _ns or _bytes are lower-is-better, *_per_sec higher-is-better;
+# --compare uses this to flag regressions between two runs.
+REGRESSION_THRESHOLD = 0.10
+# Throughput benchmarks report the best of this many runs to damp noise
+REPEATS = 5
+
+
+def _workload(num_zones, length, count, seed=0):
+    """Config plus a mix of valid and corrupted (zone, sequence) pairs"""
+    config = PolicyStore.from_policies(generate_policies(num_zones, length, seed))
+    rng = random.Random(seed)
+    symbols = config.symbols
+    pairs = []
+    for _ in range(count):
+        zone = rng.choice(config.zones)
+        sequence = list(config.get_policy(zone))
+        if rng.random() < 0.2:
+            sequence[rng.randrange(length)] = rng.choice(symbols)
+        pairs.append((zone, sequence))
+    return config, pairs
+
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def bench_transition(engine, pairs):
+    """Latency of single AccessControlDFA.transition calls"""
+    dfa = AccessControlDFA(engine=engine)
+    clock = time.perf_counter_ns
+    timings = []
+    for zone, sequence in pairs:
+        dfa.reset()
+        for i, symbol in enumerate(sequence):
+            started = clock()
+            dfa.transition(symbol, zone if i == 0 else None)
+            timings.append(clock() - started)
+    timings.sort()
+    return {
+        'transitions': len(timings),
+        'p50_ns': _percentile(timings, 0.50),
+        'p99_ns': _percentile(timings, 0.99),
+    }
+
+
+def bench_process_sequence(engine, pairs):
+    """Throughput of AccessControlDFA.process_sequence"""
+    dfa = AccessControlDFA(engine=engine)
+    elapsed = float('inf')
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        for zone, sequence in pairs:
+            dfa.process_sequence(sequence, zone)
+        elapsed = min(elapsed, time.perf_counter() - started)
+    return {'sequences': len(pairs), 'sequences_per_sec': len(pairs) / elapsed}
+
+
+def bench_batch(engine, pairs):
+    """Throughput of the vectorized batch path (None without numpy)"""
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return None
+
+    symbols, zone_ids = engine.encode_batch([sequence for _, sequence in pairs], [zone for zone, _ in pairs])
+    engine.process_batch(symbols[:1], zone_ids[:1])  # build the batch tables outside the timing
+    elapsed = float('inf')
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        engine.process_batch(symbols, zone_ids)
+        elapsed = min(elapsed, time.perf_counter() - started)
+    return {'rows': len(pairs), 'rows_per_sec': len(pairs) / elapsed}
+
+
+def bench_session_memory(engine, pairs):
+    """Memory per live (mid-authentication) door session"""
+    manager = SessionManager(engine)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i, (zone, sequence) in enumerate(pairs):
+        manager.step(f'door-{i}', sequence[0], zone)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return {'sessions': len(pairs), 'session_bytes': used / len(pairs)}
+
+
+def bench_app(pairs):
+    """End-to-end time of app.process_authentication (the UI itself is not built)"""
+    import app
+
+    timings = []
+    for i, (zone, sequence) in enumerate(pairs):
+        # The app only knows the built-in zones
+        zone = app.config.get_zones()[i % len(app.config.get_zones())]
+        started = time.perf_counter_ns()
+        app.process_authentication(zone.replace('_', ' ').title(), ' '.join(sequence), door_id=f'bench-{i % 64}')
+        timings.append(time.perf_counter_ns() - started)
+    timings.sort()
+    return {'requests': len(timings), 'p50_ns': _percentile(timings, 0.50), 'p99_ns': _percentile(timings, 0.99)}
+
+
+def bench_startup(config):
+    """Wall time of `headless.py check` in a fresh interpreter, compiling vs from the compile cache"""
+    import tempfile
+
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'headless.py')
+    zone = config.zones[0]
+    with tempfile.TemporaryDirectory() as directory:
+        policies = os.path.join(directory, 'policies.bin')
+        config.save_binary(policies)
+
+        def best(*options):
+            command = [sys.executable, script, '--policies', policies, '--cache-dir', directory, *options,
+                       'check', zone, *config.get_policy(zone)]
+            timings = []
+            for _ in range(REPEATS):
+                started = time.perf_counter_ns()
+                subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+                timings.append(time.perf_counter_ns() - started)
+            return min(timings)
+
+        compiled = best('--no-cache')
+        # The first cached run fills the cache; best-of keeps only warm starts
+        cached = best()
+    return {'compiled_start_ns': compiled, 'cached_start_ns': cached}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(zone_counts=(10, 1000, 100_000), lengths=(4, 8), count=20_000):
+    """Run every benchmark over the zone count x sequence length matrix"""
+    results = []
+    print(f"{'Benchmark':<18} {'Zones':>8} {'Len':>4}  Metrics")
+    print("-" * 70)
+
+    def record(name, num_zones, length, metrics):
+        if metrics is None:
+            print(f"{name:<18} {num_zones:>8,} {length:>4}  skipped (dependency not installed)")
+            return
+        results.append({'benchmark': name, 'zones': num_zones, 'length': length, **metrics})
+        shown = ', '.join(f"{key}={value:,.0f}" for key, value in metrics.items())
+        print(f"{name:<18} {num_zones:>8,} {length:>4}  {shown}")
+
+    for num_zones in zone_counts:
+        for length in lengths:
+            config, pairs = _workload(num_zones, length, count)
+            engine = CompiledPolicyEngine(config)
+            record('transition', num_zones, length, bench_transition(engine, pairs))
+            record('process_sequence', num_zones, length, bench_process_sequence(engine, pairs))
+            record('batch', num_zones, length, bench_batch(engine, pairs))
+            record('session_memory', num_zones, length, bench_session_memory(engine, pairs))
+            record('startup', num_zones, length, bench_startup(config))
+
+    _, pairs = _workload(10, 4, min(count, 2000))
+    record('app', 0, 4, bench_app(pairs))
+
+    return {
+        'meta': {
+            'commit': _git_commit(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'count': count,
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """Print metric changes between two result documents; returns regression count"""
+    def index(document):
+        return {(r['benchmark'], r['zones'], r['length']): r for r in document['results']}
+
+    old, new = index(baseline), index(current)
+    regressions = 0
+    print(f"\nCOMPARISON ({baseline['meta'].get('commit')} -> {current['meta'].get('commit')})")
+    print("-" * 70)
+    for key in sorted(old.keys() & new.keys(), key=str):
+        for metric, before in old[key].items():
+            if metric in ('benchmark', 'zones', 'length') or metric not in new[key] or not before:
+                continue
+            if not (metric.endswith('_ns') or metric.endswith('_bytes') or metric.endswith('_per_sec')):
+                continue
+            change = (new[key][metric] - before) / before
+            worse = change < -threshold if metric.endswith('_per_sec') else change > threshold
+            regressions += worse
+            flag = "  REGRESSION" if worse else ""
+            print(f"{key[0]:<18} {key[1]:>8,} {key[2]:>4}  {metric:<24} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the access control DFA")
+    parser.add_argument('--zones', default='10,1000,100000', help="Comma-separated zone counts")
+    parser.add_argument('--lengths', default='4,8', help="Comma-separated policy lengths")
+    parser.add_argument('--count', type=int, default=20_000, help="Sequences per benchmark")
+    parser.add_argument('-o', '--output', help="Write results as JSON")
+    parser.add_argument('--compare', metavar='BASELINE', help="Compare against an earlier results file")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help="Relative change counted as a regression")
+    args = parser.parse_args()
+
+    document = run_benchmarks(
+        tuple(int(value) for value in args.zones.split(',')),
+        tuple(int(value) for value in args.lengths.split(',')),
+        args.count,
+    )
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(document, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), document, args.threshold)
+        sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
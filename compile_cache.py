@@ -0,0 +1,97 @@
+# compile_cache.py - On-Disk Cache of Compiled Policy Engines
+
+import hashlib
+import json
+import os
+import struct
+from array import array
+
+from engine import CompiledPolicyEngine
+from zones import ZoneConfig
+
+# <cache_dir>/<sha256 of alphabet + policies + options>.engine (little-endian):
+#   header:  magic, version, meta_len
+#   meta:    JSON with the scalar fields and the byte length of each array
+#   arrays:  table, zone_start, state_zone, state_step as raw machine values
+MAGIC = b'ACEC'
+VERSION = 1
+HEADER = struct.Struct('<4sHI')
+ARRAYS = (('table', 'I'), ('zone_start', 'I'), ('state_zone', 'i'), ('state_step', 'I'))
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'access_control')
+
+
+def config_key(config, minimize=False):
+    """Digest of everything compilation depends on"""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([list(config.auth_symbols), minimize, VERSION]).encode())
+    if hasattr(config, 'data') and hasattr(config, 'offsets'):
+        # PolicyStore: hash the packed form instead of decoding every policy
+        digest.update('\n'.join(config.zones).encode())
+        digest.update(config.offsets.tobytes())
+        digest.update(config.data)
+        digest.update(json.dumps(sorted(config.expressions.items())).encode())
+    else:
+        digest.update(json.dumps(list(config.zone_policies.items())).encode())
+    return digest.hexdigest()
+
+
+def save_tables(path, tables):
+    meta = {key: value for key, value in tables.items() if key not in dict(ARRAYS)}
+    blobs = []
+    for name, typecode in ARRAYS:
+        values = tables[name]
+        blob = b'' if values is None else array(typecode, values).tobytes()
+        meta[name] = None if values is None else len(blob)
+        blobs.append(blob)
+    encoded = json.dumps(meta).encode()
+
+    # Write then rename, so a concurrent reader never sees a partial file
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(encoded)))
+        f.write(encoded)
+        for blob in blobs:
+            f.write(blob)
+    os.replace(temporary, path)
+
+
+def load_tables(path):
+    """Tables saved by save_tables, or None if the file is missing or unusable"""
+    try:
+        with open(path, 'rb') as f:
+            magic, version, meta_len = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                return None
+            tables = json.loads(f.read(meta_len))
+            for name, typecode in ARRAYS:
+                length = tables[name]
+                if length is not None:
+                    values = array(typecode)
+                    values.frombytes(f.read(length))
+                    tables[name] = values
+    except (OSError, ValueError, KeyError, struct.error):
+        return None
+    return tables
+
+
+def cached_engine(config=None, minimize=False, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    CompiledPolicyEngine for config, loaded from cache_dir if it was compiled
+    before, otherwise compiled and saved there
+    Returns: (engine, hit)
+    """
+    config = config or ZoneConfig()
+    path = os.path.join(cache_dir, config_key(config, minimize) + '.engine')
+    tables = load_tables(path)
+    if tables is not None:
+        return CompiledPolicyEngine(config, minimize, tables=tables), True
+
+    engine = CompiledPolicyEngine(config, minimize)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        save_tables(path, engine.export_tables())
+    except OSError:
+        # A read-only cache only costs the next start a compile
+        pass
+    return engine, False
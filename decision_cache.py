@@ -0,0 +1,94 @@
+# decision_cache.py - Bounded LRU Cache of Complete Sequence Decisions
+
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+
+DEFAULT_MAXSIZE = 4096
+
+
+class CachedDecision:
+    """
+    Immutable outcome of one process_sequence call, shared by every hit.
+    results: tuple of read-only step dicts
+    zone, state, step, reason: final state of the owner, restored on a hit
+    """
+    __slots__ = ('results', 'zone', 'state', 'step', 'reason')
+
+    def __init__(self, results, zone, state, step, reason):
+        object.__setattr__(self, 'results', tuple(MappingProxyType(dict(result)) for result in results))
+        object.__setattr__(self, 'zone', zone)
+        object.__setattr__(self, 'state', state)
+        object.__setattr__(self, 'step', step)
+        object.__setattr__(self, 'reason', reason)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CachedDecision is immutable")
+
+
+def pack_sequence(sequence, symbol_index):
+    """Symbol indices as bytes, or None if a symbol is unknown (not cached)"""
+    try:
+        return bytes(symbol_index[symbol] for symbol in sequence)
+    except (KeyError, TypeError):
+        return None
+
+
+class DecisionCache:
+    """
+    LRU map of (policy version, zone, packed sequence) -> CachedDecision.
+
+    Entries from an older policy version can never be hit again, so the
+    first lookup or insert under a newer version drops them all at once.
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _check_version(self, version):
+        if version != self.version:
+            self._entries.clear()
+            self.version = version
+
+    def get(self, version, zone, packed):
+        with self._lock:
+            self._check_version(version)
+            key = (zone, packed)
+            decision = self._entries.get(key)
+            if decision is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return decision
+
+    def put(self, version, zone, packed, decision):
+        with self._lock:
+            self._check_version(version)
+            self._entries[(zone, packed)] = decision
+            self._entries.move_to_end((zone, packed))
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return decision
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
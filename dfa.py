@@ -1,47 +1,116 @@
 # dfa.py - Deterministic Finite Automaton Implementation
 
 from zones import ZoneConfig
+from engine import CompiledPolicyEngine, REJECTED, ACCEPTED
+from reasons import (
+    REASON_NONE, REASON_INVALID_ZONE, REASON_NO_ZONE, REASON_INVALID_SYMBOL,
+    REASON_TOO_LONG, REASON_WRONG_METHOD, REASON_COMPLETED,
+    REASON_NO_MATCHING_ZONE, REASON_ZONE_PENDING, REASON_LOCKED_OUT, render_message,
+)
+from lockout import FAILURE_REASONS
+from decision_cache import DecisionCache, CachedDecision, pack_sequence
+from policy_lang import is_expression
+from trie import PolicyTrie, ROOT, NO_NODE, NO_ZONE
 
 class AccessControlDFA:
-    def __init__(self):
-        self.config = ZoneConfig()
+    def __init__(self, engine=None, infer_zone=False, config=None, cache_size=0, metrics=None,
+                 lockout=None, door_id=None):
+        self.infer_zone = infer_zone
+        self.policy_version = 0
+        self._load(engine, config)
+        # Optional memoization of process_sequence; 0 disables it
+        self.decisions = DecisionCache(cache_size) if cache_size else None
+        # Optional LockoutGuard, keyed by door_id, and Metrics; without them
+        # step is the plain method and has no extra check per symbol
+        self.lockout = lockout
+        self.door_id = door_id
+        if lockout is not None:
+            self.step = self._guarded_step
+        self.metrics = metrics
+        if metrics is not None:
+            self._unmetered_step = self.step
+            self.step = self._metered_step
+        self.trie_node = ROOT
         self.current_state = 'START'
         self.current_sequence = []
         self.target_zone = None
+        self.state_id = None
+        self.last_reason = REASON_NONE
+        self.last_symbol = None
         
         # States: START, STEP_1, STEP_2, STEP_3, ACCEPTED, REJECTED
         self.states = ['START', 'STEP_1', 'STEP_2', 'STEP_3', 'ACCEPTED', 'REJECTED']
         self.final_states = ['ACCEPTED']
         self.reject_state = 'REJECTED'
     
+    def _load(self, engine, config):
+        # Optional CompiledPolicyEngine backend; None keeps the reference logic
+        self.engine = engine
+        self._batch_engine = None
+        if engine is not None:
+            self.config = engine.config
+        else:
+            self.config = config or ZoneConfig()
+            # Expression policies only exist as compiled tables
+            if any(is_expression(policy) for policy in self.config.zone_policies.values()):
+                self.engine = CompiledPolicyEngine(self.config)
+        # With infer_zone, a sequence started without a zone picks it from the symbols
+        self.trie = PolicyTrie(self.config) if self.infer_zone else None
+        self.symbol_index = {symbol: i for i, symbol in enumerate(self.config.auth_symbols)}
+        self.policy_version += 1
+    
+    def reload(self, config=None, engine=None):
+        """Switch to new policies; cached decisions from the old ones are dropped"""
+        self._load(engine, config)
+        self.reset()
+    
     def reset(self):
         """Reset DFA to initial state"""
         self.current_state = 'START'
         self.current_sequence = []
         self.target_zone = None
+        self.state_id = None
+        self.trie_node = ROOT
     
-    def transition(self, input_symbol, zone=None):
+    def transition(self, input_symbol, zone=None, credential=None):
         """
         Process input symbol and transition to next state
         Returns: (new_state, message)
         """
+        state, _ = self.step(input_symbol, zone, credential)
+        return state, self.last_message()
+    
+    def step(self, input_symbol, zone=None, credential=None):
+        """
+        Process input symbol without building a message
+        credential is only used by a lockout guard
+        Returns: (new_state, reason_code); last_message() renders the text
+        """
+        self.last_symbol = input_symbol
+        if (self.trie is not None and not zone and not self.target_zone
+                and self.current_state not in ['REJECTED', 'ACCEPTED']):
+            return self._infer_step(input_symbol)
+        if self.engine is not None:
+            return self._compiled_step(input_symbol, zone)
+        
         # Set target zone if provided at START
         if zone and self.current_state == 'START':
-            if zone not in self.config.get_zones():
-                return self._reject("Invalid zone specified")
+            if not self.config.has_zone(zone):
+                return self._reject(REASON_INVALID_ZONE)
             self.target_zone = zone
         
         # If no zone specified at start, reject immediately
         if not self.target_zone and self.current_state == 'START':
-            return self._reject("No target zone specified")
+            return self._reject(REASON_NO_ZONE)
         
         # If already accepted or rejected, ignore further inputs
         if self.current_state in ['REJECTED', 'ACCEPTED']:
-            return self.current_state, "Process already completed. Reset required."
+            self.last_reason = REASON_COMPLETED
+            return self.current_state, REASON_COMPLETED
         
         # Validate input symbol against the 8-symbol alphabet
         if input_symbol not in self.config.auth_symbols:
-            return self._reject(f"Invalid authentication symbol: {input_symbol}")
+            return self._reject(REASON_INVALID_SYMBOL)
         
         # Get expected sequence for target zone
         expected_sequence = self.config.get_policy(self.target_zone)
@@ -49,33 +118,120 @@ class AccessControlDFA:
         
         # Sequence too long? Reject.
         if current_step >= len(expected_sequence):
-            return self._reject("Authentication sequence too long")
+            return self._reject(REASON_TOO_LONG)
         
         # Check if current input matches expected symbol at this step
-        expected_symbol = expected_sequence[current_step]
-        if input_symbol != expected_symbol:
-            expected_name = self.config.get_auth_name(expected_symbol)
-            actual_name = self.config.get_auth_name(input_symbol)
-            return self._reject(f"Wrong authentication method. Expected: {expected_name}, Got: {actual_name}")
+        if input_symbol != expected_sequence[current_step]:
+            return self._reject(REASON_WRONG_METHOD)
         
         # Valid transition: record input and advance
         self.current_sequence.append(input_symbol)
         new_step = len(self.current_sequence)
+        self.last_reason = REASON_NONE
         
-        # If complete sequence → accept
+        # If complete sequence → accept, otherwise move to next step state
         if new_step == len(expected_sequence):
             self.current_state = 'ACCEPTED'
-            return 'ACCEPTED', f"Access GRANTED to {self.target_zone}"
         else:
-            # Move to next step state
             self.current_state = f'STEP_{new_step}'
-            next_expected = self.config.get_auth_name(expected_sequence[new_step])
-            return self.current_state, f"Step {new_step} completed. Next: {next_expected}"
+        return self.current_state, REASON_NONE
+    
+    def _metered_step(self, input_symbol, zone=None, credential=None):
+        """step() with transition counters and sampled latency"""
+        metrics = self.metrics
+        started = metrics.start()
+        state, reason = self._unmetered_step(input_symbol, zone, credential)
+        metrics.record(self.target_zone, state, reason, started)
+        return state, reason
+    
+    def _guarded_step(self, input_symbol, zone=None, credential=None):
+        """step() refusing locked doors/credentials and reporting failures"""
+        if self.lockout.locked(self.door_id, credential):
+            self.last_symbol = input_symbol
+            return self._reject(REASON_LOCKED_OUT)
+        state, reason = type(self).step(self, input_symbol, zone)
+        if reason in FAILURE_REASONS:
+            self.lockout.record_failure(self.door_id, credential)
+        return state, reason
+    
+    def _compiled_step(self, input_symbol, zone):
+        """Same step as above, driven by the compiled table"""
+        engine = self.engine
+        
+        if self.current_state == 'START':
+            if zone:
+                self.state_id = engine.start_state(zone)
+                if self.state_id is None:
+                    return self._reject(REASON_INVALID_ZONE)
+                self.target_zone = zone
+            elif not self.target_zone:
+                return self._reject(REASON_NO_ZONE)
+            elif self.state_id is None:
+                self.state_id = engine.start_state(self.target_zone)
+        elif self.current_state in ['REJECTED', 'ACCEPTED']:
+            self.last_reason = REASON_COMPLETED
+            return self.current_state, REASON_COMPLETED
+        
+        # One table lookup per symbol
+        next_state = engine.step(self.state_id, input_symbol)
+        if next_state == REJECTED:
+            return self._reject(engine.reject_code(self.state_id, input_symbol))
+        
+        self.state_id = next_state
+        self.current_sequence.append(input_symbol)
+        self.last_reason = REASON_NONE
+        self.current_state = engine.state_name(next_state, len(self.current_sequence))
+        return self.current_state, REASON_NONE
+    
+    def _infer_step(self, input_symbol):
+        """Advance through the policy trie until a single zone remains"""
+        trie = self.trie
+        node = trie.step(self.trie_node, input_symbol)
+        if node == NO_NODE:
+            if input_symbol not in self.config.auth_symbols:
+                return self._reject(REASON_INVALID_SYMBOL)
+            return self._reject(REASON_NO_MATCHING_ZONE)
+        
+        self.trie_node = node
+        self.current_sequence.append(input_symbol)
+        new_step = len(self.current_sequence)
+        
+        # A completed policy grants access, even if longer policies share the prefix
+        zone_id = trie.accept_zone[node]
+        if zone_id != NO_ZONE:
+            self.target_zone = trie.zones[zone_id]
+            self.state_id = ACCEPTED
+            self.current_state = 'ACCEPTED'
+            self.last_reason = REASON_NONE
+            return self.current_state, REASON_NONE
+        
+        self.current_state = f'STEP_{new_step}'
+        zone_id = trie.only_zone[node]
+        if zone_id == NO_ZONE:
+            self.last_reason = REASON_ZONE_PENDING
+            return self.current_state, REASON_ZONE_PENDING
+        
+        # Zone is now known: continue on the normal path from this step
+        self.target_zone = trie.zones[zone_id]
+        if self.engine is not None:
+            self.state_id = self.engine.run(self.current_sequence, self.target_zone)
+        self.last_reason = REASON_NONE
+        return self.current_state, REASON_NONE
     
     def _reject(self, reason):
-        """Helper method to reject and return error message"""
+        """Helper method to reject and record the reason code"""
         self.current_state = 'REJECTED'
-        return 'REJECTED', f"Access DENIED: {reason}"
+        self.last_reason = reason
+        return 'REJECTED', reason
+    
+    def last_message(self):
+        """Render the message for the most recent transition"""
+        expected = None
+        if self.engine is not None and self.state_id is not None:
+            # state_id is the new state after a step, or the state that rejected
+            expected = self.engine.message_expected(self.target_zone, self.state_id)
+        return render_message(self.config, self.last_reason, self.target_zone,
+                              len(self.current_sequence), self.last_symbol, expected)
     
     def is_accepted(self):
         """Check if current state is accepting"""
@@ -93,16 +249,54 @@ class AccessControlDFA:
             'target_zone': self.target_zone
         }
     
-    def process_sequence(self, sequence, zone):
-        """Process complete authentication sequence"""
+    def process_sequence(self, sequence, zone, credential=None):
+        """
+        Process complete authentication sequence
+        With a decision cache, returns shared read-only results for repeats
+        """
+        if self.decisions is None:
+            return self._process_sequence(sequence, zone, credential)
+        
+        packed = pack_sequence(sequence, self.symbol_index)
+        if packed is None:
+            # Unknown symbols appear in the message text; not worth an entry
+            return self._process_sequence(sequence, zone, credential)
+        
+        decision = self.decisions.get(self.policy_version, zone, packed)
+        if decision is not None and self.lockout is not None:
+            # A cached acceptance must not get a locked door or credential through
+            if self.lockout.locked(self.door_id, credential):
+                return self._locked_out(sequence)
+            if decision.reason in FAILURE_REASONS:
+                self.lockout.record_failure(self.door_id, credential)
+        if decision is not None:
+            self.reset()
+            self.current_state = decision.results[-1]['state']
+            self.current_sequence = list(sequence[:decision.step])
+            self.target_zone = decision.zone
+            self.state_id = decision.state
+            self.last_reason = decision.reason
+            self.last_symbol = decision.results[-1]['input']
+            return decision.results
+        
+        results = self._process_sequence(sequence, zone, credential)
+        # Only finished decisions are cached; a partial one leaves live state behind,
+        # and a lockout says nothing about the sequence itself
+        if self.current_state not in ['REJECTED', 'ACCEPTED'] or self.last_reason == REASON_LOCKED_OUT:
+            return results
+        return self.decisions.put(self.policy_version, zone, packed, CachedDecision(
+            results, self.target_zone, self.state_id, len(self.current_sequence), self.last_reason
+        )).results
+    
+    def _process_sequence(self, sequence, zone, credential=None):
         self.reset()
         results = []
         
         for i, symbol in enumerate(sequence):
             if i == 0:
-                state, message = self.transition(symbol, zone)
+                state, message = self.transition(symbol, zone, credential)
             else:
-                state, message = self.transition(symbol)
+                state, message = self.transition(symbol, credential=credential)
             
             results.append({
                 'step': i + 1,
@@ -116,3 +310,22 @@ class AccessControlDFA:
                 break
         
         return results
+    
+    def _locked_out(self, sequence):
+        """Results for a sequence refused at its first symbol by the lockout guard"""
+        self.reset()
+        if not sequence:
+            return []
+        self.last_symbol = sequence[0]
+        state, _ = self._reject(REASON_LOCKED_OUT)
+        return [{'step': 1, 'input': sequence[0], 'state': state, 'message': self.last_message()}]
+    
+    def process_batch(self, symbols, zone_ids):
+        """Evaluate many encoded sequences at once (see CompiledPolicyEngine.process_batch)"""
+        engine = self.engine
+        if engine is None:
+            # Compiled on first use, just for batches; interactive steps stay on the reference logic
+            if self._batch_engine is None:
+                self._batch_engine = CompiledPolicyEngine(self.config)
+            engine = self._batch_engine
+        return engine.process_batch(symbols, zone_ids)
@@ -0,0 +1,379 @@
+# engine.py - Compiled Integer Transition Table for Zone Policies
+
+from array import array
+from reasons import (
+    REASON_INVALID_ZONE, REASON_NO_ZONE, REASON_INVALID_SYMBOL,
+    REASON_TOO_LONG, REASON_WRONG_METHOD,
+)
+from minimize import minimize_table, collapse_table
+from policy_lang import compile_expression, is_expression
+from zones import ZoneConfig
+
+# Terminal states shared by every zone
+REJECTED = 0
+ACCEPTED = 1
+
+# Symbol index used for bytes that are not part of the alphabet
+INVALID_SYMBOL = 0xFF
+# Symbol index used to pad short rows in a batch
+PAD_SYMBOL = 0xFE
+
+# Cached state names by number of matched symbols
+_STEP_NAMES = ['START']
+
+
+def step_name(step):
+    """Name of the non-terminal state after `step` matched symbols"""
+    while step >= len(_STEP_NAMES):
+        _STEP_NAMES.append(f'STEP_{len(_STEP_NAMES)}')
+    return _STEP_NAMES[step]
+
+
+class CompiledPolicyEngine:
+    """
+    Dense state x symbol transition table compiled from ZoneConfig.
+
+    Every zone policy becomes a chain of integer states (one per matched
+    prefix length) that all end in the shared ACCEPTED state. Any symbol
+    that does not advance the chain leads to REJECTED. Both terminal states
+    loop on themselves, so a step is always a single table lookup.
+
+    With minimize=True the chains of all zones are merged into one minimal
+    automaton: zones with identical policies share every state and shared
+    suffixes collapse. A state then no longer identifies a zone or a step,
+    so callers track the step count themselves (see state_name).
+    """
+
+    def __init__(self, config=None, minimize=False, tables=None):
+        self.config = config or ZoneConfig()
+
+        # Alphabet: symbol <-> column index
+        self.symbols = tuple(self.config.auth_symbols)
+        self.num_symbols = len(self.symbols)
+        self.symbol_index = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+        # Byte value -> column index, for bytes/memoryview input
+        codes = bytearray([INVALID_SYMBOL]) * 256
+        for i, symbol in enumerate(self.symbols):
+            if len(symbol) == 1 and ord(symbol) < 256:
+                codes[ord(symbol)] = i
+        self.symbol_codes = bytes(codes)
+
+        # Zones: name <-> index
+        self.zones = tuple(self.config.zone_policies)
+        self.zone_index = {zone: i for i, zone in enumerate(self.zones)}
+
+        if tables is not None:
+            # Precompiled by export_tables() (see compile_cache.py)
+            self._restore(tables)
+            return
+        self._compile()
+        self.unminimized_states = self.num_states
+        if minimize:
+            self._minimize()
+
+    def export_tables(self):
+        """Compiled state as plain values, enough to rebuild the engine without compiling"""
+        return {
+            'table': self.table,
+            'num_states': self.num_states,
+            'unminimized_states': self.unminimized_states,
+            'zone_start': self.zone_start,
+            'state_zone': self.state_zone,
+            'state_step': self.state_step,
+            'expression_zones': sorted(self.expression_zones),
+        }
+
+    def _restore(self, tables):
+        self.table = tables['table']
+        self.num_states = tables['num_states']
+        self.unminimized_states = tables['unminimized_states']
+        self.zone_start = tables['zone_start']
+        self.state_zone = tables['state_zone']
+        self.state_step = tables['state_step']
+        self.state_names = None
+        if self.state_step is not None:
+            step_name(max(self.state_step))
+            self.state_names = ('REJECTED', 'ACCEPTED') + tuple(map(_STEP_NAMES.__getitem__, self.state_step[2:]))
+        self.expression_zones = frozenset(tables['expression_zones'])
+        self._batch_tables = None
+
+    def _compile(self):
+        """Build the transition table and per-state metadata"""
+        policies = self.config.zone_policies
+        num_symbols = self.num_symbols
+
+        # Terminal states have no zone and no step
+        state_zone = [-1, -1]
+        state_step = [0, 0]
+        state_names = ['REJECTED', 'ACCEPTED']
+        zone_start = []
+        # zone_id -> (CompiledExpression, {expression state: depth}) for expression policies
+        expressions = {}
+
+        for zone_id, zone in enumerate(self.zones):
+            zone_start.append(len(state_zone))
+            policy = policies[zone]
+            if is_expression(policy):
+                compiled = compile_expression(policy, self.symbols)
+                depths = self._expression_depths(compiled)
+                expressions[zone_id] = (compiled, depths)
+                steps = [depths.get(state, 0) for state in range(2, compiled.num_states)]
+            else:
+                # An empty policy still needs a START state (which rejects everything)
+                steps = range(max(len(policy), 1))
+            for step in steps:
+                state_zone.append(zone_id)
+                state_step.append(step)
+                state_names.append(step_name(step))
+
+        table = array('I', [REJECTED]) * (len(state_zone) * num_symbols)
+        for column in range(num_symbols):
+            table[ACCEPTED * num_symbols + column] = ACCEPTED
+
+        for zone_id, zone in enumerate(self.zones):
+            policy = policies[zone]
+            base = zone_start[zone_id]
+
+            if zone_id in expressions:
+                # Splice the expression DFA in: its DEAD/ACCEPT map onto ours
+                compiled = expressions[zone_id][0]
+                offset = base - 2
+                for state in range(2, compiled.num_states):
+                    for column in range(num_symbols):
+                        target = compiled.table[state * num_symbols + column]
+                        table[(offset + state) * num_symbols + column] = target if target <= ACCEPTED else offset + target
+                zone_start[zone_id] = offset + compiled.start
+                continue
+
+            for step, symbol in enumerate(policy):
+                column = self.symbol_index.get(symbol)
+                if column is None:
+                    continue
+                next_state = base + step + 1 if step + 1 < len(policy) else ACCEPTED
+                table[(base + step) * num_symbols + column] = next_state
+
+        self.table = table
+        self.num_states = len(state_zone)
+        self.zone_start = array('I', zone_start)
+        self.state_zone = array('i', state_zone)
+        self.state_step = array('I', state_step)
+        self.state_names = tuple(state_names)
+        self.expression_zones = frozenset(expressions)
+        self._batch_tables = None
+
+    def _expression_depths(self, compiled):
+        """Shortest number of symbols from the start to each expression state"""
+        depths = {compiled.start: 0}
+        frontier = [compiled.start]
+        while frontier:
+            next_frontier = []
+            for state in frontier:
+                for column in range(self.num_symbols):
+                    target = compiled.table[state * self.num_symbols + column]
+                    if target > ACCEPTED and target not in depths:
+                        depths[target] = depths[state] + 1
+                        next_frontier.append(target)
+            frontier = next_frontier
+        return depths
+
+    def _minimize(self):
+        """Merge equivalent states across all zones (Hopcroft)"""
+        # REJECTED and ACCEPTED stay apart from each other and from the chains
+        labels = ['REJECTED', 'ACCEPTED'] + [None] * (self.num_states - 2)
+        class_of, num_classes = minimize_table(self.table, self.num_states, self.num_symbols, labels)
+
+        self.table = collapse_table(self.table, self.num_states, self.num_symbols, class_of, num_classes)
+        self.zone_start = array('I', (class_of[start] for start in self.zone_start))
+        self.num_states = num_classes
+        # Merged states have no single zone or step
+        self.state_zone = None
+        self.state_step = None
+        self.state_names = None
+        self._batch_tables = None
+
+    def state_name(self, state, step):
+        """State name for an integer state reached after `step` matched symbols"""
+        if state == REJECTED:
+            return 'REJECTED'
+        if state == ACCEPTED:
+            return 'ACCEPTED'
+        return step_name(step)
+
+    def start_state(self, zone):
+        """Return the START state for a zone, or None if the zone is unknown"""
+        zone_id = self.zone_index.get(zone)
+        if zone_id is None:
+            return None
+        return self.zone_start[zone_id]
+
+    def step(self, state, symbol):
+        """Advance one symbol from an integer state"""
+        column = self.symbol_index.get(symbol)
+        if column is None:
+            return REJECTED
+        return self.table[state * self.num_symbols + column]
+
+    def run(self, sequence, zone):
+        """Run a whole sequence and return the final integer state"""
+        state = self.start_state(zone)
+        if state is None:
+            return REJECTED
+
+        table = self.table
+        num_symbols = self.num_symbols
+        symbol_index = self.symbol_index
+        for symbol in sequence:
+            column = symbol_index.get(symbol)
+            if column is None:
+                return REJECTED
+            state = table[state * num_symbols + column]
+            if state <= ACCEPTED:
+                break
+        return state
+
+    def accepts(self, sequence, zone):
+        """Check whether a sequence grants access to a zone"""
+        return self.run(sequence, zone) == ACCEPTED
+
+    def zone_of(self, state):
+        """Zone name owning a non-terminal state (None once minimized)"""
+        if self.state_zone is None:
+            return None
+        zone_id = self.state_zone[state]
+        return self.zones[zone_id] if zone_id >= 0 else None
+
+    def expected_symbol(self, state):
+        """Symbol that advances a non-terminal state"""
+        if self.state_zone is None or self.state_zone[state] in self.expression_zones:
+            # Minimized or expression state: read it off the table row
+            symbols = self.expected_symbols(state)
+            return symbols[0] if symbols else None
+        policy = self.config.get_policy(self.zone_of(state))
+        step = self.state_step[state]
+        return policy[step] if step < len(policy) else None
+
+    def expected_symbols(self, state):
+        """All symbols that advance a state (none for terminal states)"""
+        if state <= ACCEPTED:
+            return ()
+        row = state * self.num_symbols
+        return tuple(symbol for column, symbol in enumerate(self.symbols)
+                     if self.table[row + column] != REJECTED)
+
+    def message_expected(self, zone, state):
+        """
+        Expected symbols to pass to render_message for a state in a zone.
+        None for fixed sequences, whose messages come from the policy itself.
+        """
+        if self.zone_index.get(zone) not in self.expression_zones:
+            return None
+        return self.expected_symbols(state)
+
+    def matched_sequence(self, zone, step):
+        """
+        Symbols matched after `step` steps in a zone, for fixed sequences.
+        Empty for expression zones: their states do not record the path taken.
+        """
+        if self.zone_index.get(zone) in self.expression_zones:
+            return []
+        return list(self.config.get_policy(zone)[:step])
+
+    def reject_code(self, state, symbol):
+        """Reason code for a symbol rejected from a non-terminal state"""
+        if symbol not in self.symbol_index:
+            return REASON_INVALID_SYMBOL
+        if self.expected_symbol(state) is None:
+            return REASON_TOO_LONG
+        return REASON_WRONG_METHOD
+
+    def encode_batch(self, sequences, zones):
+        """
+        Encode sequences and zone names for process_batch.
+        Returns: (symbols, zone_ids) as a padded uint8 2-D array and an int32 array
+        """
+        import numpy as np
+
+        width = max((len(sequence) for sequence in sequences), default=0)
+        symbols = np.full((len(sequences), width), PAD_SYMBOL, dtype=np.uint8)
+        symbol_index = self.symbol_index
+        for row, sequence in enumerate(sequences):
+            codes = bytes(symbol_index.get(symbol, INVALID_SYMBOL) for symbol in sequence)
+            symbols[row, :len(codes)] = np.frombuffer(codes, dtype=np.uint8)
+
+        # -1 means no zone, num_zones means an unknown zone
+        num_zones = len(self.zones)
+        zone_ids = np.fromiter(
+            (-1 if zone is None else self.zone_index.get(zone, num_zones) for zone in zones),
+            dtype=np.int32, count=len(zones)
+        )
+        return symbols, zone_ids
+
+    def _build_batch_tables(self):
+        """Extend the table with INVALID and PAD columns for vectorized lookups"""
+        import numpy as np
+
+        num_symbols = self.num_symbols
+        invalid_column = num_symbols
+        pad_column = num_symbols + 1
+
+        table = np.full((self.num_states, num_symbols + 2), REJECTED, dtype=np.uint32)
+        table[:, :num_symbols] = np.frombuffer(self.table, dtype=np.uint32).reshape(self.num_states, num_symbols)
+        table[ACCEPTED, invalid_column] = ACCEPTED
+        # Padding never moves a state
+        table[:, pad_column] = np.arange(self.num_states, dtype=np.uint32)
+
+        # Symbol code -> extended column
+        columns = np.full(256, invalid_column, dtype=np.intp)
+        columns[:num_symbols] = np.arange(num_symbols)
+        columns[PAD_SYMBOL] = pad_column
+
+        # States whose policy has no further symbol reject as "too long"
+        exhausted = np.zeros(self.num_states, dtype=bool)
+        for state in range(ACCEPTED + 1, self.num_states):
+            exhausted[state] = self.expected_symbol(state) is None
+
+        self._batch_tables = (table, columns, exhausted, np.frombuffer(self.zone_start, dtype=np.uint32))
+        return self._batch_tables
+
+    def process_batch(self, symbols, zone_ids):
+        """
+        Advance every row of a symbol matrix in lockstep.
+        symbols: uint8 array (rows x max length) of column indices, padded with PAD_SYMBOL
+        zone_ids: int array of zone indices (-1 for no zone)
+        Returns: (final_states, steps, reasons) arrays
+        """
+        import numpy as np
+
+        table, columns, exhausted, zone_start = self._batch_tables or self._build_batch_tables()
+        symbols = np.asarray(symbols, dtype=np.uint8)
+        zone_ids = np.asarray(zone_ids)
+        rows = len(zone_ids)
+
+        reasons = np.zeros(rows, dtype=np.uint8)
+        valid_zone = (zone_ids >= 0) & (zone_ids < len(self.zones))
+        reasons[zone_ids < 0] = REASON_NO_ZONE
+        reasons[zone_ids >= len(self.zones)] = REASON_INVALID_ZONE
+
+        states = np.full(rows, REJECTED, dtype=np.uint32)
+        states[valid_zone] = zone_start[zone_ids[valid_zone]]
+        steps = np.zeros(rows, dtype=np.uint32)
+
+        for t in range(symbols.shape[1] if symbols.ndim == 2 else 0):
+            column = columns[symbols[:, t]]
+            next_states = table[states, column]
+
+            # Only live states can be rejected; record why at that moment
+            rejected = (next_states == REJECTED) & (states != REJECTED)
+            if rejected.any():
+                reasons[rejected] = np.where(
+                    column[rejected] == self.num_symbols, REASON_INVALID_SYMBOL,
+                    np.where(exhausted[states[rejected]], REASON_TOO_LONG, REASON_WRONG_METHOD)
+                )
+            steps += (states > ACCEPTED) & (next_states != REJECTED) & (column != self.num_symbols + 1)
+            states = next_states
+
+            if (states <= ACCEPTED).all():
+                break
+
+        return states, steps, reasons
@@ -0,0 +1,133 @@
+# feed.py - Push-Style Incremental Symbol Feeding With Integer-Only Session State
+
+from engine import CompiledPolicyEngine, REJECTED, ACCEPTED, INVALID_SYMBOL
+from reasons import REASON_NONE, REASON_INVALID_ZONE, REASON_NO_ZONE, render_message
+
+# Status returned by feed()/feed_many(): the two terminal engine states plus
+# one constant for "waiting for more symbols". Small ints, so returning one
+# allocates nothing.
+FEED_REJECTED = REJECTED
+FEED_ACCEPTED = ACCEPTED
+FEED_PENDING = 2
+STATUS_NAMES = ('REJECTED', 'ACCEPTED', 'PENDING')
+
+
+class FeedSession:
+    """
+    One authentication fed a symbol at a time, for readers that push input.
+
+    Holds only the engine state and the number of matched symbols between
+    calls, plus a reference to the refused input after a rejection. Reasons
+    and messages are worked out on demand, so the feed path builds no
+    tuples, lists or strings. Like the other front ends, a finished session
+    ignores further input until reset().
+    """
+
+    __slots__ = ('engine', 'zone', 'state', 'step', 'consumed', '_table', '_num_symbols', '_index', '_codes',
+                 '_refused_state', '_refused_symbol', '_start_reason')
+
+    def __init__(self, engine=None, zone=None):
+        self.engine = engine or CompiledPolicyEngine()
+        self._table = self.engine.table
+        self._num_symbols = self.engine.num_symbols
+        self._index = self.engine.symbol_index
+        self._codes = self.engine.symbol_codes
+        self.reset(zone)
+
+    def reset(self, zone=None):
+        """Start a new authentication for zone"""
+        self.zone = zone
+        self.step = 0
+        self.consumed = 0
+        self._refused_state = REJECTED
+        self._refused_symbol = None
+        state = self.engine.start_state(zone)
+        if state is None:
+            self.state = REJECTED
+            self._start_reason = REASON_INVALID_ZONE if zone else REASON_NO_ZONE
+        else:
+            self.state = state
+            self._start_reason = REASON_NONE
+
+    def feed(self, symbol):
+        """Advance by one symbol; returns FEED_PENDING, FEED_ACCEPTED or FEED_REJECTED"""
+        state = self.state
+        if state <= ACCEPTED:
+            return state
+        column = self._index.get(symbol, INVALID_SYMBOL)
+        next_state = REJECTED if column == INVALID_SYMBOL else self._table[state * self._num_symbols + column]
+        if next_state == REJECTED:
+            self._refused_state = state
+            self._refused_symbol = symbol
+            self.state = REJECTED
+            return FEED_REJECTED
+        self.step += 1
+        self.state = next_state
+        return FEED_ACCEPTED if next_state == ACCEPTED else FEED_PENDING
+
+    def feed_many(self, buffer):
+        """
+        Advance over a bytes/bytearray/memoryview of one-byte symbols in one call.
+        Stops at the symbol that finishes the authentication; `consumed` is how
+        many bytes of this buffer were used, so the caller can resume after it.
+        """
+        state = self.state
+        consumed = 0
+        if state > ACCEPTED:
+            table = self._table
+            num_symbols = self._num_symbols
+            codes = self._codes
+            # Iterating the buffer reads it in place, however much of it is used
+            for byte in buffer:
+                consumed += 1
+                column = codes[byte]
+                next_state = REJECTED if column == INVALID_SYMBOL else table[state * num_symbols + column]
+                if next_state == REJECTED:
+                    self._refused_state = state
+                    self._refused_symbol = byte
+                    state = REJECTED
+                    break
+                state = next_state
+                if state == ACCEPTED:
+                    break
+            self.step += consumed - (state == REJECTED)
+            self.state = state
+        self.consumed = consumed
+        return state if state <= ACCEPTED else FEED_PENDING
+
+    @property
+    def status(self):
+        return self.state if self.state <= ACCEPTED else FEED_PENDING
+
+    def _refused(self):
+        symbol = self._refused_symbol
+        return chr(symbol) if isinstance(symbol, int) else symbol
+
+    def reason(self):
+        """Reason code for the current status"""
+        if self._start_reason != REASON_NONE:
+            return self._start_reason
+        if self.state != REJECTED:
+            return REASON_NONE
+        return self.engine.reject_code(self._refused_state, self._refused())
+
+    def message(self):
+        """Human-readable message for the current status, as transition() would give"""
+        engine = self.engine
+        reason = self.reason()
+        if self._start_reason != REASON_NONE:
+            return render_message(engine.config, reason)
+        state = self._refused_state if self.state == REJECTED else self.state
+        return render_message(engine.config, reason, self.zone, self.step, self._refused(),
+                              engine.message_expected(self.zone, state))
+
+
+def feeder(engine=None, zone=None):
+    """
+    Coroutine form of FeedSession: prime with next(), then send() symbols
+    and receive status constants. Finished sessions keep returning their status.
+    """
+    session = FeedSession(engine, zone)
+    status = session.status
+    while True:
+        status = session.feed((yield status))
@@ -0,0 +1,331 @@
+# fuzz.py - Exhaustive and Differential Equivalence Checks Across Engines
+
+import argparse
+import multiprocessing
+import random
+import sys
+import time
+from itertools import product
+
+from dfa import AccessControlDFA
+from engine import CompiledPolicyEngine
+from feed import FeedSession, FEED_PENDING
+from sessions import SessionManager
+from shared_sessions import SharedSessionManager, SharedSessionTable
+from zone_matcher import ZoneMatcher
+from zones import ZoneConfig
+
+# Every backend turns (sequence, zone) pairs into outcome dicts; the reference
+# outcome has every key ('results', 'state', 'sequence', 'zone', 'step',
+# 'reason', 'message', 'granted') and a backend is compared on the keys it
+# returns. A backend may return None for pairs it does not decide (e.g. batch
+# rows with no symbols).
+INVALID_SYMBOL = 'Z'
+UNKNOWN_ZONE = 'UNKNOWN_ZONE'
+# Mismatches reported per task, so one broken backend cannot flood the output
+MAX_MISMATCHES = 20
+
+
+def _dfa_outcomes(dfa, pairs):
+    outcomes = []
+    for sequence, zone in pairs:
+        results = dfa.process_sequence(sequence, zone)
+        info = dfa.get_current_state()
+        outcomes.append({
+            'results': [dict(result) for result in results],
+            'state': info['state'],
+            'sequence': info['sequence'],
+            'zone': info['target_zone'],
+            'step': len(info['sequence']),
+            'reason': dfa.last_reason,
+            'message': results[-1]['message'] if results else None,
+            'granted': info['state'] == 'ACCEPTED',
+        })
+    return outcomes
+
+
+def reference_backend(config):
+    dfa = AccessControlDFA(config=config)
+    return lambda pairs: _dfa_outcomes(dfa, pairs)
+
+
+def compiled_backend(config):
+    dfa = AccessControlDFA(engine=CompiledPolicyEngine(config))
+    return lambda pairs: _dfa_outcomes(dfa, pairs)
+
+
+def minimized_backend(config):
+    dfa = AccessControlDFA(engine=CompiledPolicyEngine(config, minimize=True))
+    return lambda pairs: _dfa_outcomes(dfa, pairs)
+
+
+def cached_backend(config):
+    dfa = AccessControlDFA(engine=CompiledPolicyEngine(config), cache_size=4096)
+
+    def run(pairs):
+        # Twice, so the second pass is served from the cache
+        _dfa_outcomes(dfa, pairs)
+        return [{key: outcome[key] for key in ('results', 'state', 'sequence', 'zone')}
+                for outcome in _dfa_outcomes(dfa, pairs)]
+    return run
+
+
+def sessions_backend(config):
+    sessions = SessionManager(engine=CompiledPolicyEngine(config), cache_size=4096)
+
+    def run(pairs):
+        outcomes = []
+        for sequence, zone in pairs:
+            results = sessions.process_sequence('fuzz', sequence, zone)
+            info = sessions.get_current_state('fuzz')
+            outcomes.append({'results': [dict(result) for result in results], 'state': info['state'],
+                             'sequence': info['sequence']})
+        return outcomes
+    return run
+
+
+def shared_sessions_backend(config):
+    engine = CompiledPolicyEngine(config)
+    table = SharedSessionTable.create(engine, num_slots=16)
+    # Only this process uses it, so the name can go now and nothing leaks at exit
+    table.unlink()
+    sessions = SharedSessionManager(table, engine)
+
+    def run(pairs):
+        outcomes = []
+        for sequence, zone in pairs:
+            results = sessions.process_sequence('fuzz', sequence, zone)
+            info = sessions.get_current_state('fuzz')
+            outcomes.append({'results': results, 'state': info['state'], 'sequence': info['sequence']})
+        return outcomes
+    return run
+
+
+def batch_backend(config):
+    engine = CompiledPolicyEngine(config)
+
+    def run(pairs):
+        symbols, zone_ids = engine.encode_batch([sequence for sequence, _ in pairs], [zone for _, zone in pairs])
+        states, steps, reasons = engine.process_batch(symbols, zone_ids)
+        return [None if not sequence else {'state': engine.state_name(int(state), int(step)), 'step': int(step),
+                                           'reason': int(reason)}
+                for (sequence, _), state, step, reason in zip(pairs, states, steps, reasons)]
+    return run
+
+
+def _feed_outcome(session):
+    engine = session.engine
+    return {'state': engine.state_name(session.state, session.step), 'step': session.step,
+            'reason': session.reason(), 'message': session.message()}
+
+
+def feed_backend(config):
+    session = FeedSession(CompiledPolicyEngine(config))
+
+    def run(pairs):
+        outcomes = []
+        for sequence, zone in pairs:
+            session.reset(zone)
+            for symbol in sequence:
+                if session.feed(symbol) != FEED_PENDING:
+                    break
+            outcomes.append(_feed_outcome(session) if sequence else None)
+        return outcomes
+    return run
+
+
+def feed_many_backend(config):
+    session = FeedSession(CompiledPolicyEngine(config))
+
+    def run(pairs):
+        outcomes = []
+        for sequence, zone in pairs:
+            # Only sequences of one-byte symbols can be fed as a buffer
+            if not sequence or any(len(symbol.encode()) != 1 for symbol in sequence):
+                outcomes.append(None)
+                continue
+            session.reset(zone)
+            session.feed_many(''.join(sequence).encode())
+            outcomes.append(_feed_outcome(session))
+        return outcomes
+    return run
+
+
+def zone_matcher_backend(config):
+    matcher = ZoneMatcher(config)
+    return lambda pairs: [{'granted': zone in matcher.matching_zones(sequence)} for sequence, zone in pairs]
+
+
+BACKENDS = {
+    'compiled': compiled_backend,
+    'minimized': minimized_backend,
+    'cached': cached_backend,
+    'sessions': sessions_backend,
+    'shared_sessions': shared_sessions_backend,
+    'batch': batch_backend,
+    'feed': feed_backend,
+    'feed_many': feed_many_backend,
+    'zone_matcher': zone_matcher_backend,
+}
+
+# Per-worker state, set up once by _init_worker
+_WORKER = {}
+
+
+def _init_worker(config, backends):
+    _WORKER['reference'] = reference_backend(config)
+    _WORKER['backends'] = [(name, BACKENDS[name](config)) for name in backends]
+    _WORKER['config'] = config
+
+
+def exhaustive_tasks(config, max_length, alphabet):
+    """Tasks covering every sequence up to max_length for every zone (plus unknown and none)"""
+    for zone in list(config.zone_policies) + [UNKNOWN_ZONE, None]:
+        yield ('exhaustive', zone, (), max_length, alphabet)
+        for symbol in alphabet:
+            yield ('exhaustive', zone, (symbol,), max_length, alphabet)
+
+
+def random_tasks(seed, count, per_task=2000):
+    """Tasks of mutated policy sequences, reproducible from seed"""
+    for offset in range(0, count, per_task):
+        yield ('random', seed + offset, min(per_task, count - offset))
+
+
+def _exhaustive_pairs(zone, prefix, max_length, alphabet):
+    if not prefix:
+        return [([], zone)]
+    return [(list(prefix + rest), zone) for n in range(max_length) for rest in product(alphabet, repeat=n)]
+
+
+def _random_pairs(config, seed, count):
+    """Near-miss sequences: valid policies truncated, substituted, extended or shuffled"""
+    rng = random.Random(seed)
+    zones = list(config.zone_policies)
+    alphabet = list(config.auth_symbols) + [INVALID_SYMBOL]
+    pairs = []
+    for _ in range(count):
+        roll = rng.random()
+        zone = UNKNOWN_ZONE if roll < 0.01 else None if roll < 0.02 else rng.choice(zones)
+        sequence = list(config.get_policy(rng.choice(zones) if zone is None or zone == UNKNOWN_ZONE else zone))
+        mutation = rng.randrange(6)
+        if mutation == 1 and sequence:
+            sequence = sequence[:rng.randrange(len(sequence))]
+        elif mutation == 2 and sequence:
+            sequence[rng.randrange(len(sequence))] = rng.choice(alphabet)
+        elif mutation == 3:
+            sequence.insert(rng.randrange(len(sequence) + 1), rng.choice(alphabet))
+        elif mutation == 4:
+            sequence += [rng.choice(alphabet) for _ in range(rng.randint(1, 3))]
+        elif mutation == 5:
+            rng.shuffle(sequence)
+        pairs.append((sequence, zone))
+    return pairs
+
+
+def _run_task(task):
+    """Returns: (decisions compared, [(backend, zone, sequence, expected, actual)])"""
+    if task[0] == 'exhaustive':
+        pairs = _exhaustive_pairs(*task[1:])
+    else:
+        pairs = _random_pairs(_WORKER['config'], *task[1:])
+
+    expected = _WORKER['reference'](pairs)
+    compared = 0
+    mismatches = []
+    for name, run in _WORKER['backends']:
+        for (sequence, zone), reference, actual in zip(pairs, expected, run(pairs)):
+            if actual is None:
+                continue
+            compared += 1
+            if any(actual[key] != reference[key] for key in actual):
+                if len(mismatches) < MAX_MISMATCHES:
+                    mismatches.append((name, zone, sequence, {key: reference[key] for key in actual}, actual))
+    return compared, mismatches
+
+
+def available_backends():
+    """Backend names whose dependencies are installed"""
+    names = list(BACKENDS)
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        names.remove('batch')
+    return names
+
+
+def fuzz(config, tasks, backends=None, workers=None):
+    """
+    Run tasks against the reference DFA and each backend, in parallel
+    Returns: (decisions compared, mismatches)
+    """
+    backends = backends or available_backends()
+    tasks = list(tasks)
+    workers = workers or multiprocessing.cpu_count()
+    if workers == 1:
+        _init_worker(config, backends)
+        outputs = map(_run_task, tasks)
+    else:
+        method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+        pool = multiprocessing.get_context(method).Pool(workers, _init_worker, (config, backends))
+        outputs = pool.imap_unordered(_run_task, tasks)
+
+    compared = 0
+    mismatches = []
+    try:
+        for count, found in outputs:
+            compared += count
+            mismatches.extend(found)
+    finally:
+        if workers != 1:
+            pool.close()
+            pool.join()
+    return compared, mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check optimized engines against the reference DFA")
+    parser.add_argument('--workers', type=int, help="Worker processes (default: CPU count)")
+    parser.add_argument('--backends', help=f"Comma-separated subset of {', '.join(BACKENDS)}")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    exhaustive_cmd = commands.add_parser('exhaustive', help="Every sequence up to a length, every zone")
+    exhaustive_cmd.add_argument('--length', type=int, default=5)
+    exhaustive_cmd.add_argument('--policies', metavar='PATH', help="Policy store file (default: built-in zones)")
+    exhaustive_cmd.add_argument('--no-invalid', action='store_true', help="Leave the invalid symbol out")
+
+    random_cmd = commands.add_parser('random', help="Random near-miss sequences over generated policies")
+    random_cmd.add_argument('--zones', type=int, default=10_000)
+    random_cmd.add_argument('--policy-length', type=int, default=6)
+    random_cmd.add_argument('--sequences', type=int, default=200_000)
+    random_cmd.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == 'exhaustive':
+        if args.policies:
+            from policy_store import PolicyStore
+            config = PolicyStore.load(args.policies)
+        else:
+            config = ZoneConfig()
+        alphabet = tuple(config.auth_symbols) + (() if args.no_invalid else (INVALID_SYMBOL,))
+        tasks = exhaustive_tasks(config, args.length, alphabet)
+    else:
+        from policy_store import PolicyStore, generate_policies
+        config = PolicyStore.from_policies(generate_policies(args.zones, args.policy_length, args.seed))
+        tasks = random_tasks(args.seed, args.sequences)
+
+    backends = args.backends.split(',') if args.backends else None
+    started = time.perf_counter()
+    compared, mismatches = fuzz(config, tasks, backends, args.workers)
+    elapsed = time.perf_counter() - started
+
+    for name, zone, sequence, expected, actual in mismatches:
+        print(f"MISMATCH [{name}] zone={zone} sequence={' '.join(sequence)}")
+        print(f"  expected: {expected}")
+        print(f"  actual:   {actual}")
+    print(f"Compared {compared:,} decisions against the reference in {elapsed:.1f}s: "
+          f"{len(mismatches)} mismatches")
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+# headless.py - Fast-Starting Headless Entry Point for Door Controllers
+
+import time
+
+STARTED = time.perf_counter()
+
+import argparse
+import json
+import sys
+
+from compile_cache import DEFAULT_CACHE_DIR, cached_engine
+from engine import CompiledPolicyEngine
+from sessions import SessionManager
+from snapshots import PolicyRegistry
+from zones import ZoneConfig
+
+# Only the DFA core is imported up front. The asyncio server, the policy
+# store loader and the Gradio UI are imported by the commands that use them,
+# and the compiled transition table comes from the on-disk compile cache
+# (compile_cache.py) when the same policies were compiled before.
+
+
+def build_registry(policies_path=None, cache_dir=DEFAULT_CACHE_DIR, watch=True):
+    """PolicyRegistry for the built-in zones or a policy store file (watched for changes)"""
+    if policies_path:
+        from policy_store import PolicyStore
+        config = PolicyStore.load(policies_path)
+    else:
+        config = ZoneConfig()
+
+    if cache_dir:
+        engine, _ = cached_engine(config, cache_dir=cache_dir)
+    else:
+        engine = CompiledPolicyEngine(config)
+    registry = PolicyRegistry(engine=engine)
+    if policies_path and watch:
+        registry.watch(policies_path)
+    return registry
+
+
+def build_sessions(policies_path=None, cache_dir=DEFAULT_CACHE_DIR, **options):
+    """SessionManager for the built-in zones or a policy store file; options go to SessionManager"""
+    return SessionManager(registry=build_registry(policies_path, cache_dir), **options)
+
+
+def report_ready(args):
+    if args.startup_time:
+        print(f"Ready in {(time.perf_counter() - STARTED) * 1000:.1f} ms", file=sys.stderr)
+
+
+def run_check(sessions, zone, symbols):
+    """Decide one sequence; returns the process exit code (0 when granted)"""
+    results = sessions.process_sequence('check', symbols, zone)
+    for result in results:
+        print(json.dumps(result))
+    return 0 if results and results[-1]['state'] == 'ACCEPTED' else 1
+
+
+def run_stdio(sessions, stdin=sys.stdin, stdout=sys.stdout):
+    """Serve the server.py line protocol over stdin/stdout, without asyncio"""
+    from server import AccessControlServer
+
+    server = AccessControlServer(sessions)
+    for line in stdin:
+        if line.strip():
+            stdout.write(server.handle_line(line))
+            stdout.flush()
+    return server.events_processed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless access control entry point")
+    parser.add_argument('--policies', metavar='PATH', help="Policy store file (default: built-in zones)")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help="Compiled policy cache directory")
+    parser.add_argument('--no-cache', action='store_true', help="Always compile the policies")
+    parser.add_argument('--startup-time', action='store_true', help="Report time to ready on stderr")
+    commands = parser.add_subparsers(dest='command')
+
+    check_cmd = commands.add_parser('check', help="Decide one sequence and exit (status 0 if granted)")
+    check_cmd.add_argument('zone')
+    check_cmd.add_argument('symbols', nargs='+')
+
+    commands.add_parser('stdio', help="Line protocol on stdin/stdout (default)")
+
+    serve_cmd = commands.add_parser('serve', help="asyncio TCP/Unix socket server")
+    serve_cmd.add_argument('--host', default='localhost')
+    serve_cmd.add_argument('--port', type=int, default=8765)
+    serve_cmd.add_argument('--unix', metavar='PATH')
+
+    http_cmd = commands.add_parser('http', help="Batched HTTP JSON decision API")
+    http_cmd.add_argument('--host', default='localhost')
+    http_cmd.add_argument('--port', type=int, default=8080)
+    http_cmd.add_argument('--workers', type=int, default=1)
+
+    commands.add_parser('ui', help="Gradio web UI")
+    args = parser.parse_args()
+
+    if args.command == 'ui':
+        import app
+        report_ready(args)
+        app.main()
+        return 0
+
+    if args.command == 'http':
+        from http_api import DecisionHTTPServer, serve
+        server = DecisionHTTPServer((args.host, args.port),
+                                    build_registry(args.policies, None if args.no_cache else args.cache_dir, watch=False))
+        report_ready(args)
+        try:
+            serve(server, args.workers, args.policies)
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    sessions = build_sessions(args.policies, None if args.no_cache else args.cache_dir)
+    if args.command == 'check':
+        report_ready(args)
+        return run_check(sessions, args.zone, args.symbols)
+
+    if args.command == 'serve':
+        import asyncio
+        from server import AccessControlServer
+
+        async def serve():
+            listener = await AccessControlServer(sessions).start(args.host, args.port, args.unix)
+            report_ready(args)
+            async with listener:
+                await listener.serve_forever()
+
+        try:
+            asyncio.run(serve())
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    report_ready(args)
+    try:
+        run_stdio(sessions)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+# http_api.py - Batched HTTP JSON Decision API for Door Controllers
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from feed import FeedSession, FEED_PENDING
+from prefork import run_workers
+from snapshots import PolicyRegistry
+
+# POST /decide with a JSON body
+#   {"requests": [{"zone": "MAIN_ENTRANCE", "sequence": ["C", "P", "F", "V"]}, ...]}
+# (a bare list of requests is accepted too; a sequence may also be one
+# space-separated string) is answered with one code per request, in order:
+#   {"version": 3, "decisions": [1, 0, 2], "reasons": [0, 5, 0]}
+# decisions are FEED_REJECTED (0), FEED_ACCEPTED (1) or FEED_PENDING (2, the
+# sequence ended before the policy did); reasons are reasons.py codes. Each
+# request is decided on its own, so no state is kept between requests and
+# any worker can answer any of them. GET /health answers {"version": N}.
+# Connections are HTTP/1.1 keep-alive; worker processes share one listening
+# socket and each serves its connections from threads.
+MAX_BODY = 1024 * 1024
+MAX_BATCH = 10_000
+
+
+def decide(engine, requests):
+    """Decide a list of {'zone', 'sequence'} requests; returns (decisions, reasons)"""
+    session = FeedSession(engine)
+    decisions = []
+    reasons = []
+    for request in requests:
+        if not isinstance(request, dict):
+            raise ValueError("Each request must be an object")
+        sequence = request.get('sequence', [])
+        if isinstance(sequence, str):
+            sequence = sequence.split()
+        elif not isinstance(sequence, list):
+            raise ValueError("sequence must be a list or a string")
+        zone = request.get('zone') or None
+        if zone is not None and not isinstance(zone, str):
+            raise ValueError("zone must be a string")
+        session.reset(zone)
+        for symbol in sequence:
+            if session.feed(symbol) != FEED_PENDING:
+                break
+        decisions.append(session.status)
+        reasons.append(session.reason())
+    return decisions, reasons
+
+
+class DecisionHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Small responses on a kept-alive connection must not wait for delayed ACKs
+    disable_nagle_algorithm = True
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, separators=(',', ':')).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != '/health':
+            self._send_json(404, {'error': 'Not found'})
+            return
+        self._send_json(200, {'version': self.server.registry.version})
+
+    def do_POST(self):
+        if self.path != '/decide':
+            self._send_json(404, {'error': 'Not found'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', ''))
+        except ValueError:
+            self._send_json(411, {'error': 'Content-Length required'})
+            self.close_connection = True
+            return
+        if length < 0:
+            # rfile.read(-1) would block until the client closes the connection
+            self._send_json(400, {'error': 'Invalid Content-Length'})
+            self.close_connection = True
+            return
+        if length > MAX_BODY:
+            self._send_json(413, {'error': f'Body larger than {MAX_BODY} bytes'})
+            self.close_connection = True
+            return
+
+        body = self.rfile.read(length)
+        try:
+            payload = json.loads(body)
+            requests = payload.get('requests') if isinstance(payload, dict) else payload
+            if not isinstance(requests, list):
+                raise ValueError("Expected a list of requests")
+            if len(requests) > MAX_BATCH:
+                raise ValueError(f"At most {MAX_BATCH} requests per batch")
+            # One snapshot per batch, so a reload never splits a batch
+            snapshot = self.server.registry.current
+            decisions, reasons = decide(snapshot.engine, requests)
+        except (ValueError, TypeError) as e:
+            # json.JSONDecodeError is a ValueError; unhashable symbols raise TypeError
+            self._send_json(400, {'error': str(e)})
+            return
+        self._send_json(200, {'version': snapshot.version, 'decisions': decisions, 'reasons': reasons})
+
+    def log_message(self, format, *args):
+        pass
+
+
+class DecisionHTTPServer(ThreadingHTTPServer):
+    """Threaded HTTP server answering /decide from a PolicyRegistry"""
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, registry=None):
+        self.registry = registry or PolicyRegistry()
+        super().__init__(address, DecisionHandler)
+
+
+def serve(server, workers=1, policies_path=None):
+    """
+    Serve forever from `workers` processes sharing the server's socket.
+    The parent is one of them; children are forked after the socket is
+    bound and share the compiled tables copy-on-write.
+    """
+    def serve_one():
+        # Threads do not survive fork, so each process watches for itself
+        if policies_path:
+            server.registry.watch(policies_path)
+        server.serve_forever()
+
+    try:
+        run_workers(workers, serve_one)
+    finally:
+        server.server_close()
+
+
+def start_in_thread(server):
+    """Serve from a daemon thread (tests and in-process load tests); returns the server"""
+    threading.Thread(target=server.serve_forever, name='decision-http', daemon=True).start()
+    return server
+
+
+def main():
+    import argparse
+    from headless import build_registry
+    from compile_cache import DEFAULT_CACHE_DIR
+
+    parser = argparse.ArgumentParser(description="Batched HTTP JSON access decision API")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=1, help="Worker processes sharing the socket")
+    parser.add_argument('--policies', metavar='PATH', help="Policy store file to load and watch for changes")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help="Compiled policy cache directory")
+    parser.add_argument('--no-cache', action='store_true', help="Always compile the policies")
+    args = parser.parse_args()
+
+    registry = build_registry(args.policies, None if args.no_cache else args.cache_dir, watch=False)
+    server = DecisionHTTPServer((args.host, args.port), registry)
+    print(f"Decision API on http://{args.host}:{server.server_address[1]}/decide ({args.workers} workers)")
+    try:
+        serve(server, args.workers, args.policies)
+    except KeyboardInterrupt:
+        print("\nServer stopped.")
+
+if __name__ == "__main__":
+    main()
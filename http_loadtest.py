@@ -0,0 +1,151 @@
+# http_loadtest.py - Load Test for the HTTP Decision API (Requests/s and Latency)
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import time
+
+from zones import ZoneConfig
+
+# Each client process holds one keep-alive connection and sends batches back
+# to back, timing every request from the first byte sent to the last byte
+# read. Batches mix valid policies with corrupted ones (a substituted symbol
+# or a truncated sequence), so every outcome code is exercised.
+
+
+def make_batches(config, count, batch_size, seed=0):
+    """`count` encoded /decide bodies of batch_size requests each"""
+    rng = random.Random(seed)
+    zones = list(config.zone_policies)
+    symbols = list(config.auth_symbols)
+    batches = []
+    for _ in range(count):
+        requests = []
+        for _ in range(batch_size):
+            zone = rng.choice(zones)
+            sequence = list(config.get_policy(zone))
+            roll = rng.random()
+            if roll < 0.1 and sequence:
+                sequence[rng.randrange(len(sequence))] = rng.choice(symbols)
+            elif roll < 0.2 and sequence:
+                sequence = sequence[:rng.randrange(len(sequence))]
+            requests.append({'zone': zone, 'sequence': sequence})
+        batches.append(json.dumps({'requests': requests}).encode())
+    return batches
+
+
+def _client(task):
+    host, port, batches = task
+    connection = http.client.HTTPConnection(host, port)
+    headers = {'Content-Type': 'application/json'}
+    clock = time.perf_counter_ns
+    latencies = []
+    errors = 0
+    for body in batches:
+        started = clock()
+        connection.request('POST', '/decide', body, headers)
+        response = connection.getresponse()
+        response.read()
+        latencies.append(clock() - started)
+        errors += response.status != 200
+    connection.close()
+    return latencies, errors
+
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def load_test(host, port, batches, connections=4):
+    """
+    Send batches over `connections` concurrent keep-alive connections
+    Returns: {'requests', 'errors', 'seconds', 'requests_per_sec', 'p50_ms', 'p99_ms', 'max_ms'}
+    """
+    tasks = [(host, port, batches[i::connections]) for i in range(connections)]
+    method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+    with multiprocessing.get_context(method).Pool(connections) as pool:
+        started = time.perf_counter()
+        outputs = pool.map(_client, tasks)
+        elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for output, _ in outputs for latency in output)
+    return {
+        'requests': len(latencies),
+        'errors': sum(errors for _, errors in outputs),
+        'seconds': elapsed,
+        'requests_per_sec': len(latencies) / elapsed,
+        'p50_ms': _percentile(latencies, 0.50) / 1e6,
+        'p99_ms': _percentile(latencies, 0.99) / 1e6,
+        'max_ms': latencies[-1] / 1e6,
+    }
+
+
+def wait_ready(host, port, timeout=30.0):
+    """Poll GET /health until the server answers"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            connection = http.client.HTTPConnection(host, port, timeout=1)
+            connection.request('GET', '/health')
+            connection.getresponse().read()
+            connection.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the HTTP decision API")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--connections', type=int, default=4, help="Concurrent keep-alive connections")
+    parser.add_argument('--requests', type=int, default=5000, help="HTTP requests in total")
+    parser.add_argument('--batch', type=int, default=32, help="Decisions per request")
+    parser.add_argument('--policies', metavar='PATH', help="Policy store file the server uses (default: built-in)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--spawn', action='store_true', help="Start http_api.py on --port for the run")
+    parser.add_argument('--workers', type=int, default=1, help="Server worker processes with --spawn")
+    parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+    args = parser.parse_args()
+
+    if args.policies:
+        from policy_store import PolicyStore
+        config = PolicyStore.load(args.policies)
+    else:
+        config = ZoneConfig()
+    batches = make_batches(config, args.requests, args.batch, args.seed)
+
+    server = None
+    if args.spawn:
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'http_api.py')
+        command = [sys.executable, script, '--host', args.host, '--port', str(args.port), '--workers', str(args.workers)]
+        if args.policies:
+            command += ['--policies', args.policies]
+        server = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    try:
+        wait_ready(args.host, args.port)
+        results = load_test(args.host, args.port, batches, args.connections)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{results['requests']:,} requests x {args.batch} decisions over {args.connections} connections "
+          f"in {results['seconds']:.2f}s ({results['errors']} errors)")
+    print(f"  {results['requests_per_sec']:,.0f} requests/s, "
+          f"{results['requests_per_sec'] * args.batch:,.0f} decisions/s")
+    print(f"  latency p50 {results['p50_ms']:.2f} ms, p99 {results['p99_ms']:.2f} ms, "
+          f"max {results['max_ms']:.2f} ms")
+
+if __name__ == "__main__":
+    main()
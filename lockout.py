@@ -0,0 +1,196 @@
+# lockout.py - Brute-Force Lockout With Bounded-Memory Sliding Windows
+
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from reasons import (
+    REASON_INVALID_SYMBOL, REASON_TOO_LONG, REASON_WRONG_METHOD, REASON_NO_MATCHING_ZONE,
+)
+
+DEFAULT_MAX_DOORS = 65_536
+
+# Rejections that count as a failed attempt (not config errors like an unknown zone)
+FAILURE_REASONS = frozenset((
+    REASON_INVALID_SYMBOL, REASON_TOO_LONG, REASON_WRONG_METHOD, REASON_NO_MATCHING_ZONE,
+))
+
+
+class RingWindow:
+    """
+    Per-key event counts over a sliding window kept as a ring of time slices.
+    At most maxsize keys are tracked; the least recently used is dropped first.
+    """
+
+    def __init__(self, window=60.0, buckets=12, maxsize=DEFAULT_MAX_DOORS):
+        self.slice = window / buckets
+        self.buckets = buckets
+        self.maxsize = maxsize
+        # LRU map of key -> [newest slice number, counts per slice]
+        self._rings = OrderedDict()
+
+    def __len__(self):
+        return len(self._rings)
+
+    def _ring(self, key, current):
+        ring = self._rings.get(key)
+        if ring is None:
+            ring = self._rings[key] = [current, [0] * self.buckets]
+            if len(self._rings) > self.maxsize:
+                self._rings.popitem(last=False)
+            return ring
+        self._rings.move_to_end(key)
+        if current > ring[0]:
+            counts = ring[1]
+            for i in range(ring[0] + 1, min(current, ring[0] + self.buckets) + 1):
+                counts[i % self.buckets] = 0
+            ring[0] = current
+        return ring
+
+    def add(self, key, now):
+        """Count one event for key; returns the count in the window"""
+        current = int(now / self.slice)
+        counts = self._ring(key, current)[1]
+        counts[current % self.buckets] += 1
+        return sum(counts)
+
+    def count(self, key, now):
+        if key not in self._rings:
+            return 0
+        return sum(self._ring(key, int(now / self.slice))[1])
+
+
+class SlidingCountMinSketch:
+    """
+    Count-min sketch over a sliding window, in fixed memory.
+
+    One depth x width table per time slice plus a running total across
+    slices; when a slice falls out of the window its counts are subtracted
+    from the total. Estimates never undercount.
+    """
+
+    def __init__(self, width=2048, depth=4, window=60.0, buckets=12):
+        self.width = width
+        self.depth = depth
+        self.slice = window / buckets
+        self.buckets = buckets
+        cells = width * depth
+        self._slices = [array('I', bytes(4 * cells)) for _ in range(buckets)]
+        self._total = array('I', bytes(4 * cells))
+        self._current = None
+
+    def cells(self, key):
+        width = self.width
+        return [row * width + hash((row, key)) % width for row in range(self.depth)]
+
+    def _advance(self, now):
+        current = int(now / self.slice)
+        if self._current is None:
+            self._current = current
+        elif current > self._current:
+            total = self._total
+            for i in range(self._current + 1, min(current, self._current + self.buckets) + 1):
+                expired = self._slices[i % self.buckets]
+                if any(expired):
+                    for cell, count in enumerate(expired):
+                        if count:
+                            total[cell] -= count
+                    self._slices[i % self.buckets] = array('I', bytes(4 * len(total)))
+            self._current = current
+        return self._slices[self._current % self.buckets]
+
+    def add(self, key, now):
+        """Count one event for key; returns its estimated count in the window"""
+        counts = self._advance(now)
+        total = self._total
+        estimate = None
+        for cell in self.cells(key):
+            counts[cell] += 1
+            total[cell] += 1
+            if estimate is None or total[cell] < estimate:
+                estimate = total[cell]
+        return estimate
+
+    def estimate(self, key, now):
+        self._advance(now)
+        total = self._total
+        return min(total[cell] for cell in self.cells(key))
+
+
+class LockoutGuard:
+    """
+    Locks a door or a credential after too many failed attempts in a window.
+
+    Doors get exact ring-buffer windows. Door IDs come from the caller
+    too, so at most max_doors windows and door locks are kept, least
+    recently used first out; locks all last the same time, so the lock
+    dropped is always the one closest to expiring.
+    Credentials (badge or user IDs supplied by the caller) come from an
+    open-ended space, so both their failure counts and their lock expiry
+    times live in fixed-size sketches; a hash collision can only make a
+    lockout stricter, never let a locked credential through.
+    """
+
+    def __init__(self, max_door_failures=5, max_credential_failures=5, window=60.0,
+                 lockout=300.0, buckets=12, sketch_width=2048, sketch_depth=4, clock=time.monotonic,
+                 max_doors=DEFAULT_MAX_DOORS):
+        self.max_door_failures = max_door_failures
+        self.max_credential_failures = max_credential_failures
+        self.lockout = lockout
+        self.clock = clock
+        self.max_doors = max_doors
+        self.doors = RingWindow(window, buckets, max_doors)
+        self.credentials = SlidingCountMinSketch(sketch_width, sketch_depth, window, buckets)
+        # Insertion-ordered, so the oldest entry expires first
+        self._door_locked_until = OrderedDict()
+        # Max-merged lock expiry per sketch cell
+        self._credential_locked_until = array('d', bytes(8 * sketch_width * sketch_depth))
+        self.lockouts = 0
+        self.blocked = 0
+        self._lock = threading.Lock()
+
+    def locked(self, door_id, credential=None):
+        """Whether an event for this door/credential must be refused"""
+        now = self.clock()
+        with self._lock:
+            until = self._door_locked_until.get(door_id)
+            if until is not None:
+                if until > now:
+                    self.blocked += 1
+                    return True
+                del self._door_locked_until[door_id]
+            if credential is not None:
+                locked_until = self._credential_locked_until
+                if min(locked_until[cell] for cell in self.credentials.cells(credential)) > now:
+                    self.blocked += 1
+                    return True
+        return False
+
+    def record_failure(self, door_id, credential=None):
+        """Count a failed attempt and start a lockout once a limit is reached"""
+        now = self.clock()
+        with self._lock:
+            if self.doors.add(door_id, now) >= self.max_door_failures:
+                locked_until = self._door_locked_until
+                locked_until[door_id] = now + self.lockout
+                locked_until.move_to_end(door_id)
+                if len(locked_until) > self.max_doors:
+                    locked_until.popitem(last=False)
+                self.lockouts += 1
+            if credential is not None and self.credentials.add(credential, now) >= self.max_credential_failures:
+                until = now + self.lockout
+                locked_until = self._credential_locked_until
+                for cell in self.credentials.cells(credential):
+                    if locked_until[cell] < until:
+                        locked_until[cell] = until
+                self.lockouts += 1
+
+    def stats(self):
+        now = self.clock()
+        return {
+            'tracked_doors': len(self.doors),
+            'locked_doors': sum(1 for until in self._door_locked_until.values() if until > now),
+            'lockouts': self.lockouts,
+            'blocked': self.blocked,
+        }
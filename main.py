@@ -1,6 +1,8 @@
 # main.py - Main Access Control System
 
 from dfa import AccessControlDFA
+from policy_lang import describe_policy
+from zone_matcher import ZoneMatcher
 from zones import ZoneConfig
 
 def display_menu():
@@ -34,15 +36,16 @@ def display_zone_policies(config):
     print("\nZone Access Policies:")
     print("-" * 60)
     for zone, policy in config.zone_policies.items():
-        policy_names = [config.get_auth_name(symbol) for symbol in policy]
-        print(f"{zone.replace('_', ' '):<15}: {' → '.join(policy_names)}")
-        print(f"{'Sequence':<15}: {' → '.join(policy)}")
+        policy_names, policy_symbols = describe_policy(config, policy)
+        print(f"{zone.replace('_', ' '):<15}: {policy_names}")
+        print(f"{'Sequence':<15}: {policy_symbols}")
         print()
 
 def test_authentication():
     """Interactive authentication testing"""
     dfa = AccessControlDFA()
     config = ZoneConfig()
+    matcher = ZoneMatcher(config)
     
     print("\nInteractive Authentication Test")
     print("-" * 40)
@@ -59,8 +62,9 @@ def test_authentication():
             policy = config.get_policy(selected_zone)
             
             print(f"\nSelected Zone: {selected_zone.replace('_', ' ')}")
-            print(f"Required Sequence: {' → '.join([config.get_auth_name(s) for s in policy])}")
-            print(f"Symbol Sequence: {' → '.join(policy)}")
+            policy_names, policy_symbols = describe_policy(config, policy)
+            print(f"Required Sequence: {policy_names}")
+            print(f"Symbol Sequence: {policy_symbols}")
             
             # Get authentication sequence from user
             print(f"\nEnter authentication sequence (space-separated symbols):")
@@ -83,6 +87,9 @@ def test_authentication():
                 print(f"\n✅ FINAL RESULT: ACCESS GRANTED TO {selected_zone}")
             else:
                 print(f"\n❌ FINAL RESULT: ACCESS DENIED")
+                opened = matcher.matching_zones(sequence_input)
+                if opened:
+                    print(f"   This sequence opens: {', '.join(opened)}")
                 
         else:
             print("Invalid zone selection!")
@@ -94,6 +101,8 @@ def run_test_cases():
     """Run predefined test cases"""
     dfa = AccessControlDFA()
     config = ZoneConfig()
+    # One matcher for all cases: lists the zones a rejected sequence opens instead
+    matcher = ZoneMatcher(config)
     
     # ✅ UPDATED TEST CASES TO MATCH YOUR CORRECTED ZONE POLICIES
     test_cases = [
@@ -125,6 +134,10 @@ def run_test_cases():
         pass_fail = 'PASS' if actual == expected else 'FAIL'
         
         print(f"{description:<30} {expected:<12} {actual:<12} {pass_fail:<10}")
+        if actual == 'REJECTED':
+            opened = [other for other in matcher.matching_zones(sequence) if other != zone]
+            if opened:
+                print(f"  Opens instead: {', '.join(opened)}")
         
         # Show details for failed tests
         if pass_fail == 'FAIL':
@@ -0,0 +1,193 @@
+# metrics.py - Transition Counters, Latency Histograms and Prometheus Export
+
+import threading
+import time
+import weakref
+from bisect import bisect_left
+
+from reasons import REASON_NAMES
+
+# Latency bucket upper bounds in nanoseconds (Prometheus "le" labels, in seconds)
+LATENCY_BUCKETS_NS = (1_000, 2_500, 5_000, 10_000, 25_000, 50_000, 100_000, 250_000, 1_000_000)
+
+# Time one transition in this many per thread
+DEFAULT_SAMPLE_EVERY = 64
+
+
+class _Shard:
+    """Counters owned by one thread; only that thread writes them"""
+    __slots__ = ('transitions', 'reasons', 'latency', 'latency_sum', 'calls')
+
+    def __init__(self):
+        # (zone, state) -> count; split into per-zone and per-state totals on scrape
+        self.transitions = {}
+        self.reasons = [0] * len(REASON_NAMES)
+        self.latency = [0] * (len(LATENCY_BUCKETS_NS) + 1)
+        self.latency_sum = 0
+        self.calls = 0
+
+    def add(self, other):
+        """Add another shard's counts to this one"""
+        transitions = self.transitions
+        # dict() copies in one step, so a concurrent insert cannot break iteration
+        for key, count in dict(other.transitions).items():
+            transitions[key] = transitions.get(key, 0) + count
+        for i, count in enumerate(list(other.reasons)):
+            self.reasons[i] += count
+        for i, count in enumerate(list(other.latency)):
+            self.latency[i] += count
+        self.latency_sum += other.latency_sum
+        self.calls += other.calls
+
+
+class _ShardOwner:
+    """Lives only in its thread's local storage; dies (and retires the shard) with the thread"""
+    __slots__ = ('__weakref__',)
+
+
+class Metrics:
+    """
+    Per-zone and per-state transition counters, reason counts and a sampled
+    latency histogram.
+
+    Every thread increments its own shard without locking; scraping merges
+    all shards. When a thread finishes, its shard is folded into a retired
+    total, so totals never drop and thread-per-request servers do not
+    accumulate one shard per request.
+    """
+
+    def __init__(self, sample_every=DEFAULT_SAMPLE_EVERY):
+        self.sample_every = sample_every
+        self._local = threading.local()
+        self._shards = set()
+        self._retired = _Shard()
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = _Shard()
+            owner = self._local.owner = _ShardOwner()
+            with self._lock:
+                self._shards.add(shard)
+            weakref.finalize(owner, self._retire, shard)
+            return shard
+
+    def _retire(self, shard):
+        # The owning thread is gone, so nothing writes the shard any more
+        with self._lock:
+            self._shards.discard(shard)
+            self._retired.add(shard)
+
+    def start(self):
+        """Call before a transition; returns a start time for sampled calls, else 0"""
+        shard = self._shard()
+        shard.calls += 1
+        if shard.calls % self.sample_every:
+            return 0
+        return time.perf_counter_ns()
+
+    def record(self, zone, state, reason, started=0):
+        """Count a transition after start() on the same thread (zone may be None)"""
+        elapsed = time.perf_counter_ns() - started if started else 0
+        shard = self._local.shard
+        transitions = shard.transitions
+        key = (zone, state)
+        transitions[key] = transitions.get(key, 0) + 1
+        shard.reasons[reason] += 1
+        if started:
+            shard.latency[bisect_left(LATENCY_BUCKETS_NS, elapsed)] += 1
+            shard.latency_sum += elapsed
+
+    def snapshot(self):
+        """Merged counters from all threads"""
+        total = _Shard()
+        with self._lock:
+            shards = list(self._shards)
+            total.add(self._retired)
+        for shard in shards:
+            total.add(shard)
+
+        zones, states = {}, {}
+        for (zone, state), count in total.transitions.items():
+            zones[zone] = zones.get(zone, 0) + count
+            states[state] = states.get(state, 0) + count
+        reasons = total.reasons
+        return {
+            'transitions': sum(reasons),
+            'zones': zones,
+            'states': states,
+            'reasons': {REASON_NAMES[i]: count for i, count in enumerate(reasons) if count},
+            'latency_buckets': total.latency,
+            'latency_sum_ns': total.latency_sum,
+        }
+
+    def render_prometheus(self):
+        """Counters in the Prometheus text exposition format"""
+        data = self.snapshot()
+        lines = [
+            "# HELP access_transitions_total Symbols processed by the access control DFA.",
+            "# TYPE access_transitions_total counter",
+            f"access_transitions_total {data['transitions']}",
+            "# HELP access_zone_transitions_total Symbols processed per target zone.",
+            "# TYPE access_zone_transitions_total counter",
+        ]
+        for zone, count in sorted(data['zones'].items(), key=lambda item: item[0] or ''):
+            lines.append(f'access_zone_transitions_total{{zone="{_label(zone or "-")}"}} {count}')
+
+        lines += [
+            "# HELP access_state_transitions_total Transitions per resulting state.",
+            "# TYPE access_state_transitions_total counter",
+        ]
+        for state, count in sorted(data['states'].items()):
+            lines.append(f'access_state_transitions_total{{state="{_label(state)}"}} {count}')
+
+        lines += [
+            "# HELP access_transition_reasons_total Transitions per reason code.",
+            "# TYPE access_transition_reasons_total counter",
+        ]
+        for reason, count in data['reasons'].items():
+            lines.append(f'access_transition_reasons_total{{reason="{reason}"}} {count}')
+
+        lines += [
+            "# HELP access_transition_latency_seconds Sampled transition latency.",
+            "# TYPE access_transition_latency_seconds histogram",
+        ]
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS_NS + (None,), data['latency_buckets']):
+            cumulative += count
+            le = '+Inf' if bound is None else f'{bound / 1e9:g}'
+            lines.append(f'access_transition_latency_seconds_bucket{{le="{le}"}} {cumulative}')
+        lines.append(f"access_transition_latency_seconds_sum {data['latency_sum_ns'] / 1e9:.9f}")
+        lines.append(f"access_transition_latency_seconds_count {cumulative}")
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, host='localhost', port=9464):
+        """Serve /metrics over HTTP from a daemon thread; returns the server"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render_prometheus().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+        return server
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,134 @@
+# minimize.py - Hopcroft Minimization of the Compiled Transition Table
+
+from array import array
+
+
+def minimize_table(table, num_states, num_symbols, labels):
+    """
+    Partition states into equivalence classes (Hopcroft's algorithm).
+
+    table: flat state x symbol array of next states
+    labels: one hashable label per state; states with different labels are
+            never merged (e.g. REJECTED, ACCEPTED, or per-zone accept tags)
+    Returns: (class_of, num_classes) where class_of maps state -> class.
+    Classes are numbered by the first state that belongs to them, so states
+    that are alone in their class at the front of the table keep their id.
+    """
+    # Inverse transitions per symbol, counting-sorted by target:
+    # sources[starts[t]:starts[t + 1]] are the states that reach t
+    inverse = []
+    for symbol in range(num_symbols):
+        targets = table[symbol::num_symbols]
+        starts = array('I', bytes(4 * (num_states + 1)))
+        for target in targets:
+            starts[target + 1] += 1
+        for state in range(num_states):
+            starts[state + 1] += starts[state]
+        fill = array('I', starts)
+        sources = array('I', bytes(4 * num_states))
+        for state, target in enumerate(targets):
+            sources[fill[target]] = state
+            fill[target] += 1
+        inverse.append((starts, sources))
+
+    # Initial partition by label
+    blocks = []
+    block_of = [0] * num_states
+    by_label = {}
+    for state in range(num_states):
+        block = by_label.get(labels[state])
+        if block is None:
+            block = by_label[labels[state]] = len(blocks)
+            blocks.append(set())
+        blocks[block].add(state)
+        block_of[state] = block
+
+    worklist = list(range(len(blocks)))
+    in_worklist = [True] * len(blocks)
+
+    while worklist:
+        splitter = worklist.pop()
+        in_worklist[splitter] = False
+        members = list(blocks[splitter])
+
+        for starts, sources in inverse:
+            # Group the predecessors of the splitter by their current block
+            touched = {}
+            for target in members:
+                for source in sources[starts[target]:starts[target + 1]]:
+                    touched.setdefault(block_of[source], []).append(source)
+
+            for block, predecessors in touched.items():
+                if len(predecessors) == len(blocks[block]):
+                    continue
+
+                # Split: predecessors move to a new block
+                new_block = len(blocks)
+                moved = set(predecessors)
+                blocks[block] -= moved
+                blocks.append(moved)
+                for state in moved:
+                    block_of[state] = new_block
+
+                if in_worklist[block]:
+                    worklist.append(new_block)
+                    in_worklist.append(True)
+                else:
+                    # Only the smaller half needs to be processed
+                    smaller = new_block if len(moved) <= len(blocks[block]) else block
+                    in_worklist.append(False)
+                    in_worklist[smaller] = True
+                    worklist.append(smaller)
+
+    # Renumber classes in order of first appearance
+    class_of = [0] * num_states
+    numbering = {}
+    for state in range(num_states):
+        block = block_of[state]
+        if block not in numbering:
+            numbering[block] = len(numbering)
+        class_of[state] = numbering[block]
+
+    return class_of, len(numbering)
+
+
+def collapse_table(table, num_states, num_symbols, class_of, num_classes):
+    """Build the transition table over equivalence classes"""
+    collapsed = array(table.typecode, bytes(table.itemsize * num_classes * num_symbols))
+    seen = [False] * num_classes
+    for state in range(num_states):
+        cls = class_of[state]
+        if seen[cls]:
+            continue
+        seen[cls] = True
+        row = state * num_symbols
+        new_row = cls * num_symbols
+        for symbol in range(num_symbols):
+            collapsed[new_row + symbol] = class_of[table[row + symbol]]
+    return collapsed
+
+
+def main():
+    import argparse
+
+    from engine import CompiledPolicyEngine
+    from zones import ZoneConfig
+
+    parser = argparse.ArgumentParser(description="Report state reduction from minimizing the policy automaton")
+    parser.add_argument('--policies', metavar='PATH', help="Policy store file (default: built-in zones)")
+    args = parser.parse_args()
+
+    if args.policies:
+        from policy_store import PolicyStore
+        config = PolicyStore.load(args.policies)
+    else:
+        config = ZoneConfig()
+
+    engine = CompiledPolicyEngine(config, minimize=True)
+    before, after = engine.unminimized_states, engine.num_states
+    print(f"Zones: {len(engine.zones):,}")
+    print(f"States: {before:,} -> {after:,} ({100 * (before - after) / before:.1f}% fewer)")
+    print(f"Table size: {before * engine.num_symbols * 4:,} -> {after * engine.num_symbols * 4:,} bytes")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+# policy_lang.py - Policy Expression Language Compiled to Cached DFAs
+
+import hashlib
+from array import array
+
+from minimize import minimize_table
+
+# Grammar (whitespace is ignored between tokens):
+#   expr := seq ('|' seq)*
+#   seq  := item*
+#   item := atom ('?' | '*' | '+')*
+#   atom := SYMBOL | '(' expr ')'
+# Example: "(C|K) P (F|R)" = Card or Keypad, then PIN, then Fingerprint or Retina.
+#
+# Access is granted as soon as the input matches, like fixed sequences, so
+# repetition only matters before the final step (e.g. "C P* F").
+
+OPERATORS = '|()?*+'
+
+# Compiled expressions by hash of (alphabet, expression); survives reloads
+_CACHE = {}
+
+
+class PolicySyntaxError(ValueError):
+    pass
+
+
+def tokenize(expression, symbols):
+    """Split an expression into operator and symbol tokens"""
+    tokens = []
+    i = 0
+    while i < len(expression):
+        char = expression[i]
+        if char.isspace():
+            i += 1
+        elif char in OPERATORS:
+            tokens.append(char)
+            i += 1
+        else:
+            end = i
+            while end < len(expression) and not expression[end].isspace() and expression[end] not in OPERATORS:
+                end += 1
+            word = expression[i:end]
+            if word in symbols:
+                tokens.append(('SYM', word))
+            elif all(char in symbols for char in word):
+                # Run of single-letter symbols, e.g. "CP"
+                tokens.extend(('SYM', char) for char in word)
+            else:
+                raise PolicySyntaxError(f"Unknown authentication symbol '{word}' in policy: {expression}")
+            i = end
+    return tokens
+
+
+class _NFA:
+    """Thompson NFA: per state, epsilon targets and (symbol, target) edges"""
+
+    def __init__(self):
+        self.epsilon = []
+        self.edges = []
+
+    def new_state(self):
+        self.epsilon.append([])
+        self.edges.append([])
+        return len(self.epsilon) - 1
+
+
+class _Parser:
+    """Recursive-descent parser building NFA fragments (start, end)"""
+
+    def __init__(self, tokens, nfa, expression):
+        self.tokens = tokens
+        self.pos = 0
+        self.nfa = nfa
+        self.expression = expression
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def parse(self):
+        fragment = self.parse_expr()
+        if self.peek() is not None:
+            raise PolicySyntaxError(f"Unexpected '{self.peek()}' in policy: {self.expression}")
+        return fragment
+
+    def parse_expr(self):
+        branches = [self.parse_seq()]
+        while self.peek() == '|':
+            self.pos += 1
+            branches.append(self.parse_seq())
+        if len(branches) == 1:
+            return branches[0]
+
+        start, end = self.nfa.new_state(), self.nfa.new_state()
+        for branch_start, branch_end in branches:
+            self.nfa.epsilon[start].append(branch_start)
+            self.nfa.epsilon[branch_end].append(end)
+        return start, end
+
+    def parse_seq(self):
+        start = end = self.nfa.new_state()
+        while self.peek() not in (None, '|', ')'):
+            item_start, item_end = self.parse_item()
+            self.nfa.epsilon[end].append(item_start)
+            end = item_end
+        return start, end
+
+    def parse_item(self):
+        start, end = self.parse_atom()
+        while self.peek() in ('?', '*', '+'):
+            operator = self.tokens[self.pos]
+            self.pos += 1
+            new_start, new_end = self.nfa.new_state(), self.nfa.new_state()
+            self.nfa.epsilon[new_start].append(start)
+            self.nfa.epsilon[end].append(new_end)
+            if operator in ('?', '*'):
+                self.nfa.epsilon[new_start].append(new_end)
+            if operator in ('*', '+'):
+                self.nfa.epsilon[end].append(start)
+            start, end = new_start, new_end
+        return start, end
+
+    def parse_atom(self):
+        token = self.peek()
+        if token == '(':
+            self.pos += 1
+            fragment = self.parse_expr()
+            if self.peek() != ')':
+                raise PolicySyntaxError(f"Missing ')' in policy: {self.expression}")
+            self.pos += 1
+            return fragment
+        if isinstance(token, tuple):
+            self.pos += 1
+            start, end = self.nfa.new_state(), self.nfa.new_state()
+            self.nfa.edges[start].append((token[1], end))
+            return start, end
+        raise PolicySyntaxError(f"Expected a symbol or '(' in policy: {self.expression}")
+
+
+class CompiledExpression:
+    """
+    Minimal DFA for one policy expression.
+    table: flat state x symbol array; DEAD and ACCEPT are absorbing, and
+    every other state can still reach ACCEPT.
+    """
+    DEAD = 0
+    ACCEPT = 1
+
+    def __init__(self, table, num_states, start):
+        self.table = table
+        self.num_states = num_states
+        self.start = start
+
+
+def _epsilon_closure(nfa, states):
+    stack = list(states)
+    closure = set(states)
+    while stack:
+        for target in nfa.epsilon[stack.pop()]:
+            if target not in closure:
+                closure.add(target)
+                stack.append(target)
+    return frozenset(closure)
+
+
+def _subset_construction(nfa, start, accept, symbols):
+    """NFA -> DFA table with a leading dead state; returns (rows, accepting)"""
+    dead = frozenset()
+    index = {dead: 0}
+    subsets = [dead]
+    rows = [[0] * len(symbols)]
+    accepting = [False]
+
+    initial = _epsilon_closure(nfa, [start])
+    index[initial] = 1
+    subsets.append(initial)
+    rows.append(None)
+    accepting.append(accept in initial)
+
+    pending = [initial]
+    while pending:
+        subset = pending.pop()
+        row = []
+        for symbol in symbols:
+            targets = [target for state in subset for edge, target in nfa.edges[state] if edge == symbol]
+            closure = _epsilon_closure(nfa, targets) if targets else dead
+            if closure not in index:
+                index[closure] = len(subsets)
+                subsets.append(closure)
+                rows.append(None)
+                accepting.append(accept in closure)
+                pending.append(closure)
+            row.append(index[closure])
+        rows[index[subset]] = row
+
+    return rows, accepting
+
+
+def compile_expression(expression, symbols):
+    """
+    Compile a policy expression over an ordered alphabet, using the cache.
+    Raises PolicySyntaxError for bad syntax or an expression matching the
+    empty sequence.
+    """
+    symbols = tuple(symbols)
+    key = hashlib.sha256('\x1f'.join(symbols + (expression,)).encode()).hexdigest()
+    compiled = _CACHE.get(key)
+    if compiled is not None:
+        return compiled
+
+    nfa = _NFA()
+    start, accept = _Parser(tokenize(expression, symbols), nfa, expression).parse()
+    rows, accepting = _subset_construction(nfa, start, accept, symbols)
+    if accepting[1]:
+        raise PolicySyntaxError(f"Policy must not match an empty sequence: {expression}")
+
+    # Shortest match wins: every accepting state becomes one absorbing state,
+    # then states that can never accept merge with the dead state
+    num_symbols = len(symbols)
+    num_dfa = len(rows)
+    table = array('I', [0]) * ((num_dfa + 1) * num_symbols)
+    accept_state = num_dfa
+    for state, row in enumerate(rows):
+        for column, target in enumerate(row):
+            table[state * num_symbols + column] = accept_state if accepting[target] else target
+    for column in range(num_symbols):
+        table[accept_state * num_symbols + column] = accept_state
+
+    labels = ['DEAD'] + [None] * (num_dfa - 1) + ['ACCEPT']
+    for state in range(num_dfa):
+        if not _can_accept(table, state, accept_state, num_symbols):
+            labels[state] = 'DEAD'
+    class_of, num_classes = minimize_table(table, num_dfa + 1, num_symbols, labels)
+
+    # Renumber so DEAD = 0 and ACCEPT = 1, other classes after them
+    order = {class_of[0]: CompiledExpression.DEAD, class_of[accept_state]: CompiledExpression.ACCEPT}
+    for state in range(num_dfa + 1):
+        order.setdefault(class_of[state], len(order))
+
+    minimal = array('I', [0]) * (num_classes * num_symbols)
+    for state in range(num_dfa + 1):
+        row = order[class_of[state]] * num_symbols
+        for column in range(num_symbols):
+            minimal[row + column] = order[class_of[table[state * num_symbols + column]]]
+
+    compiled = CompiledExpression(minimal, num_classes, order[class_of[1]])
+    _CACHE[key] = compiled
+    return compiled
+
+
+def _can_accept(table, state, accept_state, num_symbols):
+    """Whether accept_state is reachable from state"""
+    seen = {state}
+    stack = [state]
+    while stack:
+        current = stack.pop()
+        if current == accept_state:
+            return True
+        for column in range(num_symbols):
+            target = table[current * num_symbols + column]
+            if target not in seen:
+                seen.add(target)
+                stack.append(target)
+    return False
+
+
+def is_expression(policy):
+    """Policies given as strings are expressions; lists are fixed sequences"""
+    return isinstance(policy, str)
+
+
+def describe_policy(config, policy):
+    """Display strings (method names, symbols) for a fixed sequence or an expression"""
+    if is_expression(policy):
+        return policy, policy
+    return ' → '.join(config.get_auth_name(symbol) for symbol in policy), ' → '.join(policy)
+
+
+def cache_size():
+    return len(_CACHE)
@@ -0,0 +1,313 @@
+# policy_store.py - Large-Scale Zone Policy Store Loaded From Disk
+
+import csv
+import json
+import os
+import struct
+import sys
+import time
+from array import array
+from collections.abc import Mapping
+
+from policy_lang import is_expression
+from zones import ZoneConfig
+
+# Compiled binary layout (little-endian):
+#   header:  magic, version, num_symbols, num_zones, names_len, data_len
+#   symbols: per symbol, u8 length + UTF-8 symbol, u16 length + UTF-8 method name
+#   names:   zone names joined by '\n' (names_len bytes)
+#   offsets: (num_zones + 1) x u32 into data
+#   data:    one byte per policy step, holding the symbol index
+MAGIC = b'ACPS'
+VERSION = 1
+HEADER = struct.Struct('<4sHHIII')
+
+
+class PolicyView(Mapping):
+    """Read-only zone -> policy mapping decoded on demand from packed bytes"""
+
+    def __init__(self, store):
+        self._store = store
+
+    def __getitem__(self, zone):
+        zone_id = self._store.zone_index[zone]
+        return self._store.policy_at(zone_id)
+
+    def __contains__(self, zone):
+        return zone in self._store.zone_index
+
+    def __iter__(self):
+        return iter(self._store.zones)
+
+    def __len__(self):
+        return len(self._store.zones)
+
+
+class PolicyStore:
+    """
+    Zone policies held as one packed byte string plus offsets.
+
+    Exposes the same interface as ZoneConfig (auth_symbols, zone_policies,
+    get_zones, get_policy, get_auth_name), so it can be passed anywhere a
+    config is expected. Expression policies (strings) are kept as-is in
+    `expressions` and are only supported by the JSON format.
+    """
+
+    def __init__(self, auth_symbols, zones, offsets, data, expressions=None):
+        self.auth_symbols = dict(auth_symbols)
+        self.symbols = tuple(self.auth_symbols)
+        self.zones = tuple(sys.intern(zone) for zone in zones)
+        self.zone_index = {zone: i for i, zone in enumerate(self.zones)}
+        self.offsets = offsets
+        self.data = data
+        self.expressions = expressions or {}
+        self.zone_policies = PolicyView(self)
+
+    @classmethod
+    def from_policies(cls, zone_policies, auth_symbols=None):
+        """Pack a zone -> symbol list mapping"""
+        auth_symbols = auth_symbols or ZoneConfig().auth_symbols
+        symbol_index = {symbol: i for i, symbol in enumerate(auth_symbols)}
+
+        zones = []
+        offsets = array('I', [0])
+        data = bytearray()
+        expressions = {}
+        for zone, policy in zone_policies.items():
+            if is_expression(policy):
+                expressions[zone] = policy
+            else:
+                try:
+                    data.extend(symbol_index[symbol] for symbol in policy)
+                except KeyError as e:
+                    raise ValueError(f"Unknown authentication symbol {e} in policy for {zone}") from None
+            zones.append(zone)
+            offsets.append(len(data))
+        return cls(auth_symbols, zones, offsets, bytes(data), expressions)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls.from_policies(config.zone_policies, config.auth_symbols)
+
+    @classmethod
+    def load(cls, path):
+        """Load a store from .json, .csv or compiled binary, by extension"""
+        if path.endswith('.json'):
+            return cls.load_json(path)
+        if path.endswith('.csv'):
+            return cls.load_csv(path)
+        return cls.load_binary(path)
+
+    @classmethod
+    def load_json(cls, path):
+        """Load {"auth_symbols": {...}, "zone_policies": {zone: [symbols]}}"""
+        with open(path) as f:
+            document = json.load(f)
+        return cls.from_policies(document['zone_policies'], document.get('auth_symbols'))
+
+    @classmethod
+    def load_csv(cls, path, auth_symbols=None):
+        """Load rows of zone,sequence where sequence is space-separated symbols"""
+        policies = {}
+        with open(path, newline='') as f:
+            for line, row in enumerate(csv.reader(f), 1):
+                if not row or row[0] == 'zone':
+                    continue
+                if len(row) != 2:
+                    raise ValueError(f"{path}:{line}: expected zone,sequence, got {len(row)} columns")
+                policies[row[0]] = row[1].split()
+        return cls.from_policies(policies, auth_symbols)
+
+    @classmethod
+    def load_binary(cls, path):
+        """Load the compiled binary form written by save_binary; ValueError if it is damaged"""
+        with open(path, 'rb') as f:
+            blob = f.read()
+
+        if len(blob) < HEADER.size:
+            raise ValueError(f"Not a compiled policy store: {path}")
+        magic, version, num_symbols, num_zones, names_len, data_len = HEADER.unpack_from(blob, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a compiled policy store: {path}")
+
+        pos = HEADER.size
+        auth_symbols = {}
+        try:
+            for _ in range(num_symbols):
+                length = blob[pos]
+                symbol = blob[pos + 1:pos + 1 + length].decode()
+                pos += 1 + length
+                length = struct.unpack_from('<H', blob, pos)[0]
+                auth_symbols[symbol] = blob[pos + 2:pos + 2 + length].decode()
+                pos += 2 + length
+        except (IndexError, struct.error):
+            raise ValueError(f"Truncated compiled policy store: {path}") from None
+
+        # A truncated or padded file must not load as different policies
+        if len(blob) != pos + names_len + 4 * (num_zones + 1) + data_len:
+            raise ValueError(f"Truncated compiled policy store: {path}")
+
+        zones = blob[pos:pos + names_len].decode().split('\n') if num_zones else []
+        if len(zones) != num_zones or len(auth_symbols) != num_symbols:
+            raise ValueError(f"Corrupt compiled policy store: {path}")
+        pos += names_len
+
+        offsets = array('I')
+        offsets.frombytes(blob[pos:pos + 4 * (num_zones + 1)])
+        if sys.byteorder != 'little':
+            offsets.byteswap()
+        pos += 4 * (num_zones + 1)
+        if offsets[-1] != data_len or any(a > b for a, b in zip(offsets, offsets[1:])):
+            raise ValueError(f"Corrupt policy offsets in compiled policy store: {path}")
+
+        data = blob[pos:]
+        if data and max(data) >= num_symbols:
+            raise ValueError(f"Unknown symbol index in compiled policy store: {path}")
+        return cls(auth_symbols, zones, offsets, data)
+
+    def save_json(self, path):
+        with open(path, 'w') as f:
+            json.dump({
+                'auth_symbols': self.auth_symbols,
+                'zone_policies': {zone: self.expressions.get(zone) or list(self.get_policy(zone))
+                                  for zone in self.zones},
+            }, f)
+
+    def save_csv(self, path):
+        self._require_fixed('CSV')
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['zone', 'sequence'])
+            for zone in self.zones:
+                writer.writerow([zone, ' '.join(self.get_policy(zone))])
+
+    def save_binary(self, path):
+        self._require_fixed('binary')
+        names = '\n'.join(self.zones).encode()
+        offsets = array('I', self.offsets)
+        if sys.byteorder != 'little':
+            offsets.byteswap()
+
+        # Write then rename: the file may be watched and reloaded while it is written
+        temporary = f'{path}.{os.getpid()}.tmp'
+        with open(temporary, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(self.symbols), len(self.zones), len(names), len(self.data)))
+            for symbol, name in self.auth_symbols.items():
+                symbol_bytes, name_bytes = symbol.encode(), name.encode()
+                f.write(bytes([len(symbol_bytes)]) + symbol_bytes)
+                f.write(struct.pack('<H', len(name_bytes)) + name_bytes)
+            f.write(names)
+            f.write(offsets.tobytes())
+            f.write(self.data)
+        os.replace(temporary, path)
+
+    def _require_fixed(self, fmt):
+        if self.expressions:
+            raise ValueError(f"The {fmt} format cannot store expression policies; use JSON")
+
+    def policy_at(self, zone_id):
+        """Policy for a zone index, as a tuple of symbols (or an expression string)"""
+        if self.expressions:
+            expression = self.expressions.get(self.zones[zone_id])
+            if expression is not None:
+                return expression
+        symbols = self.symbols
+        return tuple(symbols[i] for i in self.data[self.offsets[zone_id]:self.offsets[zone_id + 1]])
+
+    def packed_policy(self, zone):
+        """Policy for a zone as packed symbol indices (a bytes slice)"""
+        zone_id = self.zone_index[zone]
+        return self.data[self.offsets[zone_id]:self.offsets[zone_id + 1]]
+
+    def has_zone(self, zone):
+        return zone in self.zone_index
+
+    def get_zones(self):
+        # Stored tuple, no copy per call
+        return self.zones
+
+    def get_policy(self, zone):
+        zone_id = self.zone_index.get(zone)
+        if zone_id is None:
+            return ()
+        return self.policy_at(zone_id)
+
+    def get_auth_name(self, symbol):
+        return self.auth_symbols.get(symbol, 'Unknown')
+
+
+def generate_policies(num_zones, length=4, seed=0):
+    """Random zone -> policy mapping for benchmarks"""
+    import random
+
+    rng = random.Random(seed)
+    symbols = list(ZoneConfig().auth_symbols)
+    return {f'ZONE_{i:06d}': [rng.choice(symbols) for _ in range(length)] for i in range(num_zones)}
+
+
+def benchmark_store(num_zones=100_000, directory='.'):
+    """Measure load time and memory of each on-disk format"""
+    import tracemalloc
+
+    source = PolicyStore.from_policies(generate_policies(num_zones))
+    paths = {fmt: os.path.join(directory, f'bench_policies.{fmt}') for fmt in ('json', 'csv', 'bin')}
+    source.save_json(paths['json'])
+    source.save_csv(paths['csv'])
+    source.save_binary(paths['bin'])
+
+    print(f"\nPOLICY STORE BENCHMARK ({num_zones:,} zones)")
+    print("-" * 60)
+    print(f"{'Format':<8} {'File (KB)':>12} {'Load (ms)':>12} {'Memory (KB)':>14}")
+
+    results = {}
+    try:
+        for fmt, path in paths.items():
+            tracemalloc.start()
+            started = time.perf_counter()
+            store = PolicyStore.load(path)
+            elapsed = time.perf_counter() - started
+            memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+
+            assert len(store.zones) == num_zones
+            results[fmt] = {'file_bytes': os.path.getsize(path), 'load_seconds': elapsed, 'memory_bytes': memory}
+            print(f"{fmt:<8} {os.path.getsize(path) / 1024:>12,.0f} {elapsed * 1000:>12,.1f} {memory / 1024:>14,.0f}")
+            del store
+    finally:
+        for path in paths.values():
+            os.remove(path)
+
+    # For comparison: the same policies as a ZoneConfig-style dict of lists
+    tracemalloc.start()
+    policies = generate_policies(num_zones)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"{'dict':<8} {'-':>12} {'-':>12} {memory / 1024:>14,.0f}")
+    del policies
+
+    return results
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Zone policy store tools")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    compile_cmd = commands.add_parser('compile', help="Convert JSON/CSV policies to the binary form")
+    compile_cmd.add_argument('source')
+    compile_cmd.add_argument('target')
+
+    bench_cmd = commands.add_parser('benchmark', help="Measure load time and memory")
+    bench_cmd.add_argument('--zones', type=int, default=100_000)
+
+    args = parser.parse_args()
+    if args.command == 'compile':
+        store = PolicyStore.load(args.source)
+        store.save_binary(args.target)
+        print(f"Compiled {len(store.zones):,} zones to {args.target}")
+    else:
+        benchmark_store(args.zones)
+
+if __name__ == "__main__":
+    main()
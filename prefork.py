@@ -0,0 +1,36 @@
+# prefork.py - Pre-Forked Worker Processes Sharing One Listening Socket
+
+import os
+import signal
+import sys
+
+
+def run_workers(workers, serve_one):
+    """
+    Call serve_one() in `workers` processes: workers - 1 forked children and
+    this one. Bind the listening socket (and build anything the workers
+    share) before calling, so children inherit it. SIGTERM becomes
+    SystemExit in this process, which then stops and reaps the children.
+    """
+    children = []
+    for _ in range(workers - 1):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                serve_one()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                os._exit(0)
+        children.append(pid)
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        serve_one()
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+            os.waitpid(pid, 0)
@@ -0,0 +1,89 @@
+# reasons.py - Transition Reason Codes and Lazy Message Rendering
+
+from policy_lang import is_expression
+
+# Every transition reports a small integer reason instead of a message.
+# The text is only built by render_message, when a caller actually shows it.
+REASON_NONE = 0             # Symbol accepted (step completed or access granted)
+REASON_INVALID_ZONE = 1
+REASON_NO_ZONE = 2
+REASON_INVALID_SYMBOL = 3
+REASON_TOO_LONG = 4
+REASON_WRONG_METHOD = 5
+REASON_COMPLETED = 6        # Input after ACCEPTED/REJECTED; state unchanged
+REASON_NO_MATCHING_ZONE = 7
+REASON_ZONE_PENDING = 8     # Symbol accepted, several zones still possible
+REASON_TIMEOUT = 9          # No next symbol within the zone's step timeout
+REASON_LOCKED_OUT = 10      # Door or credential locked after repeated failures
+
+REASON_NAMES = (
+    'NONE',
+    'INVALID_ZONE',
+    'NO_ZONE',
+    'INVALID_SYMBOL',
+    'TOO_LONG',
+    'WRONG_METHOD',
+    'COMPLETED',
+    'NO_MATCHING_ZONE',
+    'ZONE_PENDING',
+    'TIMEOUT',
+    'LOCKED_OUT',
+)
+
+
+def render_message(config, reason, zone=None, step=0, symbol=None, expected=None):
+    """
+    Build the human-readable message for a transition.
+    step is the number of symbols matched so far (after the transition) and
+    symbol is the input that produced it. expected overrides the symbols
+    read from a fixed policy (needed for expression policies); an empty
+    tuple after a successful step means access was granted.
+    """
+    if reason == REASON_NONE:
+        if expected is None:
+            policy = config.get_policy(zone)
+            if is_expression(policy):
+                # The next symbols depend on the engine state, which the caller did not pass
+                return f"Step {step} completed"
+            if step >= len(policy):
+                return f"Access GRANTED to {zone}"
+            expected = (policy[step],)
+        elif not expected:
+            return f"Access GRANTED to {zone}"
+        return f"Step {step} completed. Next: {_auth_names(config, expected)}"
+
+    if reason == REASON_ZONE_PENDING:
+        return f"Step {step} completed. Zone not yet determined"
+
+    if reason == REASON_COMPLETED:
+        return "Process already completed. Reset required."
+
+    if reason == REASON_INVALID_ZONE:
+        detail = "Invalid zone specified"
+    elif reason == REASON_NO_ZONE:
+        detail = "No target zone specified"
+    elif reason == REASON_INVALID_SYMBOL:
+        detail = f"Invalid authentication symbol: {symbol}"
+    elif reason == REASON_NO_MATCHING_ZONE:
+        detail = "No zone policy matches this sequence"
+    elif reason == REASON_TOO_LONG:
+        detail = "Authentication sequence too long"
+    elif reason == REASON_TIMEOUT:
+        detail = f"Timed out waiting for step {step + 1}"
+    elif reason == REASON_LOCKED_OUT:
+        detail = "Too many failed attempts. Temporarily locked out"
+    else:
+        if expected is None:
+            policy = config.get_policy(zone)
+            if is_expression(policy) or step >= len(policy):
+                return f"Access DENIED: Wrong authentication method. Got: {config.get_auth_name(symbol)}"
+            expected = (policy[step],)
+        expected_name = _auth_names(config, expected)
+        actual_name = config.get_auth_name(symbol)
+        detail = f"Wrong authentication method. Expected: {expected_name}, Got: {actual_name}"
+
+    return f"Access DENIED: {detail}"
+
+
+def _auth_names(config, symbols):
+    return ' or '.join(config.get_auth_name(symbol) for symbol in symbols)
@@ -0,0 +1,201 @@
+# replay.py - Streaming Audit-Log Replay Against Current Zone Policies
+
+import argparse
+import json
+import mmap
+import sys
+import time
+
+from engine import CompiledPolicyEngine, REJECTED, ACCEPTED
+from reasons import REASON_INVALID_ZONE, REASON_NO_ZONE, render_message
+
+# Event logs hold one reader event per line:
+#   JSONL: {"timestamp": ..., "door": ..., "zone": ..., "symbol": ...}
+#   CSV:   timestamp,door,zone,symbol   (optional header row)
+# The zone only has to be present on the first event of an authentication.
+
+CSV_FIELDS = ('timestamp', 'door', 'zone', 'symbol')
+
+
+def read_lines(path):
+    """Yield raw lines from a memory-mapped file"""
+    with open(path, 'rb') as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            return
+        with mapped:
+            yield from iter(mapped.readline, b'')
+
+
+def parse_jsonl_line(line):
+    """Event dict from one JSONL line, None for a blank line; ValueError if malformed"""
+    if not line.strip():
+        return None
+    event = json.loads(line)
+    if not isinstance(event, dict) or not isinstance(event.get('door'), str) \
+            or not isinstance(event.get('symbol'), str):
+        raise ValueError("Event needs a string door and symbol")
+    if not isinstance(event.get('zone', ''), (str, type(None))):
+        raise ValueError("Event zone must be a string")
+    return event
+
+
+def parse_csv_line(line):
+    """Event dict from one CSV line, None for a blank or header line; ValueError if malformed"""
+    fields = line.decode('utf-8').rstrip('\r\n').split(',')
+    if fields == [''] or fields[0] == 'timestamp':
+        return None
+    if len(fields) != len(CSV_FIELDS):
+        raise ValueError(f"Expected {len(CSV_FIELDS)} fields, got {len(fields)}")
+    return dict(zip(CSV_FIELDS, fields))
+
+
+def _parse(lines, parse_line, skipped):
+    for line in lines:
+        try:
+            event = parse_line(line)
+        except ValueError:
+            # json.JSONDecodeError and UnicodeDecodeError are ValueErrors too
+            if skipped is not None:
+                skipped[0] += 1
+            continue
+        if event is not None:
+            yield event
+
+
+def parse_jsonl(lines, skipped=None):
+    """Yield event dicts from JSONL lines, counting malformed lines in skipped[0]"""
+    return _parse(lines, parse_jsonl_line, skipped)
+
+
+def parse_csv(lines, skipped=None):
+    """Yield event dicts from CSV lines, counting malformed lines in skipped[0]"""
+    return _parse(lines, parse_csv_line, skipped)
+
+
+def read_events(path, fmt=None, skipped=None):
+    """Yield events from a log file, picking the parser from the extension by default"""
+    fmt = fmt or ('csv' if path.endswith('.csv') else 'jsonl')
+    parser = parse_csv if fmt == 'csv' else parse_jsonl
+    return parser(read_lines(path), skipped)
+
+
+def replay(events, engine=None):
+    """
+    Group events into per-door authentications and yield one decision per
+    authentication as soon as it completes. Only open sessions are kept,
+    so memory depends on the number of doors, not the length of the log.
+    """
+    engine = engine or CompiledPolicyEngine()
+    # door -> [zone, state, steps, first timestamp]
+    open_sessions = {}
+
+    for event in events:
+        door = event['door']
+        symbol = event['symbol']
+        session = open_sessions.get(door)
+
+        if session is None:
+            zone = event.get('zone') or None
+            state = engine.start_state(zone)
+            if state is None:
+                reason = REASON_INVALID_ZONE if zone else REASON_NO_ZONE
+                yield _decision(door, zone, 'REJECTED', 0, event.get('timestamp'),
+                                render_message(engine.config, reason))
+                continue
+            session = open_sessions[door] = [zone, state, 0, event.get('timestamp')]
+
+        zone, state, steps, started = session
+        next_state = engine.step(state, symbol)
+
+        if next_state == REJECTED:
+            del open_sessions[door]
+            reason = engine.reject_code(state, symbol)
+            yield _decision(door, zone, 'REJECTED', steps, started,
+                            render_message(engine.config, reason, zone, steps, symbol,
+                                           engine.message_expected(zone, state)))
+        elif next_state == ACCEPTED:
+            del open_sessions[door]
+            yield _decision(door, zone, 'ACCEPTED', steps + 1, started)
+        else:
+            session[1] = next_state
+            session[2] = steps + 1
+
+    # Authentications still in progress at the end of the log never completed
+    for door, (zone, state, steps, started) in open_sessions.items():
+        yield _decision(door, zone, 'INCOMPLETE', steps, started)
+
+
+def _decision(door, zone, decision, steps, timestamp, reason=None):
+    record = {'timestamp': timestamp, 'door': door, 'zone': zone, 'decision': decision, 'steps': steps}
+    if reason:
+        record['reason'] = reason
+    return record
+
+
+def count_events(events, counter):
+    """Pass events through while counting them"""
+    for event in events:
+        counter[0] += 1
+        yield event
+
+
+def run_replay(path, output, fmt=None, report_every=1_000_000, workers=1):
+    """Replay a log file, stream decisions as JSONL and report throughput"""
+    counter = [0]
+    skipped = [0]
+    totals = {'ACCEPTED': 0, 'REJECTED': 0, 'INCOMPLETE': 0}
+    started = time.perf_counter()
+    next_report = report_every
+
+    if workers > 1:
+        from sharded import sharded_replay
+
+        # Decisions arrive already encoded, in single-process order
+        sharded = sharded_replay(path, fmt, workers)
+        for line in sharded:
+            output.write(line + '\n')
+            if sharded.events >= next_report:
+                elapsed = time.perf_counter() - started
+                print(f"{sharded.events:,} events | {sharded.events / elapsed:,.0f} events/s", file=sys.stderr)
+                next_report += report_every
+        counter[0] = sharded.events - sharded.skipped
+        skipped[0] = sharded.skipped
+        totals = sharded.totals
+    else:
+        for decision in replay(count_events(read_events(path, fmt, skipped), counter)):
+            totals[decision['decision']] += 1
+            output.write(json.dumps(decision) + '\n')
+
+            if counter[0] >= next_report:
+                elapsed = time.perf_counter() - started
+                print(f"{counter[0]:,} events | {counter[0] / elapsed:,.0f} events/s", file=sys.stderr)
+                next_report += report_every
+
+    elapsed = time.perf_counter() - started
+    print(f"Replayed {counter[0]:,} events in {elapsed:.2f}s "
+          f"({counter[0] / max(elapsed, 1e-9):,.0f} events/s)", file=sys.stderr)
+    print(f"Granted: {totals['ACCEPTED']} | Denied: {totals['REJECTED']} | "
+          f"Incomplete: {totals['INCOMPLETE']} | Malformed lines skipped: {skipped[0]}", file=sys.stderr)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay an event log against the current zone policies")
+    parser.add_argument('log', help="JSONL or CSV event log")
+    parser.add_argument('-o', '--output', help="Decision output file (default: stdout)")
+    parser.add_argument('--format', choices=['jsonl', 'csv'], help="Log format (default: from extension)")
+    parser.add_argument('--report-every', type=int, default=1_000_000, help="Events between progress reports")
+    parser.add_argument('--workers', type=int, default=1, help="Worker processes, sharded by door")
+    args = parser.parse_args()
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            run_replay(args.log, output, args.format, args.report_every, args.workers)
+    else:
+        run_replay(args.log, sys.stdout, args.format, args.report_every, args.workers)
+
+if __name__ == "__main__":
+    main()
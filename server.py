@@ -0,0 +1,209 @@
+# server.py - asyncio Event-Ingestion Server for Streaming Reader Events
+
+from lockout import LockoutGuard
+from metrics import Metrics
+from policy_store import PolicyStore
+from sessions import SessionManager
+from shared_sessions import SessionTableFull
+from snapshots import PolicyRegistry
+
+# Protocol (one event per line, UTF-8):
+#   request:  <door_id> <zone|-> <symbol> [credential]\n
+#   response: <door_id> <state> <message>\n
+# The zone is only needed on the first symbol of an authentication; use "-"
+# afterwards. A door is reset automatically once it is ACCEPTED or REJECTED,
+# so its next event starts a new authentication. With step timeouts, an
+# abandoned authentication is answered unprompted with a REJECTED line on the
+# connection that last used the door. The optional credential (badge or user
+# ID) feeds the brute-force lockout when it is enabled.
+# asyncio is imported where it is used, so handle_line alone (headless.py's
+# stdio mode) starts without it.
+
+READ_SIZE = 64 * 1024
+MAX_LINE = 1024
+
+
+class AccessControlServer:
+    """Feed streamed (door_id, zone, symbol) events into per-door sessions"""
+
+    def __init__(self, sessions=None):
+        # SessionManager defines __len__, so an empty one is falsy
+        self.sessions = sessions if sessions is not None else SessionManager()
+        self.events_processed = 0
+        # door -> writer of the connection that last used it, for timeout notices
+        self.door_writers = {}
+        self._expiry_task = None
+
+    def handle_line(self, line, writer=None):
+        """Process one request line and return the response line"""
+        parts = line.split()
+        if len(parts) not in (3, 4):
+            return f"- ERROR Malformed event: {line.strip()}\n"
+
+        door_id, zone, symbol = parts[:3]
+        credential = parts[3] if len(parts) == 4 else None
+        try:
+            state, message = self.sessions.transition(door_id, symbol, None if zone == '-' else zone, credential)
+        except SessionTableFull:
+            # Shared sessions only: every slot is held by an authentication in progress
+            return f"{door_id} ERROR Too many authentications in progress\n"
+        if state in ['ACCEPTED', 'REJECTED']:
+            self.sessions.reset(door_id)
+            self.door_writers.pop(door_id, None)
+        elif writer is not None:
+            self.door_writers[door_id] = writer
+
+        self.events_processed += 1
+        return f"{door_id} {state} {message}\n"
+
+    async def handle_client(self, reader, writer):
+        """Read events in large chunks and answer each chunk with one batched write"""
+        pending = b''
+        try:
+            while True:
+                data = await reader.read(READ_SIZE)
+                if not data:
+                    break
+
+                *lines, pending = (pending + data).split(b'\n')
+                if len(pending) > MAX_LINE:
+                    writer.write(b"- ERROR Line too long\n")
+                    break
+
+                if lines:
+                    writer.write(''.join(
+                        self.handle_line(line.decode('utf-8', 'replace'), writer) for line in lines if line.strip()
+                    ).encode())
+                    # Stop reading until the client has consumed our responses
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def expire_sessions(self, interval=0.1):
+        """Periodically reject timed-out sessions and notify their connections"""
+        import asyncio
+
+        while True:
+            await asyncio.sleep(interval)
+            for door_id, state, message in self.sessions.expire():
+                self.sessions.reset(door_id)
+                writer = self.door_writers.pop(door_id, None)
+                if writer is not None and not writer.is_closing():
+                    writer.write(f"{door_id} {state} {message}\n".encode())
+
+    async def start(self, host='localhost', port=8765, unix_path=None, sock=None):
+        """Start listening on TCP, on a Unix socket or on an already bound socket"""
+        import asyncio
+        import socket
+
+        if self.sessions.step_timeout is not None or self.sessions.zone_timeouts:
+            self._expiry_task = asyncio.get_running_loop().create_task(self.expire_sessions())
+        if sock is not None:
+            if sock.family == getattr(socket, 'AF_UNIX', None):
+                return await asyncio.start_unix_server(self.handle_client, sock=sock)
+            return await asyncio.start_server(self.handle_client, sock=sock)
+        if unix_path:
+            return await asyncio.start_unix_server(self.handle_client, path=unix_path)
+        return await asyncio.start_server(self.handle_client, host, port)
+
+
+async def serve(host, port, unix_path=None, policies_path=None, metrics_port=None, step_timeout=None,
+                max_failures=None):
+    registry = None
+    if policies_path:
+        # Hot-reload the policy file; in-flight authentications keep their snapshot
+        registry = PolicyRegistry(PolicyStore.load(policies_path))
+        registry.watch(policies_path)
+    metrics = None
+    if metrics_port:
+        metrics = Metrics()
+        metrics.serve(host, metrics_port)
+        print(f"Metrics on http://{host}:{metrics_port}/metrics")
+    lockout = LockoutGuard(max_failures, max_failures) if max_failures else None
+    server = AccessControlServer(SessionManager(registry=registry, metrics=metrics, step_timeout=step_timeout,
+                                                lockout=lockout))
+    listener = await server.start(host, port, unix_path)
+    print(f"Access control server listening on {unix_path or f'{host}:{port}'}")
+    async with listener:
+        await listener.serve_forever()
+
+
+async def _serve_socket(sessions, sock):
+    listener = await AccessControlServer(sessions).start(sock=sock)
+    async with listener:
+        await listener.serve_forever()
+
+
+def serve_workers(host, port, unix_path=None, policies_path=None, step_timeout=None, workers=2):
+    """
+    Serve from several processes sharing one listening socket. Sessions
+    live in a SharedSessionTable, so a door's events may land on any worker.
+    Policies are loaded once (no hot reload) and each process serves the
+    connections the kernel hands it.
+    """
+    import asyncio
+    import os
+    import socket
+    import stat
+    from engine import CompiledPolicyEngine
+    from prefork import run_workers
+    from shared_sessions import SharedSessionManager
+
+    config = PolicyStore.load(policies_path) if policies_path else None
+    sessions = SharedSessionManager(engine=CompiledPolicyEngine(config), step_timeout=step_timeout)
+    if unix_path:
+        # Replace a stale socket file, as asyncio.start_unix_server does
+        if os.path.exists(unix_path) and stat.S_ISSOCK(os.stat(unix_path).st_mode):
+            os.unlink(unix_path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(unix_path)
+        sock.listen(128)
+    else:
+        sock = socket.create_server((host, port), backlog=128)
+
+    print(f"Access control server listening on {unix_path or f'{host}:{port}'} ({workers} workers)")
+    try:
+        run_workers(workers, lambda: asyncio.run(_serve_socket(sessions, sock)))
+    finally:
+        sessions.table.close()
+
+
+def main():
+    import argparse
+    import asyncio
+
+    parser = argparse.ArgumentParser(description="Streaming access control event server")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', metavar='PATH', help="Listen on a Unix socket instead of TCP")
+    parser.add_argument('--policies', metavar='PATH', help="Policy store file to load and watch for changes")
+    parser.add_argument('--metrics-port', type=int, help="Serve Prometheus metrics on this port")
+    parser.add_argument('--step-timeout', type=float, help="Seconds allowed between steps before rejecting")
+    parser.add_argument('--max-failures', type=int, help="Failed attempts per minute before a door/credential locks")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Worker processes sharing sessions through shared memory (policies are not reloaded)")
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        if args.metrics_port or args.max_failures:
+            parser.error("--workers cannot be combined with --metrics-port or --max-failures")
+        try:
+            serve_workers(args.host, args.port, args.unix, args.policies, args.step_timeout, args.workers)
+        except KeyboardInterrupt:
+            print("\nServer stopped.")
+        return
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.policies, args.metrics_port, args.step_timeout,
+                          args.max_failures))
+    except KeyboardInterrupt:
+        print("\nServer stopped.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+# sessions.py - Per-Door Authentication Sessions
+
+import threading
+import time
+
+from audit import STATE_STEP
+from decision_cache import DecisionCache, CachedDecision, pack_sequence
+from engine import REJECTED, ACCEPTED
+from reasons import (
+    REASON_NONE, REASON_INVALID_ZONE, REASON_NO_ZONE, REASON_COMPLETED, REASON_TIMEOUT,
+    REASON_LOCKED_OUT, render_message,
+)
+from lockout import FAILURE_REASONS
+from snapshots import PolicyRegistry
+from timer_wheel import TimerWheel
+
+# Session state before a zone has been chosen
+UNSET = -1
+
+
+class DoorSession:
+    """Compact per-door authentication state (integer engine state only)"""
+    __slots__ = ('door_id', 'zone_id', 'state', 'step', 'snapshot')
+
+    def __init__(self, door_id=None):
+        self.door_id = door_id
+        self.zone_id = UNSET
+        self.state = UNSET
+        self.step = 0
+        # Policy snapshot pinned when the authentication started
+        self.snapshot = None
+
+    def reset(self):
+        self.zone_id = UNSET
+        self.state = UNSET
+        self.step = 0
+        self.snapshot = None
+
+
+class SessionManager:
+    """
+    Thread-safe registry of DoorSession objects keyed by door/reader ID.
+
+    Each door is guarded by one of a fixed pool of striped locks, so
+    unrelated doors advance concurrently without a lock per session.
+    A session pins the registry's current policy snapshot when it starts,
+    so a hot reload only affects authentications that begin afterwards.
+
+    With step_timeout (seconds, optionally overridden per zone through
+    zone_timeouts), every step arms a timer-wheel entry for its door and
+    expire() rejects sessions that waited too long for their next symbol.
+    With a LockoutGuard, transition(), step() and process_sequence() refuse
+    events for locked doors or credentials and report failed attempts to it.
+    With an AuditWriter, every transition is appended to its binary log.
+    """
+
+    def __init__(self, engine=None, num_locks=64, registry=None, cache_size=0, metrics=None,
+                 step_timeout=None, zone_timeouts=None, clock=time.monotonic, lockout=None,
+                 audit=None):
+        self.registry = registry or PolicyRegistry(engine=engine)
+        self._sessions = {}
+        self.step_timeout = step_timeout
+        self.zone_timeouts = dict(zone_timeouts or {})
+        self.clock = clock
+        self.lockout = lockout
+        self._timers = None
+        if step_timeout is not None or self.zone_timeouts:
+            self._timers = TimerWheel(now=clock())
+            self._timer_lock = threading.Lock()
+        # Optional memoization of process_sequence, keyed by snapshot version
+        self.decisions = DecisionCache(cache_size) if cache_size else None
+        # Optional Metrics; the unmetered path has no extra check per symbol
+        self.metrics = metrics
+        if metrics is not None:
+            self._step = self._metered_step
+        # Optional AuditWriter, installed the same way so unaudited steps pay nothing
+        self.audit = audit
+        if audit is not None:
+            self._unaudited_step = self._step
+            self._step = self._audited_step
+        self._locks = tuple(threading.Lock() for _ in range(num_locks))
+
+    @property
+    def engine(self):
+        return self.registry.current.engine
+
+    @property
+    def config(self):
+        return self.registry.current.config
+
+    def _lock_for(self, door_id):
+        return self._locks[hash(door_id) % len(self._locks)]
+
+    def _session(self, door_id):
+        session = self._sessions.get(door_id)
+        if session is None:
+            # setdefault is atomic, so racing creators end up sharing one session
+            session = self._sessions.setdefault(door_id, DoorSession(door_id))
+        return session
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def reset(self, door_id):
+        """Reset a door's session to START"""
+        with self._lock_for(door_id):
+            self._session(door_id).reset()
+            self._cancel_timeout(door_id)
+
+    def discard(self, door_id):
+        """Forget a door's session entirely"""
+        with self._lock_for(door_id):
+            self._sessions.pop(door_id, None)
+            self._cancel_timeout(door_id)
+
+    def transition(self, door_id, input_symbol, zone=None, credential=None):
+        """
+        Feed one symbol to a door's session (same rules as AccessControlDFA.transition)
+        credential optionally identifies who is authenticating, for lockouts
+        Returns: (new_state, message)
+        """
+        with self._lock_for(door_id):
+            session = self._session(door_id)
+            previous = session.state
+            if self.lockout is None:
+                state, reason = self._step(session, input_symbol, zone)
+            else:
+                state, reason = self._guarded_step(session, input_symbol, zone, credential)
+            return session.snapshot.engine.state_name(state, session.step), \
+                self._message(session, reason, input_symbol, previous)
+
+    def step(self, door_id, input_symbol, zone=None, credential=None):
+        """
+        Feed one symbol without building a message
+        Returns: (new_state, reason_code), the state named as by AccessControlDFA.step
+        """
+        with self._lock_for(door_id):
+            session = self._session(door_id)
+            if self.lockout is None:
+                state, reason = self._step(session, input_symbol, zone)
+            else:
+                state, reason = self._guarded_step(session, input_symbol, zone, credential)
+            return session.snapshot.engine.state_name(state, session.step), reason
+
+    def _guarded_step(self, session, input_symbol, zone, credential):
+        lockout = self.lockout
+        if lockout.locked(session.door_id, credential):
+            return self._reject(session, REASON_LOCKED_OUT)
+        state, reason = self._step(session, input_symbol, zone)
+        if reason in FAILURE_REASONS:
+            lockout.record_failure(session.door_id, credential)
+        return state, reason
+
+    def _reject(self, session, reason):
+        """End a session as REJECTED outside the normal table step"""
+        if session.snapshot is None:
+            session.snapshot = self.registry.current
+        session.state = REJECTED
+        if self._timers is not None:
+            self._cancel_timeout(session.door_id)
+        if self.audit is not None:
+            self._audit_record(session, None, '', REJECTED, reason)
+        return REJECTED, reason
+
+    def _step(self, session, input_symbol, zone):
+        if session.state == UNSET:
+            # Lock-free read of the newest snapshot; kept until the session ends
+            session.snapshot = self.registry.current
+            engine = session.snapshot.engine
+            if not zone:
+                session.state = REJECTED
+                return REJECTED, REASON_NO_ZONE
+            zone_id = engine.zone_index.get(zone)
+            if zone_id is None:
+                session.state = REJECTED
+                return REJECTED, REASON_INVALID_ZONE
+            session.zone_id = zone_id
+            session.state = engine.zone_start[zone_id]
+        elif session.state <= ACCEPTED:
+            return session.state, REASON_COMPLETED
+        else:
+            engine = session.snapshot.engine
+
+        next_state = engine.step(session.state, input_symbol)
+        if next_state == REJECTED:
+            reason = engine.reject_code(session.state, input_symbol)
+            session.state = REJECTED
+            if self._timers is not None:
+                self._cancel_timeout(session.door_id)
+            return REJECTED, reason
+
+        session.state = next_state
+        session.step += 1
+        if self._timers is not None:
+            if next_state == ACCEPTED:
+                self._cancel_timeout(session.door_id)
+            else:
+                self._arm_timeout(session, engine)
+        return next_state, REASON_NONE
+
+    def _arm_timeout(self, session, engine):
+        timeout = self.zone_timeouts.get(engine.zones[session.zone_id], self.step_timeout)
+        if timeout is not None:
+            with self._timer_lock:
+                self._timers.schedule(session.door_id, self.clock() + timeout)
+
+    def _cancel_timeout(self, door_id):
+        if self._timers is not None:
+            with self._timer_lock:
+                self._timers.cancel(door_id)
+
+    def expire(self, now=None):
+        """
+        Reject sessions whose step timeout has passed
+        Returns: [(door_id, 'REJECTED', message)] for each expired session
+        """
+        if self._timers is None:
+            return []
+        with self._timer_lock:
+            due = self._timers.advance(self.clock() if now is None else now)
+
+        events = []
+        for door_id in due:
+            with self._lock_for(door_id):
+                session = self._sessions.get(door_id)
+                if session is None or session.state <= ACCEPTED:
+                    continue
+                with self._timer_lock:
+                    if door_id in self._timers:
+                        # Stepped again after the timer fired; a newer timer is armed
+                        continue
+                previous = session.state
+                self._reject(session, REASON_TIMEOUT)
+                events.append((door_id, 'REJECTED', self._message(session, REASON_TIMEOUT, None, previous)))
+        return events
+
+    def _metered_step(self, session, input_symbol, zone):
+        metrics = self.metrics
+        started = metrics.start()
+        state, reason = type(self)._step(self, session, input_symbol, zone)
+        engine = session.snapshot.engine
+        metrics.record(None if session.zone_id == UNSET else engine.zones[session.zone_id],
+                       engine.state_name(state, session.step), reason, started)
+        return state, reason
+
+    def _audited_step(self, session, input_symbol, zone):
+        state, reason = self._unaudited_step(session, input_symbol, zone)
+        self._audit_record(session, zone, input_symbol, state, reason)
+        return state, reason
+
+    def _audit_record(self, session, zone, input_symbol, state, reason):
+        if session.zone_id != UNSET:
+            zone = session.snapshot.engine.zones[session.zone_id]
+        self.audit.append(session.door_id, zone, session.step, input_symbol,
+                          state if state <= ACCEPTED else STATE_STEP, reason, config=session.snapshot.config)
+
+    def _message(self, session, reason, input_symbol, previous):
+        engine = session.snapshot.engine
+        zone = None
+        expected = None
+        if session.zone_id != UNSET:
+            zone = engine.zones[session.zone_id]
+            if session.zone_id in engine.expression_zones:
+                # Steps describe the new state, rejects the state that refused the symbol
+                state = session.state if reason == REASON_NONE else previous
+                if state == UNSET:
+                    state = engine.zone_start[session.zone_id]
+                expected = engine.expected_symbols(state)
+        return render_message(session.snapshot.config, reason, zone, session.step, input_symbol, expected)
+
+    def process_sequence(self, door_id, sequence, zone, credential=None):
+        """
+        Reset a door and process a complete sequence while holding its lock
+        With a decision cache, returns shared read-only results for repeats
+        """
+        with self._lock_for(door_id):
+            session = self._session(door_id)
+            if self.decisions is None:
+                return self._process_sequence(session, sequence, zone, credential)[0]
+
+            snapshot = self.registry.current
+            packed = pack_sequence(sequence, snapshot.engine.symbol_index)
+            if packed is None:
+                return self._process_sequence(session, sequence, zone, credential)[0]
+
+            decision = self.decisions.get(snapshot.version, zone, packed)
+            if decision is not None and self.lockout is not None:
+                # A cached acceptance must not get a locked door or credential through
+                if self.lockout.locked(door_id, credential):
+                    return self._locked_out(session, sequence)
+                if decision.reason in FAILURE_REASONS:
+                    self.lockout.record_failure(door_id, credential)
+            if decision is not None:
+                session.zone_id = decision.zone
+                session.state = decision.state
+                session.step = decision.step
+                session.snapshot = snapshot
+                if self.audit is not None:
+                    zone_name = None if decision.zone == UNSET else snapshot.engine.zones[decision.zone]
+                    self.audit.append_results(door_id, zone_name, decision.results, decision.reason,
+                                              config=snapshot.config)
+                return decision.results
+
+            results, reason = self._process_sequence(session, sequence, zone, credential)
+            # Only finished decisions are cached, and only against the snapshot they used
+            if session.state > ACCEPTED or session.snapshot is not snapshot or reason == REASON_LOCKED_OUT:
+                return results
+            return self.decisions.put(snapshot.version, zone, packed, CachedDecision(
+                results, session.zone_id, session.state, session.step, reason
+            )).results
+
+    def _process_sequence(self, session, sequence, zone, credential=None):
+        """Returns: (results, reason code of the last step)"""
+        session.reset()
+        results = []
+        reason = REASON_NONE
+
+        for i, symbol in enumerate(sequence):
+            previous = session.state
+            if self.lockout is None:
+                state, reason = self._step(session, symbol, zone if i == 0 else None)
+            else:
+                state, reason = self._guarded_step(session, symbol, zone if i == 0 else None, credential)
+            results.append(self._result(session, i + 1, symbol, state, reason, previous))
+            if state <= ACCEPTED:
+                break
+
+        return results, reason
+
+    def _locked_out(self, session, sequence):
+        """Results for a sequence refused at its first symbol by the lockout guard"""
+        session.reset()
+        if not sequence:
+            return []
+        state, reason = self._reject(session, REASON_LOCKED_OUT)
+        return [self._result(session, 1, sequence[0], state, reason, UNSET)]
+
+    def _result(self, session, step, symbol, state, reason, previous):
+        return {
+            'step': step,
+            'input': symbol,
+            'state': session.snapshot.engine.state_name(state, session.step),
+            'message': self._message(session, reason, symbol, previous)
+        }
+
+    def get_current_state(self, door_id):
+        """Get a door's state information in AccessControlDFA.get_current_state form"""
+        with self._lock_for(door_id):
+            session = self._sessions.get(door_id) or DoorSession()
+            if session.zone_id == UNSET:
+                return {'state': 'START' if session.state == UNSET else 'REJECTED',
+                        'sequence': [], 'target_zone': None}
+
+            # Only matching symbols are ever recorded, so the sequence is a policy prefix
+            engine = session.snapshot.engine
+            zone = engine.zones[session.zone_id]
+            return {
+                'state': engine.state_name(session.state, session.step),
+                'sequence': engine.matched_sequence(zone, session.step),
+                'target_zone': zone
+            }
+
+    def is_accepted(self, door_id):
+        session = self._sessions.get(door_id)
+        return session is not None and session.state == ACCEPTED
+
+    def is_rejected(self, door_id):
+        session = self._sessions.get(door_id)
+        return session is not None and session.state == REJECTED
@@ -0,0 +1,217 @@
+# sharded.py - Multi-Process Replay With Sessions Sharded by Door ID
+
+import heapq
+import json
+import multiprocessing
+import re
+import threading
+import zlib
+from array import array
+
+from engine import CompiledPolicyEngine
+from replay import parse_csv_line, parse_jsonl_line, read_lines, replay
+
+# The parent only routes raw lines: it pulls the door out of each line, sends
+# it to shard crc32(door) % workers and tags it with its position in the log.
+# Each worker runs the normal replay() over its doors and returns, per chunk,
+# the decisions tagged with the position of the event that completed them.
+# The parent merges the shards chunk by chunk, so the output order matches a
+# single-process replay exactly.
+CHUNK_LINES = 20_000
+# Chunks in flight before the reader waits for results
+WINDOW = 4
+
+_DOOR_PATTERN = re.compile(rb'"door"\s*:\s*("(?:[^"\\]|\\.)*"|[^,}\s]+)')
+
+# Engine inherited by forked workers, so the table is never pickled
+_FORK_ENGINE = None
+
+
+def _door_key(line, fmt):
+    """Door bytes used for routing, or None if the line holds no event"""
+    if not line.strip():
+        return None
+    if fmt == 'csv':
+        fields = line.split(b',')
+        if fields[0] == b'timestamp':
+            return None
+        # Malformed lines still go to a worker, which counts them as skipped
+        return fields[1] if len(fields) == 4 else b''
+    match = _DOOR_PATTERN.search(line)
+    return match.group(1) if match else b''
+
+
+def _worker(conn, fmt, engine):
+    engine = engine or _FORK_ENGINE
+    parse_line = parse_csv_line if fmt == 'csv' else parse_jsonl_line
+    position = [0]
+    skipped = [0]
+    # door -> position of the first event of its open authentication
+    opened = {}
+    results = []
+
+    def events():
+        while True:
+            blob = conn.recv_bytes()
+            if not blob:
+                return
+            positions = array('Q')
+            positions.frombytes(conn.recv_bytes())
+            for index, line in zip(positions, blob.split(b'\n')):
+                try:
+                    event = parse_line(line)
+                except ValueError:
+                    skipped[0] += 1
+                    continue
+                if event is None:
+                    continue
+                position[0] = index
+                opened.setdefault(event['door'], index)
+                yield event
+            # replay() has emitted every decision this chunk completed
+            conn.send((results, skipped[0]))
+            results.clear()
+            skipped[0] = 0
+
+    try:
+        for decision in replay(events(), engine):
+            if decision['decision'] == 'INCOMPLETE':
+                index = opened[decision['door']]
+            else:
+                index = position[0]
+                del opened[decision['door']]
+            results.append((index, decision['decision'], json.dumps(decision)))
+        conn.send((results, skipped[0]))
+    except Exception as e:
+        conn.send(e)
+    finally:
+        conn.close()
+
+
+class ShardedReplay:
+    """
+    Replay an event log across worker processes, one shard of doors each.
+
+    Iterating yields decisions as JSON strings, in the same order as
+    replay() over the whole log; `events`, `skipped` (malformed lines) and
+    `totals` count as it goes.
+    """
+
+    def __init__(self, lines, fmt='jsonl', workers=None, engine=None):
+        self.lines = lines
+        self.fmt = fmt
+        self.workers = workers or multiprocessing.cpu_count()
+        self.engine = engine or CompiledPolicyEngine()
+        self.events = 0
+        self.skipped = 0
+        self.totals = {'ACCEPTED': 0, 'REJECTED': 0, 'INCOMPLETE': 0}
+
+    def _start_workers(self):
+        global _FORK_ENGINE
+
+        if 'fork' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('fork')
+            _FORK_ENGINE = self.engine
+            engine = None
+        else:
+            # Pickled once per worker at start-up, not per task
+            context = multiprocessing.get_context('spawn')
+            engine = self.engine
+
+        connections, processes = [], []
+        for _ in range(self.workers):
+            parent, child = context.Pipe()
+            process = context.Process(target=_worker, args=(child, self.fmt, engine), daemon=True)
+            process.start()
+            child.close()
+            connections.append(parent)
+            processes.append(process)
+        _FORK_ENGINE = None
+        return connections, processes
+
+    def _feed(self, connections, chunks, window):
+        """Route lines to shards chunk by chunk (runs on a reader thread)"""
+        workers = len(connections)
+        fmt = self.fmt
+        try:
+            buckets = [[] for _ in range(workers)]
+            positions = [array('Q') for _ in range(workers)]
+            count = 0
+            for index, line in enumerate(self.lines):
+                line = line.rstrip(b'\n')
+                door = _door_key(line, fmt)
+                if door is None:
+                    continue
+                shard = zlib.crc32(door) % workers
+                buckets[shard].append(line)
+                positions[shard].append(index)
+                count += 1
+                self.events += 1
+                if count == CHUNK_LINES:
+                    self._send_chunk(connections, buckets, positions, chunks, window)
+                    buckets = [[] for _ in range(workers)]
+                    positions = [array('Q') for _ in range(workers)]
+                    count = 0
+            if count:
+                self._send_chunk(connections, buckets, positions, chunks, window)
+        finally:
+            for conn in connections:
+                try:
+                    conn.send_bytes(b'')
+                except OSError:
+                    # The worker already exited with an error; the reader reports it
+                    pass
+            chunks.put(None)
+
+    def _send_chunk(self, connections, buckets, positions, chunks, window):
+        window.acquire()
+        for conn, bucket, shard_positions in zip(connections, buckets, positions):
+            # Every worker gets every chunk (possibly empty) so replies stay aligned
+            conn.send_bytes(b'\n'.join(bucket) if bucket else b'\n')
+            conn.send_bytes(shard_positions.tobytes())
+        chunks.put(True)
+
+    def _receive(self, connections):
+        shard_results = []
+        for conn in connections:
+            message = conn.recv()
+            if isinstance(message, Exception):
+                raise message
+            results, skipped = message
+            self.skipped += skipped
+            shard_results.append(results)
+        return heapq.merge(*shard_results, key=lambda item: item[0])
+
+    def __iter__(self):
+        import queue
+
+        connections, processes = self._start_workers()
+        chunks = queue.Queue()
+        window = threading.Semaphore(WINDOW)
+        feeder = threading.Thread(target=self._feed, args=(connections, chunks, window), daemon=True)
+        feeder.start()
+        try:
+            totals = self.totals
+            while chunks.get() is not None:
+                for _, kind, decision in self._receive(connections):
+                    totals[kind] += 1
+                    yield decision
+                window.release()
+            # Authentications left open at the end, by first event
+            for _, kind, decision in self._receive(connections):
+                totals[kind] += 1
+                yield decision
+        finally:
+            feeder.join(timeout=1)
+            for process in processes:
+                process.join(timeout=1)
+                if process.is_alive():
+                    process.terminate()
+            for conn in connections:
+                conn.close()
+
+
+def sharded_replay(path, fmt=None, workers=None, engine=None):
+    """Replay a log file across workers; yields decisions as JSON strings"""
+    fmt = fmt or ('csv' if path.endswith('.csv') else 'jsonl')
+    return ShardedReplay(read_lines(path), fmt, workers, engine)
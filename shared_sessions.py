@@ -0,0 +1,412 @@
+# shared_sessions.py - Door Sessions in Shared Memory for Multi-Process Workers
+
+import hashlib
+import multiprocessing
+import struct
+import time
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+from engine import REJECTED, ACCEPTED
+from reasons import (
+    REASON_NONE, REASON_INVALID_ZONE, REASON_NO_ZONE, REASON_COMPLETED, REASON_TIMEOUT, render_message,
+)
+from sessions import UNSET
+
+# Shared memory layout (little-endian):
+#   header: magic, version, slot size, number of slots, engine digest
+#   slots:  door key, zone id, state, step, started, updated
+# A door key is a 64-bit blake2b of the door ID, so every process finds the
+# same slot by linear probing whatever its hash seed. Keys 0 and 1 mark empty
+# and discarded slots. A door holds its slot while its authentication is in
+# progress: resetting or discarding it gives the slot back, and a new door
+# may take over a slot left idle for longer than the manager's idle timeout.
+# Slots are claimed, discarded and taken over under one insert lock, which
+# also turns tombstones ending a probe run back into empty slots so misses
+# stop early. A slot is read and written whole under one of a fixed pool of
+# striped process-shared locks, chosen by the door key, and the key is
+# checked again once that lock is held, since the slot may have changed
+# hands after it was found. States are only meaningful for the compiled
+# tables they came from, so the table records a digest of the engine and
+# refuses managers built from different policies.
+MAGIC = b'ACST'
+VERSION = 1
+HEADER = struct.Struct('<4sHHI16s')
+HEADER_SIZE = 32
+SLOT = struct.Struct('<QiiIxxxxdd')
+EMPTY = 0
+DISCARDED = 1
+# Seconds after which an untouched session may lose its slot to a new door
+DEFAULT_IDLE_TIMEOUT = 600.0
+
+
+class SessionTableFull(RuntimeError):
+    """No free or idle slot is left for a new door"""
+
+
+def door_key(door_id):
+    """Process-independent 64-bit key for a door ID"""
+    key = int.from_bytes(hashlib.blake2b(str(door_id).encode(), digest_size=8).digest(), 'little')
+    return key if key > DISCARDED else key + 2
+
+
+def engine_digest(engine):
+    """Digest of the compiled tables that session states index into"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(memoryview(engine.table).cast('B'))
+    digest.update(memoryview(engine.zone_start).cast('B'))
+    return digest.digest()
+
+
+class SharedSessionTable:
+    """
+    Fixed-size open-addressing table of door sessions in shared memory.
+
+    Create it before forking workers (or pass it to a spawned worker as a
+    Process argument); every process then reads and advances the same slots.
+    """
+
+    def __init__(self, shm, locks, insert_lock, owner=False):
+        self.shm = shm
+        self._locks = locks
+        self._insert_lock = insert_lock
+        self.owner = owner
+        magic, version, slot_size, num_slots, digest = HEADER.unpack_from(shm.buf)
+        if magic != MAGIC or version != VERSION or slot_size != SLOT.size:
+            raise ValueError(f"Not a shared session table: {shm.name}")
+        self.num_slots = num_slots
+        self.digest = digest
+        # door ID -> (key, slot) seen by this process
+        self._slots = {}
+
+    @classmethod
+    def create(cls, engine, num_slots=65_536, num_locks=64, context=None):
+        """New table for sessions of engine's policies; context picks the lock type (fork/spawn)"""
+        context = context or multiprocessing
+        shm = shared_memory.SharedMemory(create=True, size=HEADER_SIZE + num_slots * SLOT.size)
+        # Fresh shared memory is zero-filled, so every slot starts EMPTY
+        HEADER.pack_into(shm.buf, 0, MAGIC, VERSION, SLOT.size, num_slots, engine_digest(engine))
+        return cls(shm, tuple(context.Lock() for _ in range(num_locks)), context.Lock(), owner=True)
+
+    @classmethod
+    def attach(cls, name, locks, insert_lock):
+        """Open a table created by another process (used when unpickling in a child)"""
+        # Children share the creator's resource tracker, so attaching here
+        # does not get the segment removed when the child exits
+        return cls(shared_memory.SharedMemory(name=name), locks, insert_lock)
+
+    def __reduce__(self):
+        return (SharedSessionTable.attach, (self.shm.name, self._locks, self._insert_lock))
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def unlink(self):
+        """Remove the segment's name; processes already attached (or forked) keep using it"""
+        if self.owner:
+            self.shm.unlink()
+            self.owner = False
+
+    def close(self):
+        """Detach this process; the creator also removes the segment"""
+        self.shm.close()
+        self.unlink()
+
+    def lock(self, key):
+        return self._locks[key % len(self._locks)]
+
+    def _offset(self, slot):
+        return HEADER_SIZE + slot * SLOT.size
+
+    def _key_at(self, slot):
+        return struct.unpack_from('<Q', self.shm.buf, self._offset(slot))[0]
+
+    def find(self, door_id, create=True, now=0.0, idle_before=None):
+        """
+        Returns: (key, slot) for a door, claiming a slot for a new door when
+        create is set; slot is None when the door has none. A new door is
+        stamped with `now` and may take over a slot last updated before
+        idle_before. Raises SessionTableFull when no slot can be had.
+        """
+        cached = self._slots.get(door_id)
+        if cached is not None and self._key_at(cached[1]) == cached[0]:
+            return cached
+        key = door_key(door_id)
+        slot = self._probe(key)
+        if slot is None and create:
+            with self._insert_lock:
+                # Probe again: another process may have claimed it meanwhile
+                slot = self._probe(key)
+                if slot is None:
+                    slot = self._claim(key, now, idle_before)
+        if slot is not None:
+            self._slots[door_id] = (key, slot)
+        else:
+            self._slots.pop(door_id, None)
+        return key, slot
+
+    @contextmanager
+    def locked(self, door_id, create=True, now=0.0, idle_before=None):
+        """Hold the lock of a door's slot; yields (key, slot) as find() returns them"""
+        while True:
+            key, slot = self.find(door_id, create, now, idle_before)
+            with self.lock(key):
+                # Discarded (and perhaps taken by another door) since it was found?
+                if slot is None or self._key_at(slot) == key:
+                    yield key, slot
+                    return
+            self._slots.pop(door_id, None)
+
+    def _probe(self, key):
+        num_slots = self.num_slots
+        slot = key % num_slots
+        for _ in range(num_slots):
+            found = self._key_at(slot)
+            if found == key:
+                return slot
+            if found == EMPTY:
+                return None
+            slot = (slot + 1) % num_slots
+        return None
+
+    def _claim(self, key, now, idle_before):
+        """Take the first free or idle slot from the key's home slot on (insert lock held)"""
+        num_slots = self.num_slots
+        slot = key % num_slots
+        for _ in range(num_slots):
+            found = self._key_at(slot)
+            if found <= DISCARDED:
+                self.write(slot, key, UNSET, UNSET, 0, now, now)
+                return slot
+            if idle_before is not None and self.read(slot)[5] < idle_before:
+                with self.lock(found):
+                    # Its owner may have stepped it since the unlocked read
+                    current, *_, updated = self.read(slot)
+                    if current == found and updated < idle_before:
+                        self.write(slot, key, UNSET, UNSET, 0, now, now)
+                        return slot
+            slot = (slot + 1) % num_slots
+        raise SessionTableFull(f"Shared session table is full ({num_slots} slots)")
+
+    def read(self, slot):
+        """Returns: (key, zone_id, state, step, started, updated)"""
+        return SLOT.unpack_from(self.shm.buf, self._offset(slot))
+
+    def write(self, slot, key, zone_id, state, step, started, updated):
+        SLOT.pack_into(self.shm.buf, self._offset(slot), key, zone_id, state, step, started, updated)
+
+    def discard(self, door_id):
+        """Give a door's slot back"""
+        with self._insert_lock:
+            # Nothing is claimed or discarded meanwhile, so the slot found stays the door's
+            key, slot = self.find(door_id, create=False)
+            if slot is None:
+                return
+            with self.lock(key):
+                self.write(slot, DISCARDED, UNSET, UNSET, 0, 0.0, 0.0)
+            self._compact(slot)
+        self._slots.pop(door_id, None)
+
+    def _compact(self, slot):
+        """Empty the tombstones that end a probe run, so misses stop there (insert lock held)"""
+        num_slots = self.num_slots
+        for _ in range(num_slots):
+            if self._key_at(slot) != DISCARDED or self._key_at((slot + 1) % num_slots) != EMPTY:
+                return
+            self.write(slot, EMPTY, UNSET, UNSET, 0, 0.0, 0.0)
+            slot = (slot - 1) % num_slots
+
+    def __len__(self):
+        """Number of doors holding a slot"""
+        return sum(1 for key, *_ in SLOT.iter_unpack(self.shm.buf[HEADER_SIZE:]) if key > DISCARDED)
+
+
+class SharedSessionManager:
+    """
+    SessionManager counterpart whose session state lives in a
+    SharedSessionTable, so any worker process can advance any door.
+
+    Offers the transition/step/reset/expire/process_sequence interface that
+    AccessControlServer and the fuzz harness use. Step timeouts are checked
+    against the `updated` timestamp of the slot, both when the door's next
+    event arrives and in expire(). A session not updated for idle_timeout
+    seconds (keep it above the step timeouts) may lose its slot to a new
+    door once no free one is near. Policies are fixed for the life of the
+    table: every worker must compile the same ones.
+    """
+
+    def __init__(self, table=None, engine=None, step_timeout=None, zone_timeouts=None, clock=time.monotonic,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        if engine is None:
+            from engine import CompiledPolicyEngine
+            engine = CompiledPolicyEngine()
+        self.engine = engine
+        self.config = engine.config
+        # SharedSessionTable defines __len__, so an empty one is falsy
+        self.table = table if table is not None else SharedSessionTable.create(engine)
+        if self.table.digest != engine_digest(engine):
+            raise ValueError("Shared session table was created for different policies")
+        self.step_timeout = step_timeout
+        self.zone_timeouts = dict(zone_timeouts or {})
+        # CLOCK_MONOTONIC is system-wide, so timestamps compare across processes
+        self.clock = clock
+        self.idle_timeout = idle_timeout
+        self._timed = step_timeout is not None or bool(self.zone_timeouts)
+
+    def __len__(self):
+        return len(self.table)
+
+    def _locked(self, door_id, create=True):
+        """table.locked() for a door, stamped with this manager's clock"""
+        now = self.clock()
+        idle_before = None if self.idle_timeout is None else now - self.idle_timeout
+        return self.table.locked(door_id, create, now, idle_before)
+
+    def reset(self, door_id):
+        """Reset a door's session to START; a door at START needs no slot, so it is freed"""
+        self.table.discard(door_id)
+
+    def discard(self, door_id):
+        """Forget a door's session and free its slot"""
+        self.table.discard(door_id)
+
+    def _timeout(self, zone_id):
+        return self.zone_timeouts.get(self.engine.zones[zone_id], self.step_timeout)
+
+    def _step(self, slot, input_symbol, zone):
+        """Advance one slot (caller holds its lock); returns (previous state, state, step, reason)"""
+        table = self.table
+        engine = self.engine
+        key, zone_id, state, step, started, updated = table.read(slot)
+        now = self.clock()
+        previous = state
+
+        if state == UNSET:
+            if not zone:
+                table.write(slot, key, UNSET, REJECTED, 0, now, now)
+                return previous, REJECTED, 0, REASON_NO_ZONE
+            zone_id = engine.zone_index.get(zone)
+            if zone_id is None:
+                table.write(slot, key, UNSET, REJECTED, 0, now, now)
+                return previous, REJECTED, 0, REASON_INVALID_ZONE
+            state = previous = engine.zone_start[zone_id]
+            started = now
+        elif state <= ACCEPTED:
+            return previous, state, step, REASON_COMPLETED
+        elif self._timed:
+            timeout = self._timeout(zone_id)
+            if timeout is not None and now - updated > timeout:
+                table.write(slot, key, zone_id, REJECTED, step, started, now)
+                return previous, REJECTED, step, REASON_TIMEOUT
+
+        next_state = engine.step(state, input_symbol)
+        if next_state == REJECTED:
+            reason = engine.reject_code(state, input_symbol)
+        else:
+            step += 1
+            reason = REASON_NONE
+        table.write(slot, key, zone_id, next_state, step, started, now)
+        return previous, next_state, step, reason
+
+    def step(self, door_id, input_symbol, zone=None):
+        """
+        Feed one symbol without building a message
+        Returns: (new_state, reason_code), the state named as by AccessControlDFA.step
+        """
+        with self._locked(door_id) as (_, slot):
+            _, state, step, reason = self._step(slot, input_symbol, zone)
+        return self.engine.state_name(state, step), reason
+
+    def transition(self, door_id, input_symbol, zone=None, credential=None):
+        """
+        Feed one symbol to a door's session (same rules as SessionManager.transition)
+        Returns: (new_state, message)
+        """
+        with self._locked(door_id) as (_, slot):
+            previous, state, step, reason = self._step(slot, input_symbol, zone)
+            zone_id = self.table.read(slot)[1]
+        return self.engine.state_name(state, step), \
+            self._message(zone_id, state, step, reason, input_symbol, previous)
+
+    def _message(self, zone_id, state, step, reason, input_symbol, previous):
+        engine = self.engine
+        zone = None
+        expected = None
+        if zone_id != UNSET:
+            zone = engine.zones[zone_id]
+            if zone_id in engine.expression_zones:
+                # Steps describe the new state, rejects the state that refused the symbol
+                expected = engine.expected_symbols(state if reason == REASON_NONE else previous)
+        return render_message(self.config, reason, zone, step, input_symbol, expected)
+
+    def expire(self, now=None):
+        """
+        Reject timed-out sessions of the doors this process has seen
+        Returns: [(door_id, 'REJECTED', message)] for each expired session
+        """
+        if not self._timed:
+            return []
+        now = self.clock() if now is None else now
+        table = self.table
+        events = []
+        for door_id, (key, slot) in list(table._slots.items()):
+            with table.lock(key):
+                found, zone_id, state, step, started, updated = table.read(slot)
+                if found != key:
+                    # Freed by another process; forget it here too
+                    if table._slots.get(door_id) == (key, slot):
+                        del table._slots[door_id]
+                    continue
+                if state <= ACCEPTED or zone_id == UNSET:
+                    continue
+                timeout = self._timeout(zone_id)
+                if timeout is None or now - updated <= timeout:
+                    continue
+                # Whichever worker gets here first rejects it; the others then see REJECTED
+                table.write(slot, key, zone_id, REJECTED, step, started, now)
+            events.append((door_id, 'REJECTED', self._message(zone_id, REJECTED, step, REASON_TIMEOUT, None, state)))
+        return events
+
+    def process_sequence(self, door_id, sequence, zone):
+        """Reset a door and process a complete sequence while holding its lock"""
+        results = []
+        with self._locked(door_id) as (key, slot):
+            now = self.clock()
+            self.table.write(slot, key, UNSET, UNSET, 0, now, now)
+            for i, symbol in enumerate(sequence):
+                previous, state, step, reason = self._step(slot, symbol, zone if i == 0 else None)
+                results.append({
+                    'step': i + 1,
+                    'input': symbol,
+                    'state': self.engine.state_name(state, step),
+                    'message': self._message(self.table.read(slot)[1], state, step, reason, symbol, previous)
+                })
+                if state <= ACCEPTED:
+                    break
+        return results
+
+    def get_current_state(self, door_id):
+        """Get a door's state information in AccessControlDFA.get_current_state form"""
+        with self._locked(door_id, create=False) as (_, slot):
+            if slot is None:
+                return {'state': 'START', 'sequence': [], 'target_zone': None}
+            _, zone_id, state, step, _, _ = self.table.read(slot)
+        if zone_id == UNSET:
+            return {'state': 'START' if state == UNSET else 'REJECTED', 'sequence': [], 'target_zone': None}
+        zone = self.engine.zones[zone_id]
+        return {
+            'state': self.engine.state_name(state, step),
+            'sequence': self.engine.matched_sequence(zone, step),
+            'target_zone': zone
+        }
+
+    def is_accepted(self, door_id):
+        return self._final_state(door_id) == ACCEPTED
+
+    def is_rejected(self, door_id):
+        return self._final_state(door_id) == REJECTED
+
+    def _final_state(self, door_id):
+        with self._locked(door_id, create=False) as (_, slot):
+            return UNSET if slot is None else self.table.read(slot)[2]
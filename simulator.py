@@ -0,0 +1,102 @@
+# simulator.py - Load-Test Client for the Event-Ingestion Server
+
+import argparse
+import asyncio
+import random
+import time
+
+from zones import ZoneConfig
+
+
+def generate_events(doors, error_rate=0.1, seed=None):
+    """
+    Yield event lines forever, interleaving authentications across doors.
+    Each door walks its zone's policy; some symbols are replaced at random
+    so a share of authentications is denied.
+    """
+    config = ZoneConfig()
+    rng = random.Random(seed)
+    symbols = list(config.auth_symbols)
+    progress = {door_id: 0 for door_id, _ in doors}
+
+    while True:
+        door_id, zone = rng.choice(doors)
+        policy = config.get_policy(zone)
+        step = progress[door_id]
+        symbol = policy[step]
+        if rng.random() < error_rate:
+            symbol = rng.choice(symbols)
+
+        progress[door_id] = 0 if step + 1 == len(policy) or symbol != policy[step] else step + 1
+        yield f"{door_id} {zone if step == 0 else '-'} {symbol}\n"
+
+
+async def run_connection(connection_id, num_doors, num_events, batch_size, host, port, unix_path):
+    """Pipeline events over one connection and count the responses"""
+    if unix_path:
+        reader, writer = await asyncio.open_unix_connection(unix_path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+
+    zones = ZoneConfig().get_zones()
+    # Each connection owns its doors so a door's events stay in order
+    doors = [(f"c{connection_id}-d{i}", zones[i % len(zones)]) for i in range(num_doors)]
+    events = generate_events(doors, seed=connection_id)
+    counts = {'ACCEPTED': 0, 'REJECTED': 0, 'responses': 0}
+
+    async def send():
+        for start in range(0, num_events, batch_size):
+            writer.write(''.join(next(events) for _ in range(min(batch_size, num_events - start))).encode())
+            await writer.drain()
+
+    async def receive():
+        while counts['responses'] < num_events:
+            line = await reader.readline()
+            if not line:
+                break
+            state = line.split(b' ', 2)[1].decode()
+            counts['responses'] += 1
+            if state in counts:
+                counts[state] += 1
+
+    await asyncio.gather(send(), receive())
+    writer.close()
+    await writer.wait_closed()
+    return counts
+
+
+async def run_simulation(connections, doors, events, batch_size, host, port, unix_path):
+    started = time.perf_counter()
+    results = await asyncio.gather(*[
+        run_connection(i, doors, events, batch_size, host, port, unix_path) for i in range(connections)
+    ])
+    elapsed = time.perf_counter() - started
+
+    total = sum(result['responses'] for result in results)
+    granted = sum(result['ACCEPTED'] for result in results)
+    denied = sum(result['REJECTED'] for result in results)
+
+    print("\nSIMULATION RESULTS")
+    print("-" * 40)
+    print(f"Connections: {connections} | Doors per connection: {doors}")
+    print(f"Events: {total} in {elapsed:.2f}s ({total / elapsed:,.0f} events/s)")
+    print(f"Granted: {granted} | Denied: {denied}")
+    return total, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the access control event server")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', metavar='PATH', help="Connect over a Unix socket instead of TCP")
+    parser.add_argument('--connections', type=int, default=8)
+    parser.add_argument('--doors', type=int, default=100, help="Doors per connection")
+    parser.add_argument('--events', type=int, default=50000, help="Events per connection")
+    parser.add_argument('--batch', type=int, default=256, help="Events per write")
+    args = parser.parse_args()
+
+    asyncio.run(run_simulation(args.connections, args.doors, args.events, args.batch,
+                               args.host, args.port, args.unix))
+
+if __name__ == "__main__":
+    main()
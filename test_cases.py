@@ -1,6 +1,37 @@
 # test_cases.py - Comprehensive Test Cases for DFA Access Control
 
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from itertools import product
+
+from audit import AuditReader, AuditWriter
+from compile_cache import cached_engine
+from decision_cache import DecisionCache
 from dfa import AccessControlDFA
+from engine import CompiledPolicyEngine
+from feed import FeedSession, feeder, FEED_ACCEPTED, FEED_PENDING, FEED_REJECTED
+from fuzz import exhaustive_tasks, fuzz, random_tasks
+from headless import build_sessions, run_stdio
+from http_api import DecisionHTTPServer, start_in_thread
+from lockout import LockoutGuard, SlidingCountMinSketch
+from metrics import Metrics
+from policy_lang import PolicySyntaxError, cache_size
+from policy_store import PolicyStore, generate_policies
+from reasons import REASON_INVALID_SYMBOL, REASON_INVALID_ZONE, REASON_NO_ZONE, REASON_TIMEOUT, REASON_WRONG_METHOD
+from replay import parse_csv, parse_jsonl, replay
+from server import AccessControlServer
+from sharded import ShardedReplay
+from sessions import SessionManager, UNSET
+from shared_sessions import EMPTY, SessionTableFull, SharedSessionManager, SharedSessionTable, door_key
+from snapshots import PolicyRegistry
+from trie import PolicyTrie
+from whatif import simulate
+from zone_matcher import ZoneMatcher
 from zones import ZoneConfig
 
 def run_comprehensive_tests():
@@ -173,9 +204,1241 @@ def generate_test_table():
     
     print("-"*90)
 
+def run_engine_equivalence_tests(max_length=3):
+    """Check the compiled engine backend against the reference DFA"""
+    reference = AccessControlDFA()
+    backends = [AccessControlDFA(engine=CompiledPolicyEngine()),
+                AccessControlDFA(engine=CompiledPolicyEngine(minimize=True))]
+    config = ZoneConfig()
+    
+    # Every sequence up to max_length plus each zone's own policy with extras
+    alphabet = list(config.auth_symbols) + ['Z']
+    sequences = [list(seq) for n in range(max_length + 1) for seq in product(alphabet, repeat=n)]
+    sequences += [policy + extra for policy in config.zone_policies.values() for extra in ([], ['A'], ['Z'])]
+    zones = config.get_zones() + ['UNKNOWN_ZONE', None]
+    
+    print("\nENGINE EQUIVALENCE TESTS")
+    print("="*70)
+    
+    passed = 0
+    failed = 0
+    
+    for zone in zones:
+        for sequence in sequences:
+            expected = reference.process_sequence(sequence, zone)
+            for compiled in backends:
+                actual = compiled.process_sequence(sequence, zone)
+                if actual == expected and compiled.is_accepted() == reference.is_accepted():
+                    passed += 1
+                else:
+                    failed += 1
+                    print(f"❌ FAIL: zone={zone} sequence={sequence}")
+    
+    print(f"Compared: {passed + failed} | Passed: {passed} | Failed: {failed}")
+    
+    return passed, failed
+
+def run_batch_tests(max_length=3):
+    """Check vectorized process_batch against the reference DFA"""
+    reference = AccessControlDFA()
+    engine = CompiledPolicyEngine()
+    config = ZoneConfig()
+    
+    alphabet = list(config.auth_symbols) + ['Z']
+    sequences = [list(seq) for n in range(max_length + 1) for seq in product(alphabet, repeat=n)]
+    sequences += [policy + extra for policy in config.zone_policies.values() for extra in ([], ['A'], ['Z'])]
+    pairs = [(sequence, zone) for zone in config.get_zones() for sequence in sequences]
+    
+    symbols, zone_ids = engine.encode_batch([seq for seq, _ in pairs], [zone for _, zone in pairs])
+    states, steps, reasons = engine.process_batch(symbols, zone_ids)
+    
+    print("\nBATCH EVALUATION TESTS")
+    print("="*70)
+    
+    passed = 0
+    failed = 0
+    
+    for (sequence, zone), state, step in zip(pairs, states, steps):
+        results = reference.process_sequence(sequence, zone)
+        expected_steps = sum(1 for result in results if result['state'] != 'REJECTED')
+        if engine.state_names[state] == reference.current_state and step == expected_steps:
+            passed += 1
+        else:
+            failed += 1
+            print(f"❌ FAIL: zone={zone} sequence={sequence}")
+    
+    # Batches on a reference DFA leave an authentication in progress on the reference logic
+    reference.reset()
+    reference.transition('C', 'MAIN_ENTRANCE')
+    reference.process_batch(symbols, zone_ids)
+    if reference.transition('P')[0] == 'STEP_2' and reference.engine is None:
+        passed += 1
+    else:
+        failed += 1
+        print("❌ FAIL: process_batch switched the DFA's backend")
+    
+    print(f"Compared: {passed + failed} | Passed: {passed} | Failed: {failed}")
+    
+    return passed, failed
+
+def run_session_tests(num_threads=8, doors_per_thread=50):
+    """Check interleaved per-door sessions against the reference DFA"""
+    config = ZoneConfig()
+    manager = SessionManager()
+    zones = config.get_zones()
+    errors = []
+    
+    def worker(thread_id):
+        reference = AccessControlDFA()
+        doors = [(f"door-{thread_id}-{i}", zones[i % len(zones)]) for i in range(doors_per_thread)]
+        # Feed one symbol per door in round-robin so sessions interleave
+        expected = {}
+        for door_id, zone in doors:
+            policy = config.get_policy(zone)
+            expected[door_id] = [reference.transition(symbol, zone if i == 0 else None) for i, symbol in enumerate(policy)]
+            reference.reset()
+        for step in range(4):
+            for door_id, zone in doors:
+                symbol = config.get_policy(zone)[step]
+                actual = manager.transition(door_id, symbol, zone if step == 0 else None)
+                if actual != expected[door_id][step]:
+                    errors.append((door_id, step, actual))
+        for door_id, zone in doors:
+            if not manager.is_accepted(door_id) or manager.get_current_state(door_id)['sequence'] != config.get_policy(zone):
+                errors.append((door_id, 'final', manager.get_current_state(door_id)))
+    
+    print("\nSESSION MANAGER TESTS")
+    print("="*70)
+    
+    threads = [threading.Thread(target=worker, args=(t,)) for t in range(num_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    for error in errors[:10]:
+        print(f"❌ FAIL: {error}")
+    
+    total = num_threads * doors_per_thread
+    failed = len({error[0] for error in errors})
+    print(f"Sessions: {total} | Passed: {total - failed} | Failed: {failed}")
+    
+    return total - failed, failed
+
+def run_server_tests():
+    """Check the event-server protocol handler on interleaved doors"""
+    server = AccessControlServer()
+    
+    test_cases = [
+        ("d1 MAIN_ENTRANCE C", "d1 STEP_1 Step 1 completed. Next: PIN Entry"),
+        ("d2 TECH_LAB F", "d2 STEP_1 Step 1 completed. Next: Card Swipe"),
+        ("d1 - P", "d1 STEP_2 Step 2 completed. Next: Fingerprint"),
+        ("d2 - P", "d2 REJECTED Access DENIED: Wrong authentication method. Expected: Card Swipe, Got: PIN Entry"),
+        ("d1 - F", "d1 STEP_3 Step 3 completed. Next: Voice Recognition"),
+        ("d1 - V", "d1 ACCEPTED Access GRANTED to MAIN_ENTRANCE"),
+        ("d1 - C", "d1 REJECTED Access DENIED: No target zone specified"),
+        ("d3 NOWHERE C", "d3 REJECTED Access DENIED: Invalid zone specified"),
+        ("garbage", "- ERROR Malformed event: garbage"),
+    ]
+    
+    print("\nEVENT SERVER TESTS")
+    print("="*70)
+    
+    passed = 0
+    failed = 0
+    
+    for line, expected in test_cases:
+        actual = server.handle_line(line).rstrip('\n')
+        if actual == expected:
+            passed += 1
+        else:
+            failed += 1
+            print(f"❌ FAIL: {line!r} -> {actual!r} (expected {expected!r})")
+    
+    print(f"Events: {len(test_cases)} | Passed: {passed} | Failed: {failed}")
+    
+    return passed, failed
+
+def run_replay_tests():
+    """Check audit-log replay decisions on interleaved doors"""
+    events = [
+        {'timestamp': 1, 'door': 'd1', 'zone': 'MAIN_ENTRANCE', 'symbol': 'C'},
+        {'timestamp': 2, 'door': 'd2', 'zone': 'TECH_LAB', 'symbol': 'F'},
+        {'timestamp': 3, 'door': 'd1', 'symbol': 'P'},
+        {'timestamp': 4, 'door': 'd2', 'symbol': 'X'},
+        {'timestamp': 5, 'door': 'd1', 'symbol': 'F'},
+        {'timestamp': 6, 'door': 'd1', 'symbol': 'V'},
+        {'timestamp': 7, 'door': 'd3', 'zone': 'BOARDROOM', 'symbol': 'R'},
+        {'timestamp': 8, 'door': 'd1', 'symbol': 'C'},
+    ]
+    expected = [
+        ('d2', 'REJECTED', 1),
+        ('d1', 'ACCEPTED', 4),
+        ('d1', 'REJECTED', 0),
+        ('d3', 'INCOMPLETE', 1),
+    ]
+    
+    print("\nREPLAY TESTS")
+    print("="*70)
+    
+    actual = [(d['door'], d['decision'], d['steps']) for d in replay(iter(events))]
+    passed = sum(1 for a, e in zip(actual, expected) if a == e)
+    failed = max(len(actual), len(expected)) - passed
+    if failed:
+        print(f"❌ FAIL: {actual}")
+    print(f"Decisions: {len(expected)} | Passed: {passed} | Failed: {failed}")
+    
+    return passed, failed
+
+def run_sharded_replay_tests(num_events=20000, workers=3):
+    """Check that sharded replay matches single-process replay line for line"""
+    rng = random.Random(7)
+    config = ZoneConfig()
+    zones = config.get_zones()
+    events = []
+    progress = {}
+    for i in range(num_events):
+        door = f'door-{rng.randrange(200)}'
+        step = progress.get(door, 0)
+        zone = zones[hash(door) % len(zones)]
+        policy = config.get_policy(zone)
+        symbol = policy[step] if rng.random() > 0.1 else rng.choice(list(config.auth_symbols))
+        events.append({'timestamp': i, 'door': door, 'zone': zone if step == 0 else None, 'symbol': symbol})
+        progress[door] = 0 if symbol != policy[step] or step + 1 == len(policy) else step + 1
+    
+    print("\nSHARDED REPLAY TESTS")
+    print("="*70)
+    
+    expected = [json.dumps(decision) for decision in replay(iter(events))]
+    lines = [json.dumps(event).encode() + b'\n' for event in events]
+    # Malformed lines are skipped and counted, never fatal
+    bad_lines = [b'{"door": "d1", "symb\n', b'[1, 2]\n', b'{"door": "d1"}\n', b'\xff\n',
+                 b'{"door": "d1", "symbol": ["P"]}\n', b'{"door": "d1", "zone": 5, "symbol": "C"}\n',
+                 b'{"door": 7, "symbol": "C"}\n']
+    for i, line in enumerate(bad_lines):
+        lines.insert(i * 2500 + 17, line)
+    sharded = ShardedReplay(lines, 'jsonl', workers)
+    actual = list(sharded)
+    skipped = [0]
+    single = [json.dumps(decision) for decision in replay(parse_jsonl(lines, skipped))]
+    csv_skipped = [0]
+    csv_events = list(parse_csv([b'timestamp,door,zone,symbol\n', b'1,d1,MAIN_ENTRANCE,C\n', b'2,d1\n', b'\n'],
+                                csv_skipped))
+    
+    checks = [
+        ("Sharded matches single-process", actual == expected),
+        ("Malformed lines skipped (sharded)", sharded.skipped == len(bad_lines)),
+        ("Malformed lines skipped (single)", single == expected and skipped[0] == len(bad_lines)),
+        ("Malformed CSV lines skipped", len(csv_events) == 1 and csv_skipped[0] == 1),
+    ]
+    passed = sum(1 for _, ok in checks if ok)
+    failed = len(checks) - passed
+    for name, ok in checks:
+        if not ok:
+            print(f"❌ FAIL: {name}")
+    print(f"Decisions: {len(expected)} | Workers: {workers} | Passed: {passed} | Failed: {failed}")
+    
+    return passed, failed
+
+def run_zone_inference_tests():
+    """Check zone inference from symbols when no zone is supplied"""
+    config = ZoneConfig()
+    # Shared prefixes and an identical pair on top of the unique-first-symbol zones
+    config.zone_policies.update({
+        'LAB_A': ['K', 'F', 'X', 'V'],
+        'LAB_B': ['K', 'F', 'P'],
+        'LAB_C': ['K', 'F', 'P'],
+    })
+    trie = PolicyTrie(config)
+    
+    test_cases = [(policy, zone, 'ACCEPTED') for zone, policy in ZoneConfig().zone_policies.items()]
+    test_cases += [
+        (['K', 'F', 'X', 'V'], 'LAB_A', 'ACCEPTED'),
+        (['K', 'F', 'P'], 'LAB_B', 'ACCEPTED'),
+        (['K', 'F'], None, 'STEP_2'),
+        (['K', 'F', 'A'], None, 'REJECTED'),
+        (['Z'], None, 'REJECTED'),
+    ]
+    
+    print("\nZONE INFERENCE TESTS")
+    print("="*70)
+    print(f"Trie nodes: {trie.num_nodes} | Conflicts: {trie.conflicts}")
+    
+    passed = 0
+    failed = 0
+    
+    for dfa in (AccessControlDFA(infer_zone=True, config=config),
+                AccessControlDFA(CompiledPolicyEngine(config), infer_zone=True)):
+        for sequence, zone, expected in test_cases:
+            dfa.process_sequence(sequence, None)
+            actual = dfa.get_current_state()
+            if actual['state'] == expected and (expected != 'ACCEPTED' or actual['target_zone'] == zone):
+                passed += 1
+            else:
+                failed += 1
+                print(f"❌ FAIL: sequence={sequence} -> {actual}")
+    
+    print(f"Sequences: {passed + failed} | Passed: {passed} | Failed: {failed}")
+    
+    return passed, failed
+
+def run_policy_store_tests(num_zones=2000):
+    """Check that every store format round-trips and drives the DFA the same way"""
+    policies = generate_policies(num_zones)
+    source = PolicyStore.from_policies(policies)
+    
+    print("\nPOLICY STORE TESTS")
+    print("="*70)
+    
+    passed = 0
+    failed = 0
+    
+    with tempfile.TemporaryDirectory() as directory:
+        for fmt, save in (('json', source.save_json), ('csv', source.save_csv), ('bin', source.save_binary)):
+            path = os.path.join(directory, f'policies.{fmt}')
+            save(path)
+            store = PolicyStore.load(path)
+            engine = CompiledPolicyEngine(store)
+            
+            ok = store.get_zones() == tuple(policies) and store.has_zone('ZONE_000000') and not store.has_zone('NOPE')
+            ok = ok and all(engine.accepts(policy, zone) for zone, policy in policies.items())
+            ok = ok and all(list(store.get_policy(zone)) == policy for zone, policy in policies.items())
+            if ok:
+                passed += 1
+            else:
+                failed += 1
+                print(f"❌ FAIL: {fmt} round trip")
+        
+        # Damaged binary files are refused instead of loading different policies
+        with open(path, 'rb') as f:
+            blob = f.read()
+        damaged = {'cut 3': blob[:-3], 'cut 1': blob[:-1], 'header only': blob[:20], 'mid symbols': blob[:40],
+                   'padded': blob + b'\0', 'bad symbol': blob[:-1] + b'\xff'}
+        for name, content in damaged.items():
+            with open(path, 'wb') as f:
+                f.write(content)
+            try:
+                PolicyStore.load_binary(path)
+                failed += 1
+                print(f"❌ FAIL: Loaded damaged binary ({name})")
+            except ValueError:
+                passed += 1
+        if not any(name.endswith('.tmp') for name in os.listdir(directory)):
+            passed += 1
+        else:
+            failed += 1
+            print("❌ FAIL: Temporary file left behind")
+    
+    print(f"Checks: {passed + failed} | Passed: {passed} | Failed: {failed}")
+    
+    return passed, failed
+
+def run_hot_reload_tests():
+    """Check that in-flight sessions keep their snapshot across a reload"""
+    registry = PolicyRegistry()
+    manager = SessionManager(registry=registry)
+    
+    # door-1 starts under version 1, then MAIN_ENTRANCE changes to C P X V
+    manager.transition('door-1', 'C', 'MAIN_ENTRANCE')
+    manager.transition('door-1', 'P')
+    candidate = ZoneConfig()
+    candidate.zone_policies['MAIN_ENTRANCE'] = ['C', 'P', 'X', 'V']
+    registry.reload(candidate)
+    
+    test_cases = [
+        ("In-flight session finishes on old policy", 'door-1', ['F', 'V'], None, 'ACCEPTED'),
+        ("New session uses new policy", 'door-2', ['C', 'P', 'X', 'V'], 'MAIN_ENTRANCE', 'ACCEPTED'),
+        ("Old sequence rejected for new session", 'door-3', ['C', 'P', 'F', 'V'], 'MAIN_ENTRANCE', 'REJECTED'),
+    ]
+    
+    print("\nHOT RELOAD TESTS")
+    print("="*70)
+    print(f"Policy version: {registry.version}")
+    
+    passed = 0
+    failed = 0
+    
+    for name, door_id, sequence, zone, expected in test_cases:
+        for i, symbol in enumerate(sequence):
+            state, _ = manager.transition(door_id, symbol, zone if i == 0 else None)
+        if state == expected:
+            passed += 1
+        else:
+            failed += 1
+            print(f"❌ FAIL: {name} -> {state}")
+    
+    # Snapshots are frozen: changing the caller's config afterwards has no effect
+    mutable = ZoneConfig()
+    frozen = SessionManager(CompiledPolicyEngine(mutable))
+    mutable.zone_policies['MAIN_ENTRANCE'].append('A')
+    mutable.auth_symbols['P'] = 'Changed'
+    _, message = frozen.transition('door-4', 'C', 'MAIN_ENTRANCE')
+    frozen_checks = [
+        ("Snapshot config frozen", frozen.config.get_policy('MAIN_ENTRANCE') == ('C', 'P', 'F', 'V')
+         and message.endswith('PIN Entry')),
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'policies.csv')
+        with open(path, 'w') as f:
+            f.write("zone,sequence\nMAIN_ENTRANCE,C P F V\nBROKEN\n")
+        try:
+            PolicyStore.load_csv(path)
+            frozen_checks.append(("One-column CSV row rejected", False))
+        except ValueError:
+            frozen_checks.append(("One-column CSV row rejected", True))
+        
+        # A damaged file is reported and skipped; the watcher keeps going
+        path = os.path.join(tmp, 'watched.json')
+        PolicyStore.from_config(ZoneConfig()).save_json(path)
+        watched = PolicyRegistry(PolicyStore.load(path))
+        stop = watched.watch(path, interval=0.01)
+        try:
+            for mtime, content in ((1, '{"zone_policies": 5}'), (2, '{"zone_polic'),
+                                   (3, '{"zone_policies": {"LAB": ["C", "V"]}}')):
+                with open(path, 'w') as f:
+                    f.write(content)
+                os.utime(path, ns=(mtime * 10**9, mtime * 10**9))
+                time.sleep(0.1)
+                if mtime == 2:
+                    frozen_checks.append(("Damaged policy files skipped",
+                                          watched.version == 1 and watched._watcher.is_alive()))
+            frozen_checks.append(("Good file after damaged ones loaded", watched.version == 2
+                                  and watched.current.config.get_policy('LAB') == ('C', 'V')))
+        finally:
+            stop.set()
+    for name, ok in frozen_checks:
+        if ok:
+            passed += 1
+        else:
+            failed += 1
+            print(f"❌ FAIL: {name}")
+    
+    print(f"Cases: {passed + failed} | Passed: {passed} | Failed: {failed}")
+    
+    return passed, failed
+
+def run_policy_expression_tests():
+    """Check expression policies against fixed sequences and expected messages"""
+    config = ZoneConfig()
+    config.zone_policies['LAB'] = "(C|K) P (F|R)"
+    config.zone_policies['LOOP'] = "C P* F"
+    config.zone_policies['FIX_EXPR'] = "C P F V"
+    dfa = AccessControlDFA(config=config)
+    manager = SessionManager(CompiledPolicyEngine(config, minimize=True))
+    
+    test_cases = [
+        ("Alternative first step", 'LAB', ['K', 'P', 'R'], 'ACCEPTED'),
+        ("Other alternative", 'LAB', ['C', 'P', 'F'], 'ACCEPTED'),
+        ("Alternative not allowed", 'LAB', ['C', 'P', 'V'], 'REJECTED'),
+        ("Repetition skipped", 'LOOP', ['C', 'F'], 'ACCEPTED'),
+        ("Repetition used", 'LOOP', ['C', 'P', 'P', 'P', 'F'], 'ACCEPTED'),
+        ("Expression matches fixed zone", 'FIX_EXPR', ['C', 'P', 'F', 'V'], 'ACCEPTED'),
+        ("Expression wrong order", 'FIX_EXPR', ['P', 'C', 'F', 'V'], 'REJECTED'),
+    ]
+    
+    print("\nPOLICY EXPRESSION TESTS")
+    print("="*70)
+    
+    passed = 0
+    failed = 0
+    
+    for name, zone, sequence, expected in test_cases:
+        dfa.reset()
+        for symbol in sequence:
+            state, _ = dfa.transition(symbol, zone)
+        result = manager.process_sequence(f'expr-{name}', sequence, zone)[-1]['state']
+        if state == expected and result == expected:
+            passed += 1
+        else:
+            failed += 1
+            print(f"❌ FAIL: {name} -> {state} / {result}")
+    
+    manager.transition('expr-partial', 'K', 'LAB')
+    if manager.get_current_state('expr-partial')['sequence'] == []:
+        passed += 1
+    else:
+        failed += 1
+        print(f"❌ FAIL: Expression sequence -> {manager.get_current_state('expr-partial')}")
+    
+    dfa.reset()
+    _, message = dfa.transition('K', 'LAB')
+    if 'Next: PIN Entry' in message:
+        passed += 1
+    else:
+        failed += 1
+        print(f"❌ FAIL: Expected message -> {message}")
+    
+    dfa.reset()
+    _, message = dfa.transition('P', 'LAB')
+    if 'Card Swipe or Keypad Entry' in message:
+        passed += 1
+    else:
+        failed += 1
+        print(f"❌ FAIL: Alternatives message -> {message}")
+    
+    # Recompiling the same policies (e.g. on reload) reuses cached automata
+    cached = cache_size()
+    CompiledPolicyEngine(config)
+    if cache_size() == cached:
+        passed += 1
+    else:
+        failed += 1
+        print("❌ FAIL: Expressions recompiled on reload")
+    
+    for bad in ["(C P", "C | ", "C Z", "P?"]:
+        try:
+            CompiledPolicyEngine(_expression_config(bad))
+            failed += 1
+            print(f"❌ FAIL: Accepted invalid expression {bad!r}")
+        except PolicySyntaxError:
+            passed += 1
+    
+    print(f"Cases: {passed + failed} | Passed: {passed} | Failed: {failed}")
+    
+    return passed, failed
+
+def run_decision_cache_tests():
+    """Check cached process_sequence results against uncached ones"""
+    sequences = [
+        ('MAIN_ENTRANCE', ['C', 'P', 'F', 'V']),
+        ('MAIN_ENTRANCE', ['C', 'X']),
+        ('SERVER_ROOM', ['K', 'R', 'F', 'X']),
+        ('LAB', ['C']),
+        ('MAIN_ENTRANCE', ['C', 'P']),
+        (None, ['C']),
+    ]
+    plain = AccessControlDFA()
+    cached = AccessControlDFA(cache_size=8)
+    manager = SessionManager(cache_size=8)
+    
+    print("\nDECISION CACHE TESTS")
+    print("="*70)
+    
+    passed = 0
+    failed = 0
+    
+    for _ in range(3):
+        for zone, sequence in sequences:
+            expected = plain.process_sequence(sequence, zone)
+            for name, results in [("dfa", cached.process_sequence(sequence, zone)),
+                                  ("sessions", manager.process_sequence('door-1', sequence, zone))]:
+                if [dict(result) for result in results] == expected:
+                    passed += 1
+                else:
+                    failed += 1
+                    print(f"❌ FAIL: {name} {zone} {sequence}")
+            if cached.get_current_state() != plain.get_current_state():
+                failed += 1
+                print(f"❌ FAIL: state after {zone} {sequence}")
+    
+    # The partial sequence is never cached; 5 finished decisions, each hit twice
+    stats = cached.decisions.stats()
+    if (stats['hits'], stats['size']) == (10, 5) and manager.decisions.hits == 10:
+        passed += 1
+    else:
+        failed += 1
+        print(f"❌ FAIL: Cache stats {stats}")
+    
+    # A policy reload must not serve stale decisions
+    candidate = ZoneConfig()
+    candidate.zone_policies['MAIN_ENTRANCE'] = ['C', 'P', 'X', 'V']
+    cached.reload(candidate)
+    manager.registry.reload(candidate)
+    for name, results in [("dfa", cached.process_sequence(['C', 'P', 'F', 'V'], 'MAIN_ENTRANCE')),
+                          ("sessions", manager.process_sequence('door-1', ['C', 'P', 'F', 'V'], 'MAIN_ENTRANCE'))]:
+        if results[-1]['state'] == 'REJECTED':
+            passed += 1
+        else:
+            failed += 1
+            print(f"❌ FAIL: {name} served a stale decision after reload")
+    
+    lru = DecisionCache(maxsize=2)
+    lru.put(1, 'A', b'1', 'a')
+    lru.put(1, 'B', b'1', 'b')
+    lru.get(1, 'A', b'1')
+    lru.put(1, 'C', b'1', 'c')
+    if lru.get(1, 'A', b'1') == 'a' and lru.get(1, 'B', b'1') is None and len(lru) == 2:
+        passed += 1
+    else:
+        failed += 1
+        print("❌ FAIL: LRU eviction order")
+    
+    print(f"Checks: {passed + failed} | Passed: {passed} | Failed: {failed}")
+    print(f"Cache: {stats}")
+    
+    return passed, failed
+
+def run_metrics_tests(num_threads=4, rounds=100):
+    """Check that per-thread counters merge into the scraped totals"""
+    metrics = Metrics(sample_every=8)
+    manager = SessionManager(metrics=metrics)
+    
+    def worker(thread_id):
+        dfa = AccessControlDFA(metrics=metrics)
+        for i in range(rounds):
+            dfa.process_sequence(['C', 'P', 'F', 'V'], 'MAIN_ENTRANCE')
+            manager.process_sequence(f'door-{thread_id}', ['C', 'X'], 'MAIN_ENTRANCE')
+    
+    threads = [threading.Thread(target=worker, args=(t,)) for t in range(num_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    print("\nMETRICS TESTS")
+    print("="*70)
+    
+    data = metrics.snapshot()
+    text = metrics.render_prometheus()
+    total = num_threads * rounds
+    checks = [
+        ("Transition total", data['transitions'] == total * 6),
+        ("Zone counter", data['zones'].get('MAIN_ENTRANCE') == total * 6),
+        ("State counter", data['states'].get('ACCEPTED') == total),
+        ("Reject reasons", data['reasons'].get('WRONG_METHOD') == total),
+        ("Latency sampled", sum(data['latency_buckets']) == total * 6 // 8),
+        ("Exposition format", 'access_transition_reasons_total{reason="WRONG_METHOD"} ' + str(total) in text),
+        ("Finished threads retired", len(metrics._shards) == 0),
+    ]
+    
+    passed = sum(1 for _, ok in checks if ok)
+    failed = len(checks) - passed
+    for name, ok in checks:
+        if not ok:
+            print(f"❌ FAIL: {name}")
+    
+    print(f"Checks: {len(checks)} | Passed: {passed} | Failed: {failed}")
+    
+    return passed, failed
+
+def run_timeout_tests():
+    """Check per-zone step timeouts on the session manager"""
+    now = [1000.0]
+    manager = SessionManager(step_timeout=30, zone_timeouts={'TECH_LAB': 5}, clock=lambda: now[0])
+    manager.transition('main', 'C', 'MAIN_ENTRANCE')
+    manager.transition('lab', 'F', 'TECH_LAB')
+    manager.transition('done', 'C', 'MAIN_ENTRANCE')
+    for symbol in ['P', 'F', 'V']:
+        manager.transition('done', symbol)
+    manager.transition('reset', 'C', 'MAIN_ENTRANCE')
+    manager.reset('reset')
+    
+    print("\nSTEP TIMEOUT TESTS")
+    print("="*70)
+    
+    checks = []
+    now[0] += 10
+    expired = manager.expire()
+    checks.append(("Zone override expires first", [door for door, _, _ in expired] == ['lab']))
+    checks.append(("Timeout reason", bool(expired) and 'Timed out waiting for step 2' in expired[0][2]))
+    checks.append(("Expired session is rejected", manager.is_rejected('lab')))
+    
+    # A new step re-arms the timer from now
+    manager.transition('main', 'P')
+    now[0] += 25
+    expired = manager.expire()
+    checks.append(("Step re-arms timer", expired == [] and not manager.is_rejected('main')))
+    now[0] += 10
+    expired = manager.expire()
+    checks.append(("Default timeout", [door for door, _, _ in expired] == ['main']))
+    checks.append(("Finished and reset sessions never expire",
+                   manager.is_accepted('done') and manager.get_current_state('reset')['state'] == 'START'))
+    
+    passed = sum(1 for _, ok in checks if ok)
+    failed = len(checks) - passed
+    for name, ok in checks:
+        if not ok:
+            print(f"❌ FAIL: {name}")
+    
+    print(f"Checks: {len(checks)} | Passed: {passed} | Failed: {failed}")
+    
+    return passed, failed
+
+def run_lockout_tests():
+    """Check door and credential lockouts after repeated failures"""
+    now = [1000.0]
+    guard = LockoutGuard(max_door_failures=3, max_credential_failures=2, window=60, lockout=300,
+                         clock=lambda: now[0])
+    manager = SessionManager(lockout=guard)
+    
+    print("\nLOCKOUT TESTS")
+    print("="*70)
+    
+    checks = []
+    # Three wrong first symbols on one door lock it, even for a correct sequence
+    for _ in range(3):
+        manager.transition('door-1', 'X', 'MAIN_ENTRANCE')
+        manager.reset('door-1')
+    state, message = manager.transition('door-1', 'C', 'MAIN_ENTRANCE')
+    checks.append(("Door locked", state == 'REJECTED' and 'locked out' in message))
+    checks.append(("Other door unaffected", manager.transition('door-2', 'C', 'MAIN_ENTRANCE')[0] == 'STEP_1'))
+    
+    # A credential failing on two different doors is locked everywhere
+    manager.reset('door-2')
+    for door in ['door-3', 'door-4']:
+        manager.transition(door, 'X', 'MAIN_ENTRANCE', credential='badge-7')
+    state, _ = manager.transition('door-5', 'C', 'MAIN_ENTRANCE', credential='badge-7')
+    checks.append(("Credential locked", state == 'REJECTED'))
+    checks.append(("Other credential unaffected",
+                   manager.transition('door-6', 'C', 'MAIN_ENTRANCE', credential='badge-8')[0] == 'STEP_1'))
+    
+    # Locks expire
+    now[0] += 301
+    manager.reset('door-1')
+    checks.append(("Lockout expires", manager.transition('door-1', 'C', 'MAIN_ENTRANCE')[0] == 'STEP_1'))
+    
+    # Whole sequences are guarded too, including ones answered from the decision cache
+    cached = SessionManager(lockout=LockoutGuard(max_door_failures=2, clock=lambda: now[0]), cache_size=16)
+    policy = ZoneConfig().get_policy('MAIN_ENTRANCE')
+    cached.process_sequence('gate', policy, 'MAIN_ENTRANCE')
+    for _ in range(2):
+        cached.process_sequence('gate', ['X'], 'MAIN_ENTRANCE')
+    results = cached.process_sequence('gate', policy, 'MAIN_ENTRANCE')
+    checks.append(("Cached sequence locked", len(results) == 1 and results[0]['state'] == 'REJECTED'
+                   and 'locked out' in results[0]['message']))
+    checks.append(("Cached failures counted", cached.lockout.stats()['lockouts'] == 1))
+    uncached = SessionManager(lockout=LockoutGuard(max_door_failures=1, clock=lambda: now[0]))
+    uncached.process_sequence('gate', ['X'], 'MAIN_ENTRANCE')
+    checks.append(("Uncached sequence locked",
+                   uncached.process_sequence('gate', policy, 'MAIN_ENTRANCE')[0]['state'] == 'REJECTED'))
+    
+    # The single-door DFA uses the same guard
+    dfa = AccessControlDFA(lockout=LockoutGuard(max_door_failures=1, clock=lambda: now[0]), door_id='lab')
+    dfa.process_sequence(['X'], 'MAIN_ENTRANCE')
+    dfa.reset()
+    state, message = dfa.transition('C', 'MAIN_ENTRANCE')
+    checks.append(("DFA guarded", state == 'REJECTED' and 'locked out' in message))
+    
+    # ... including its decision cache: cached failures count and cached acceptances are refused
+    dfa = AccessControlDFA(lockout=LockoutGuard(max_door_failures=2, clock=lambda: now[0]), door_id='hall',
+                           cache_size=16)
+    dfa.process_sequence(policy, 'MAIN_ENTRANCE')
+    for _ in range(2):
+        dfa.process_sequence(['P', 'P'], 'MAIN_ENTRANCE')
+    results = dfa.process_sequence(policy, 'MAIN_ENTRANCE')
+    checks.append(("DFA cache locked", len(results) == 1 and 'locked out' in results[0]['message']
+                   and dfa.is_rejected()))
+    now[0] += 301
+    checks.append(("DFA lockout not cached", dfa.process_sequence(policy, 'MAIN_ENTRANCE')[-1]['state'] == 'ACCEPTED'))
+    
+    # Door state stays bounded however many door IDs a caller makes up
+    bounded = LockoutGuard(max_door_failures=1, max_doors=8, clock=lambda: now[0])
+    for i in range(100):
+        bounded.record_failure(f'probe-{i}')
+    checks.append(("Door state bounded", len(bounded.doors) == 8 and len(bounded._door_locked_until) == 8))
+    checks.append(("Newest locks kept", bounded.locked('probe-99') and not bounded.locked('probe-0')))
+    
+    # The sketch window forgets old failures
+    sketch = SlidingCountMinSketch(width=64, depth=3, window=60, buckets=6)
+    for t in range(5):
+        sketch.add('badge', 1000 + t)
+    checks.append(("Sketch counts", sketch.estimate('badge', 1005) == 5))
+    checks.append(("Sketch window slides", sketch.estimate('badge', 1100) == 0))
+    
+    passed = sum(1 for _, ok in checks if ok)
+    failed = len(checks) - passed
+    for name, ok in checks:
+        if not ok:
+            print(f"❌ FAIL: {name}")
+    
+    print(f"Checks: {len(checks)} | Passed: {passed} | Failed: {failed}")
+    
+    return passed, failed
+
+def run_audit_tests():
+    """Round-trip binary audit records back to process_sequence results"""
+    print("\nAUDIT RECORD TESTS")
+    print("="*70)
+    
+    checks = []
+    sequences = [(['F', 'C', 'P', 'X'], 'TECH_LAB'), (['C', 'X'], 'MAIN_ENTRANCE'),
+                 (['Z'], 'MAIN_ENTRANCE'), (['C'], 'NOWHERE'), (['F', 'C', 'P', 'X'], 'TECH_LAB')]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'decisions.bin')
+        with AuditWriter(path) as writer:
+            manager = SessionManager(audit=writer, cache_size=16)
+            expected = [manager.process_sequence(f'door-{i % 2}', sequence, zone)
+                        for i, (sequence, zone) in enumerate(sequences)]
+            # Single transitions are recorded too
+            manager.transition('door-9', 'C', 'MAIN_ENTRANCE')
+        
+        with AuditReader(path) as reader:
+            records = list(reader)
+            checks.append(("Record count", len(reader) == sum(map(len, expected)) + 1))
+            results = [reader.to_result(record) for record in records]
+            flat = [dict(result) for results_ in expected for result in results_]
+            # Symbols outside the alphabet are not named in the string table
+            for result in flat:
+                if result['input'] == 'Z':
+                    result.update(input='?', message=result['message'].replace(': Z', ': ?'))
+            checks.append(("Round trip", results[:-1] == flat))
+            checks.append(("Unknown names not stored", 'Z' not in reader.names['s']
+                           and 'NOWHERE' not in reader.names['z']))
+            checks.append(("Cached decisions recorded", results[-2] == flat[-1]))
+            last = reader.decode(reader[-1])
+            checks.append(("Decoded names", last['door'] == 'door-9' and last['zone'] == 'MAIN_ENTRANCE'
+                           and last['state'] == 'STEP_1'))
+            checks.append(("Numpy view", int((reader.array()['state'] == 1).sum()) == 2))
+        
+        # Reopening appends after the existing records
+        with AuditWriter(path) as writer:
+            writer.append('door-9', 'MAIN_ENTRANCE', 1, 'P', 'STEP_2', 0)
+        with AuditReader(path) as reader:
+            checks.append(("Append reopen", len(reader) == len(records) + 1
+                           and reader.decode(reader[-1])['symbol'] == 'P'))
+        
+        # Expression zones: records hold no engine state, so no expected symbols are rendered
+        loop = _expression_config('C P* F')
+        loop_path = os.path.join(tmp, 'loop.bin')
+        with AuditWriter(loop_path) as writer:
+            SessionManager(CompiledPolicyEngine(loop), audit=writer).process_sequence('door', ['C', 'P', 'V'], 'EXPR')
+        with AuditReader(loop_path) as reader:
+            messages = [reader.to_result(record, loop)['message'] for record in reader]
+        checks.append(("Expression zone messages", messages == [
+            'Step 1 completed', 'Step 2 completed', 'Access DENIED: Wrong authentication method. Got: Voice Recognition',
+        ]))
+        
+        # Zone ids past 16 bits (large policy stores)
+        wide = os.path.join(tmp, 'wide.bin')
+        with AuditWriter(wide, PolicyStore.from_policies({f'Z{i}': ['C'] for i in range(70_000)})) as writer:
+            for i in range(70_000):
+                writer.append('door', f'Z{i}', 1, 'C', 'STEP_1', 0, 0.0)
+            writer.append('door', None, 0, 'C', 'REJECTED', REASON_NO_ZONE, 0.0)
+        with AuditReader(wide) as reader:
+            checks.append(("Zone ids past 65535", reader.decode(reader[-2])['zone'] == 'Z69999'
+                           and reader.decode(reader[65_535])['zone'] == 'Z65535'
+                           and reader.decode(reader[-1])['zone'] is None))
+    
+    passed = sum(1 for _, ok in checks if ok)
+    failed = len(checks) - passed
+    for name, ok in checks:
+        if not ok:
+            print(f"❌ FAIL: {name}")
+    
+    print(f"Checks: {len(checks)} | Passed: {passed} | Failed: {failed}")
+    
+    return passed, failed
+
+def run_headless_tests():
+    """Check the compile cache and the headless stdio entry point"""
+    print("\nHEADLESS / COMPILE CACHE TESTS")
+    print("="*70)
+    
+    checks = []
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for minimize in [False, True]:
+            config = _expression_config('C (P|F)+ V')
+            compiled, hit = cached_engine(config, minimize, cache_dir)
+            checks.append((f"First load compiles (minimize={minimize})", not hit))
+            cached, hit = cached_engine(_expression_config('C (P|F)+ V'), minimize, cache_dir)
+            checks.append((f"Second load hits (minimize={minimize})", hit))
+            checks.append((f"Same tables (minimize={minimize})", cached.table == compiled.table
+                           and cached.zone_start == compiled.zone_start
+                           and cached.state_names == compiled.state_names
+                           and cached.expression_zones == compiled.expression_zones))
+        checks.append(("Changed policy misses", not cached_engine(_expression_config('C P+ V'), False, cache_dir)[1]))
+        
+        sessions = build_sessions(cache_dir=cache_dir)
+        output = io.StringIO()
+        run_stdio(sessions, io.StringIO("d1 MAIN_ENTRANCE C\nd1 - P\nd1 - F\nd1 - V\n\nbad\n"), output)
+        lines = output.getvalue().splitlines()
+        checks.append(("Stdio protocol", len(lines) == 5 and lines[3].startswith("d1 ACCEPTED")
+                       and "ERROR" in lines[4]))
+    
+    passed = sum(1 for _, ok in checks if ok)
+    failed = len(checks) - passed
+    for name, ok in checks:
+        if not ok:
+            print(f"❌ FAIL: {name}")
+    
+    print(f"Checks: {len(checks)} | Passed: {passed} | Failed: {failed}")
+    
+    return passed, failed
+
+def run_fuzz_tests():
+    """Differential check of every backend against the reference DFA, in worker processes"""
+    print("\nDIFFERENTIAL FUZZ TESTS")
+    print("="*70)
+    
+    config = ZoneConfig()
+    compared, mismatches = fuzz(config, exhaustive_tasks(config, 3, tuple(config.auth_symbols) + ('Z',)), workers=2)
+    generated = PolicyStore.from_policies(generate_policies(200, 5, seed=3))
+    random_compared, random_mismatches = fuzz(generated, random_tasks(3, 2000), workers=2)
+    mismatches += random_mismatches
+    
+    for name, zone, sequence, expected, actual in mismatches:
+        print(f"❌ FAIL: [{name}] zone={zone} sequence={sequence}")
+    
+    passed = compared + random_compared - len(mismatches)
+    print(f"Compared: {compared + random_compared} | Passed: {passed} | Failed: {len(mismatches)}")
+    
+    return passed, len(mismatches)
+
+def run_whatif_tests():
+    """Compare what-if diffs with deciding each historical authentication directly"""
+    print("\nWHAT-IF SIMULATOR TESTS")
+    print("="*70)
+    
+    config = ZoneConfig()
+    candidate_config = ZoneConfig()
+    candidate_config.zone_policies['MAIN_ENTRANCE'] = ['C', 'P', 'F']
+    candidate_config.zone_policies['TECH_LAB'] = ['F', 'C', 'P', 'X', 'V']
+    candidate_config.zone_policies['NEW_WING'] = ['C']
+    candidate = CompiledPolicyEngine(candidate_config)
+    
+    rng = random.Random(5)
+    authentications = []
+    events = []
+    for i in range(3000):
+        zone = rng.choice(config.get_zones() + ['NEW_WING'])
+        sequence = list(candidate_config.get_policy(zone) if rng.random() < 0.3 else config.get_policy(zone) or ['C'])
+        if rng.random() < 0.2:
+            sequence[rng.randrange(len(sequence))] = rng.choice(list(config.auth_symbols) + ['Z'])
+        door = f'door-{i}'
+        authentications.append((zone, sequence))
+        # Doors interleave: every door's k-th symbol comes after all (k-1)-th ones
+        events += [{'timestamp': k * 3000 + i, 'door': door, 'zone': zone if k == 0 else '', 'symbol': symbol}
+                   for k, symbol in enumerate(sequence)]
+    events.sort(key=lambda event: event['timestamp'])
+    report = simulate(events, candidate, samples=3)
+    
+    # One door per authentication; symbols left after the current policy
+    # finishes start new (zoneless) sessions, as they did in the original replay
+    current = CompiledPolicyEngine()
+    sessions = []
+    for zone, sequence in authentications:
+        while sequence:
+            state = current.start_state(zone)
+            end = 1
+            while state is not None and end <= len(sequence) and current.run(sequence[:end], zone) > 1:
+                end += 1
+            sessions.append((zone, sequence[:end]))
+            zone, sequence = None, sequence[end:]
+    expected = {}
+    for zone, sequence in sessions:
+        before = current.run(sequence, zone) == 1
+        after = candidate.run(sequence, zone) == 1
+        counts = expected.setdefault(zone, [0, 0])
+        counts[0] += before and not after
+        counts[1] += after and not before
+    
+    checks = [("Session count", report['sessions'] == len(sessions))]
+    for zone, (lost, gained) in expected.items():
+        counts = report['zones'][zone]
+        checks.append((f"{zone} diff", (counts['grant_to_deny'], counts['deny_to_grant']) == (lost, gained)))
+    checks.append(("Samples kept", all(len(counts['samples']) <= 3 for counts in report['zones'].values())
+                   and report['zones']['NEW_WING']['samples']))
+    
+    passed = sum(1 for _, ok in checks if ok)
+    failed = len(checks) - passed
+    for name, ok in checks:
+        if not ok:
+            print(f"❌ FAIL: {name}")
+    
+    print(f"Checks: {len(checks)} | Passed: {passed} | Failed: {failed}")
+    
+    return passed, failed
+
+def run_feed_tests():
+    """Check push-style feeding (equivalence with the reference is covered by the fuzz tests)"""
+    print("\nFEED API TESTS")
+    print("="*70)
+    
+    checks = []
+    session = FeedSession(zone='MAIN_ENTRANCE')
+    statuses = [session.feed(symbol) for symbol in ['C', 'P', 'F', 'V', 'C']]
+    checks.append(("Feed statuses", statuses == [FEED_PENDING] * 3 + [FEED_ACCEPTED, FEED_ACCEPTED]))
+    checks.append(("Feed message", session.message() == "Access GRANTED to MAIN_ENTRANCE"))
+    
+    # Two back-to-back authentications in one buffer
+    buffer = memoryview(b'CPFVCPX')
+    session.reset('MAIN_ENTRANCE')
+    first = session.feed_many(buffer)
+    used = session.consumed
+    session.reset('MAIN_ENTRANCE')
+    second = session.feed_many(buffer[used:])
+    checks.append(("Feed many resumes", (first, used, second, session.consumed, session.step)
+                   == (FEED_ACCEPTED, 4, FEED_REJECTED, 3, 2)))
+    checks.append(("Feed many message", "Expected: Fingerprint" in session.message()))
+    
+    session.reset('MAIN_ENTRANCE')
+    checks.append(("Invalid byte", session.feed_many(b'CQ') == FEED_REJECTED
+                   and session.message() == "Access DENIED: Invalid authentication symbol: Q"))
+    session.reset('NOWHERE')
+    checks.append(("Invalid zone", session.status == FEED_REJECTED and "Invalid zone" in session.message()))
+    
+    coroutine = feeder(zone='TECH_LAB')
+    next(coroutine)
+    checks.append(("Coroutine", [coroutine.send(symbol) for symbol in ['F', 'C', 'P', 'X']]
+                   == [FEED_PENDING] * 3 + [FEED_ACCEPTED]))
+    
+    passed = sum(1 for _, ok in checks if ok)
+    failed = len(checks) - passed
+    for name, ok in checks:
+        if not ok:
+            print(f"❌ FAIL: {name}")
+    
+    print(f"Checks: {len(checks)} | Passed: {passed} | Failed: {failed}")
+    
+    return passed, failed
+
+def run_zone_matcher_tests():
+    """Check the bit-parallel zone query (equivalence with the reference is covered by the fuzz tests)"""
+    print("\nZONE MATCHER TESTS")
+    print("="*70)
+    
+    config = _expression_config('C (P|F)+ V')
+    config.zone_policies['LOBBY'] = ['C', 'P', 'F', 'V']
+    config.zone_policies['KIOSK'] = ['C', 'P']
+    matcher = ZoneMatcher(config)
+    
+    checks = []
+    checks.append(("Prefix policies and duplicates", matcher.matching_zones(['C', 'P', 'F', 'V', 'A'])
+                   == ['MAIN_ENTRANCE', 'EXPR', 'LOBBY', 'KIOSK']))
+    checks.append(("Exact match", matcher.matching_zones(['C', 'P', 'F', 'V'], exact=True)
+                   == ['MAIN_ENTRANCE', 'EXPR', 'LOBBY']))
+    checks.append(("Wrong zone sequence", matcher.matching_zones(['P', 'R', 'A', 'F']) == ['IT_INFRASTRUCTURE']))
+    checks.append(("No zone", matcher.matching_zones(['Z', 'C']) == [] and matcher.matching_zones([]) == []))
+    checks.append(("Policy ends do not run into the next", matcher.matching_zones(['P', 'R', 'A', 'F', 'F', 'C'])
+                   == ['IT_INFRASTRUCTURE']))
+    
+    passed = sum(1 for _, ok in checks if ok)
+    failed = len(checks) - passed
+    for name, ok in checks:
+        if not ok:
+            print(f"❌ FAIL: {name}")
+    
+    print(f"Checks: {len(checks)} | Passed: {passed} | Failed: {failed}")
+    
+    return passed, failed
+
+def run_http_api_tests():
+    """Check the batched HTTP decision API over one keep-alive connection"""
+    import http.client
+    
+    print("\nHTTP DECISION API TESTS")
+    print("="*70)
+    
+    engine = CompiledPolicyEngine(_expression_config('C (P|F)+ V'))
+    server = start_in_thread(DecisionHTTPServer(('localhost', 0), PolicyRegistry(engine=engine)))
+    connection = http.client.HTTPConnection('localhost', server.server_address[1], timeout=5)
+    
+    def post(body):
+        connection.request('POST', '/decide', body, {'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    
+    requests = [
+        {'zone': 'MAIN_ENTRANCE', 'sequence': ['C', 'P', 'F', 'V']},
+        {'zone': 'EXPR', 'sequence': 'C F P F V'},
+        {'zone': 'MAIN_ENTRANCE', 'sequence': ['C', 'F']},
+        {'zone': 'MAIN_ENTRANCE', 'sequence': ['C', 'Z']},
+        {'zone': 'MAIN_ENTRANCE', 'sequence': ['C', 'P']},
+        {'zone': 'NOWHERE', 'sequence': ['C']},
+        {'sequence': ['C']},
+    ]
+    expected_decisions = [1, 1, 0, 0, 2, 0, 0]
+    expected_reasons = [0, 0, REASON_WRONG_METHOD, REASON_INVALID_SYMBOL, 0, REASON_INVALID_ZONE, REASON_NO_ZONE]
+    
+    checks = []
+    try:
+        status, reply = post(json.dumps({'requests': requests}))
+        checks.append(("Batch decisions", status == 200 and reply['decisions'] == expected_decisions))
+        checks.append(("Batch reasons", reply.get('reasons') == expected_reasons))
+        status, reply = post(json.dumps(requests[:2]))
+        checks.append(("Bare list on the same connection", status == 200 and reply['decisions'] == [1, 1]))
+        checks.append(("Malformed JSON", post('{"requests": [')[0] == 400))
+        checks.append(("Bad zone type", post('[{"zone": ["A"], "sequence": []}]')[0] == 400))
+        connection.request('GET', '/health')
+        response = connection.getresponse()
+        checks.append(("Health", response.status == 200 and json.loads(response.read())['version'] == 1))
+        connection.request('GET', '/other')
+        response = connection.getresponse()
+        response.read()
+        checks.append(("Unknown path", response.status == 404))
+        negative = http.client.HTTPConnection('localhost', server.server_address[1], timeout=5)
+        negative.request('POST', '/decide', headers={'Content-Length': '-1'})
+        response = negative.getresponse()
+        response.read()
+        negative.close()
+        checks.append(("Negative Content-Length", response.status == 400))
+    finally:
+        connection.close()
+        server.shutdown()
+        server.server_close()
+    
+    passed = sum(1 for _, ok in checks if ok)
+    failed = len(checks) - passed
+    for name, ok in checks:
+        if not ok:
+            print(f"❌ FAIL: {name}")
+    
+    print(f"Checks: {len(checks)} | Passed: {passed} | Failed: {failed}")
+    
+    return passed, failed
+
+_SHARED = {}
+
+def _shared_init(table):
+    _SHARED['sessions'] = SharedSessionManager(table, CompiledPolicyEngine())
+
+def _shared_transition(event):
+    door_id, symbol, zone = event
+    return _SHARED['sessions'].transition(door_id, symbol, zone)[0]
+
+def run_shared_sessions_tests():
+    """Check that doors advance across processes through the shared-memory session table"""
+    import multiprocessing
+    
+    print("\nSHARED-MEMORY SESSION TESTS")
+    print("="*70)
+    
+    engine = CompiledPolicyEngine()
+    context = multiprocessing.get_context('fork')
+    table = SharedSessionTable.create(engine, num_slots=256, context=context)
+    checks = []
+    try:
+        sessions = SharedSessionManager(table, engine)
+        doors = [f'door-{i}' for i in range(100)]
+        policy = ZoneConfig().get_policy('MAIN_ENTRANCE')
+        with context.Pool(2, _shared_init, (table,)) as pool:
+            for i, symbol in enumerate(policy):
+                # Small chunks, so each door's steps are spread over both workers
+                states = pool.map(_shared_transition, [(door, symbol, 'MAIN_ENTRANCE' if i == 0 else None)
+                                                       for door in doors], chunksize=3)
+        checks.append(("Steps split across workers", set(states) == {'ACCEPTED'}))
+        checks.append(("Parent sees worker updates", all(sessions.is_accepted(door) for door in doors)))
+        checks.append(("One slot per door", len(sessions) == 100))
+        
+        sessions.reset('door-0')
+        checks.append(("Reset frees the slot", len(sessions) == 99
+                       and sessions.get_current_state('door-0')['state'] == 'START'))
+        sessions.discard('door-1')
+        checks.append(("Discard frees the slot", len(sessions) == 98
+                       and sessions.get_current_state('door-1')['state'] == 'START'))
+        
+        now = [0.0]
+        timed = SharedSessionManager(table, engine, step_timeout=5, clock=lambda: now[0])
+        timed.transition('late', 'C', 'MAIN_ENTRANCE')
+        now[0] = 10.0
+        state, reason = timed.step('late', 'P')
+        checks.append(("Late step times out", (state, reason) == ('REJECTED', REASON_TIMEOUT)))
+        timed.transition('idle', 'C', 'MAIN_ENTRANCE')
+        now[0] = 20.0
+        checks.append(("Expire", [event[:2] for event in timed.expire()] == [('idle', 'REJECTED')]))
+        
+        try:
+            SharedSessionManager(table, CompiledPolicyEngine(_expression_config('C P+ V')))
+            checks.append(("Different policies refused", False))
+        except ValueError:
+            checks.append(("Different policies refused", True))
+        
+        checks.extend(_shared_slot_reuse_checks(engine, policy))
+        
+        expression_engine = CompiledPolicyEngine(_expression_config('C (P|F)+ V'))
+        expression_table = SharedSessionTable.create(expression_engine, num_slots=8)
+        try:
+            expression = SharedSessionManager(expression_table, expression_engine)
+            expression.transition('door', 'C', 'EXPR')
+            expression.transition('door', 'F')
+            current = expression.get_current_state('door')
+            checks.append(("Expression zone sequence", current['sequence'] == [] and current['target_zone'] == 'EXPR'))
+        finally:
+            expression_table.close()
+    finally:
+        table.close()
+    
+    passed = sum(1 for _, ok in checks if ok)
+    failed = len(checks) - passed
+    for name, ok in checks:
+        if not ok:
+            print(f"❌ FAIL: {name}")
+    
+    print(f"Checks: {len(checks)} | Passed: {passed} | Failed: {failed}")
+    
+    return passed, failed
+
+def _shared_slot_reuse_checks(engine, policy):
+    """Slots come back when doors finish or go idle, and a stale slot is never stepped"""
+    checks = []
+    now = [0.0]
+    small = SharedSessionTable.create(engine, num_slots=4)
+    try:
+        sessions = SharedSessionManager(small, engine, clock=lambda: now[0], idle_timeout=60)
+        server = AccessControlServer(sessions)
+        replies = [server.handle_line(f"gate-{i} {'MAIN_ENTRANCE' if j == 0 else '-'} {symbol}")
+                   for i in range(50) for j, symbol in enumerate(policy)]
+        checks.append(("Finished doors free their slots", all('ACCEPTED' in reply for reply in replies[3::4])
+                       and len(small) == 0))
+        checks.append(("Tombstones emptied", all(small._key_at(slot) == EMPTY for slot in range(4))))
+        
+        for i in range(4):
+            sessions.transition(f'busy-{i}', 'C', 'MAIN_ENTRANCE')
+        checks.append(("Full table answered", server.handle_line('late MAIN_ENTRANCE C').startswith('late ERROR')))
+        now[0] = 61.0
+        checks.append(("Idle slot taken over", sessions.transition('late', 'C', 'MAIN_ENTRANCE')[0] == 'STEP_1'
+                       and len(small) == 4))
+    finally:
+        small.close()
+    
+    # Door A's slot handed to door B while a step for A waits for the lock
+    single = SharedSessionTable.create(engine, num_slots=1)
+    try:
+        first = SharedSessionManager(single, engine)
+        first.transition('door-a', 'C', 'MAIN_ENTRANCE')
+        key, slot = single.find('door-a')
+        outcome = []
+        
+        def late_step():
+            try:
+                outcome.append(first.step('door-a', 'P'))
+            except SessionTableFull:
+                outcome.append('full')
+        
+        with single.lock(key):
+            stepper = threading.Thread(target=late_step)
+            stepper.start()
+            stepper.join(0.2)
+            single.write(slot, door_key('door-b'), UNSET, UNSET, 0, 0.0, 1e18)
+        stepper.join()
+        checks.append(("Key checked under the lock", outcome == ['full']
+                       and single.read(slot)[:4] == (door_key('door-b'), UNSET, UNSET, 0)))
+    finally:
+        single.close()
+    return checks
+
+def _expression_config(expression):
+    config = ZoneConfig()
+    config.zone_policies['EXPR'] = expression
+    return config
+
 if __name__ == "__main__":
     # Run comprehensive tests
     run_comprehensive_tests()
     
+    # Compiled backend must match the reference DFA
+    run_engine_equivalence_tests()
+    run_batch_tests()
+    run_session_tests()
+    run_server_tests()
+    run_replay_tests()
+    run_sharded_replay_tests()
+    run_zone_inference_tests()
+    run_policy_store_tests()
+    run_hot_reload_tests()
+    run_policy_expression_tests()
+    run_decision_cache_tests()
+    run_metrics_tests()
+    run_timeout_tests()
+    run_lockout_tests()
+    run_audit_tests()
+    run_headless_tests()
+    run_fuzz_tests()
+    run_whatif_tests()
+    run_feed_tests()
+    run_zone_matcher_tests()
+    run_http_api_tests()
+    run_shared_sessions_tests()
+    
     # Generate documentation table
     generate_test_table()
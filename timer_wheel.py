@@ -0,0 +1,83 @@
+# timer_wheel.py - Hierarchical Timer Wheel for Session Timeouts
+
+import math
+
+
+class TimerWheel:
+    """
+    Hierarchical timing wheel holding at most one timer per key.
+
+    Level 0 has one slot per tick; each higher level has slots that are
+    `slots` times wider. Timers start on the coarsest level that still fits
+    and move down a level each time a wheel wraps, so schedule, cancel and
+    expiry are O(1) per timer regardless of how many are pending.
+    """
+
+    def __init__(self, tick=0.1, slots=64, levels=4, now=0.0):
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        self._spans = [slots ** level for level in range(levels + 1)]
+        self._wheels = [[{} for _ in range(slots)] for _ in range(levels)]
+        # key -> (level, slot) for O(1) cancel
+        self._where = {}
+        self._current = int(now / tick)
+
+    def __len__(self):
+        return len(self._where)
+
+    def __contains__(self, key):
+        return key in self._where
+
+    def schedule(self, key, deadline):
+        """Set (or move) the timer for key to fire at time deadline"""
+        self.cancel(key)
+        self._place(key, max(math.ceil(deadline / self.tick), self._current + 1))
+
+    def cancel(self, key):
+        where = self._where.pop(key, None)
+        if where is not None:
+            level, slot = where
+            del self._wheels[level][slot][key]
+
+    def _place(self, key, due):
+        spans = self._spans
+        delta = due - self._current
+        level = 0
+        while level < self.levels - 1 and delta >= spans[level + 1]:
+            level += 1
+        slot = (due // spans[level]) % self.slots
+        self._wheels[level][slot][key] = due
+        self._where[key] = (level, slot)
+
+    def advance(self, now):
+        """Move time forward to now; returns the keys whose timers fired"""
+        target = int(now / self.tick)
+        expired = []
+        spans, slots, wheels, where = self._spans, self.slots, self._wheels, self._where
+
+        while self._current < target:
+            self._current += 1
+            current = self._current
+
+            # A wrapped wheel hands the next slot of the level above down a level
+            for level in range(1, self.levels):
+                if current % spans[level]:
+                    break
+                slot = (current // spans[level]) % slots
+                bucket = wheels[level][slot]
+                if bucket:
+                    wheels[level][slot] = {}
+                    for key, due in bucket.items():
+                        del where[key]
+                        self._place(key, due)
+
+            slot = current % slots
+            bucket = wheels[0][slot]
+            if bucket:
+                wheels[0][slot] = {}
+                for key in bucket:
+                    del where[key]
+                expired.extend(bucket)
+
+        return expired
@@ -0,0 +1,114 @@
+# trie.py - Prefix Trie Over All Zone Policies for Zone Inference
+
+from array import array
+
+from policy_lang import is_expression
+
+# Child slot value for "no transition"
+NO_NODE = -1
+# Zone slot value for "none" / "more than one"
+NO_ZONE = -1
+
+ROOT = 0
+
+
+class PolicyTrie:
+    """
+    Prefix trie of every zone policy, stored as a dense node x symbol table.
+
+    Each node records how many zones are still possible after the prefix it
+    represents, the zone if exactly one remains, and the zone whose policy
+    ends there. A step is one table lookup, whatever the number of zones.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.symbols = tuple(config.auth_symbols)
+        self.num_symbols = len(self.symbols)
+        self.symbol_index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.zones = tuple(config.zone_policies)
+        # (zone, other_zone, kind) pairs that cannot be told apart: 'identical'
+        # policies, or 'prefix' when other_zone's policy is a prefix of zone's
+        self.conflicts = []
+        self._build()
+
+    def _build(self):
+        num_symbols = self.num_symbols
+        children = [NO_NODE] * num_symbols
+        candidates = [0]
+        only_zone = [NO_ZONE]
+        accept_zone = [NO_ZONE]
+        depth = [0]
+        # First zone inserted through each node, for conflict reports
+        first_zone = [NO_ZONE]
+
+        for zone_id, zone in enumerate(self.zones):
+            policy = self.config.zone_policies[zone]
+            # Expression policies have no single path to insert
+            if is_expression(policy):
+                continue
+            columns = [self.symbol_index.get(symbol) for symbol in policy]
+            # Empty policies and policies outside the alphabet can never be inferred
+            if not columns or None in columns:
+                continue
+
+            node = ROOT
+            for i, column in enumerate(columns):
+                child = children[node * num_symbols + column]
+                if child == NO_NODE:
+                    child = len(candidates)
+                    children[node * num_symbols + column] = child
+                    children.extend([NO_NODE] * num_symbols)
+                    candidates.append(0)
+                    only_zone.append(NO_ZONE)
+                    accept_zone.append(NO_ZONE)
+                    depth.append(depth[node] + 1)
+                    first_zone.append(zone_id)
+                elif accept_zone[child] != NO_ZONE and i + 1 < len(columns):
+                    # A shorter policy already ends on this path
+                    self.conflicts.append((zone, self.zones[accept_zone[child]], 'prefix'))
+
+                node = child
+                candidates[node] += 1
+                only_zone[node] = zone_id if candidates[node] == 1 else NO_ZONE
+
+            if accept_zone[node] != NO_ZONE:
+                self.conflicts.append((zone, self.zones[accept_zone[node]], 'identical'))
+            else:
+                if candidates[node] > 1:
+                    # A longer policy was inserted through this node earlier
+                    self.conflicts.append((self.zones[first_zone[node]], zone, 'prefix'))
+                accept_zone[node] = zone_id
+
+        self.children = array('i', children)
+        self.candidates = array('I', candidates)
+        self.only_zone = array('i', only_zone)
+        self.accept_zone = array('i', accept_zone)
+        self.depth = array('H', depth)
+        self.num_nodes = len(candidates)
+
+    def step(self, node, symbol):
+        """Follow one symbol from a node; NO_NODE if no policy continues"""
+        column = self.symbol_index.get(symbol)
+        if column is None:
+            return NO_NODE
+        return self.children[node * self.num_symbols + column]
+
+    def walk(self, sequence, node=ROOT):
+        """Follow a whole sequence from a node"""
+        for symbol in sequence:
+            node = self.step(node, symbol)
+            if node == NO_NODE:
+                break
+        return node
+
+    def is_ambiguous(self, node):
+        """More than one zone is still possible after this prefix"""
+        return self.candidates[node] > 1
+
+    def infer_zone(self, node):
+        """Zone granted at this node, else the only zone still possible, else None"""
+        zone_id = self.accept_zone[node]
+        if zone_id == NO_ZONE:
+            zone_id = self.only_zone[node]
+        return self.zones[zone_id] if zone_id != NO_ZONE else None
@@ -0,0 +1,180 @@
+# whatif.py - Replay History Against Current and Candidate Policies Side by Side
+
+import argparse
+import json
+import sys
+import time
+
+from engine import CompiledPolicyEngine, REJECTED, ACCEPTED, INVALID_SYMBOL, PAD_SYMBOL
+from replay import read_events
+
+# History is split into authentications by the current policies, which is how
+# the events were actually grouped when they happened. Each event's symbol is
+# decoded once into a code over the union of both alphabets; the current
+# engine steps on those codes as events stream in, and each finished
+# authentication's codes are buffered so the candidate engine can decide
+# whole chunks at once with vectorized table lookups (process_batch). A
+# candidate that accepts a prefix grants access; one still waiting for
+# symbols at the end counts as a denial.
+CHUNK = 65_536
+DECISIONS = ('REJECTED', 'ACCEPTED')
+
+
+class _Alphabet:
+    """Symbol codes shared by the current and candidate engines"""
+
+    def __init__(self, current, candidate):
+        self.symbols = list(current.symbols) + [s for s in candidate.symbols if s not in current.symbol_index]
+        self.codes = {symbol: code for code, symbol in enumerate(self.symbols)}
+        # Union code -> candidate column (INVALID_SYMBOL where the candidate lacks it)
+        self.to_candidate = bytearray([INVALID_SYMBOL]) * 256
+        for code, symbol in enumerate(self.symbols):
+            self.to_candidate[code] = candidate.symbol_index.get(symbol, INVALID_SYMBOL)
+
+    def decode(self, codes):
+        return [self.symbols[code] if code != INVALID_SYMBOL else '?' for code in codes]
+
+
+def _candidate_states(engine, alphabet, sequences, zones):
+    """Final candidate state per buffered authentication"""
+    try:
+        import numpy as np
+    except ImportError:
+        return [engine.run(alphabet.decode(codes), zone) for codes, zone in zip(sequences, zones)]
+
+    # Scatter every sequence into a padded matrix without a Python loop per symbol
+    lengths = np.fromiter(map(len, sequences), dtype=np.intp, count=len(sequences))
+    flat = np.frombuffer(b''.join(sequences), dtype=np.uint8)
+    flat = np.frombuffer(bytes(alphabet.to_candidate), dtype=np.uint8)[flat]
+    symbols = np.full((len(sequences), int(lengths.max(initial=0))), PAD_SYMBOL, dtype=np.uint8)
+    rows = np.repeat(np.arange(len(sequences)), lengths)
+    columns = np.arange(len(flat)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    symbols[rows, columns] = flat
+
+    num_zones = len(engine.zones)
+    zone_index = engine.zone_index
+    zone_ids = np.fromiter((-1 if zone is None else zone_index.get(zone, num_zones) for zone in zones),
+                           dtype=np.int32, count=len(zones))
+    states, _, _ = engine.process_batch(symbols, zone_ids)
+    return states.tolist()
+
+
+def _tally(report, pending, candidate, alphabet, samples):
+    zones = report['zones']
+    states = _candidate_states(candidate, alphabet, [item[2] for item in pending], [item[1] for item in pending])
+    for (door, zone, codes, started, before), state in zip(pending, states):
+        after = DECISIONS[state] if state <= ACCEPTED else 'INCOMPLETE'
+        counts = zones.get(zone)
+        if counts is None:
+            counts = zones[zone] = {'sessions': 0, 'granted_before': 0, 'granted_after': 0,
+                                    'grant_to_deny': 0, 'deny_to_grant': 0, 'samples': []}
+        counts['sessions'] += 1
+        granted_before = before == 'ACCEPTED'
+        granted_after = after == 'ACCEPTED'
+        counts['granted_before'] += granted_before
+        counts['granted_after'] += granted_after
+        if granted_before != granted_after:
+            counts['grant_to_deny' if granted_before else 'deny_to_grant'] += 1
+            if len(counts['samples']) < samples:
+                counts['samples'].append({'door': door, 'timestamp': started,
+                                          'sequence': ' '.join(alphabet.decode(codes)),
+                                          'current': before, 'candidate': after})
+    report['sessions'] += len(pending)
+    pending.clear()
+
+
+def simulate(events, candidate, current=None, samples=5):
+    """
+    Replay events under the current and the candidate engine in one pass
+    Returns: {'events', 'sessions', 'zones': {zone: diff counts and sample sessions}}
+    """
+    current = current or CompiledPolicyEngine()
+    alphabet = _Alphabet(current, candidate)
+    codes = alphabet.codes
+    table = current.table
+    num_symbols = current.num_symbols
+    report = {'events': 0, 'sessions': 0, 'zones': {}}
+    # door -> [zone, state, symbol codes, first timestamp]
+    open_sessions = {}
+    # (door, zone, symbol codes, first timestamp, current decision) awaiting the candidate
+    pending = []
+
+    for event in events:
+        report['events'] += 1
+        door = event['door']
+        code = codes.get(event['symbol'], INVALID_SYMBOL)
+        session = open_sessions.get(door)
+
+        if session is None:
+            zone = event.get('zone') or None
+            state = current.start_state(zone)
+            if state is None:
+                # Refused before any symbol was read, as in replay()
+                pending.append((door, zone, bytes((code,)), event.get('timestamp'), 'REJECTED'))
+                continue
+            session = open_sessions[door] = [zone, state, bytearray(), event.get('timestamp')]
+
+        session[2].append(code)
+        state = table[session[1] * num_symbols + code] if code < num_symbols else REJECTED
+        if state <= ACCEPTED:
+            del open_sessions[door]
+            pending.append((door, session[0], bytes(session[2]), session[3], DECISIONS[state]))
+            if len(pending) >= CHUNK:
+                _tally(report, pending, candidate, alphabet, samples)
+        else:
+            session[1] = state
+
+    for door, (zone, state, symbols, started) in open_sessions.items():
+        pending.append((door, zone, bytes(symbols), started, 'INCOMPLETE'))
+    _tally(report, pending, candidate, alphabet, samples)
+    return report
+
+
+def print_report(report, output=sys.stdout):
+    zones = report['zones']
+    changed = sorted((zone for zone, counts in zones.items() if counts['grant_to_deny'] or counts['deny_to_grant']),
+                     key=lambda zone: -(zones[zone]['grant_to_deny'] + zones[zone]['deny_to_grant']))
+
+    print(f"{report['events']:,} events, {report['sessions']:,} authentications, "
+          f"{len(changed):,} of {len(zones):,} zones change", file=output)
+    print(f"{'Zone':<24} {'Sessions':>10} {'Granted now':>12} {'Candidate':>10} {'Lost':>8} {'Gained':>8}",
+          file=output)
+    print("-" * 80, file=output)
+    for zone in changed:
+        counts = zones[zone]
+        print(f"{str(zone):<24} {counts['sessions']:>10,} {counts['granted_before']:>12,} "
+              f"{counts['granted_after']:>10,} {counts['grant_to_deny']:>8,} {counts['deny_to_grant']:>8,}",
+              file=output)
+        for sample in counts['samples']:
+            print(f"    {sample['door']} @ {sample['timestamp']}: {sample['sequence']} "
+                  f"({sample['current']} -> {sample['candidate']})", file=output)
+
+
+def main():
+    from policy_store import PolicyStore
+
+    parser = argparse.ArgumentParser(description="Show how a candidate policy set would change past decisions")
+    parser.add_argument('log', help="Event log (.jsonl or .csv)")
+    parser.add_argument('candidate', help="Candidate policy store file (JSON, CSV or binary)")
+    parser.add_argument('--current', metavar='PATH', help="Current policy store file (default: built-in zones)")
+    parser.add_argument('--format', choices=['jsonl', 'csv'], help="Log format (default: by extension)")
+    parser.add_argument('--samples', type=int, default=5, help="Sample sessions kept per zone")
+    parser.add_argument('--json', action='store_true', help="Print the full report as JSON")
+    args = parser.parse_args()
+
+    current = CompiledPolicyEngine(PolicyStore.load(args.current)) if args.current else CompiledPolicyEngine()
+    candidate = CompiledPolicyEngine(PolicyStore.load(args.candidate))
+
+    started = time.perf_counter()
+    report = simulate(read_events(args.log, args.format), candidate, current, args.samples)
+    elapsed = time.perf_counter() - started
+
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        print_report(report)
+    print(f"{report['events'] / elapsed:,.0f} events/s", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
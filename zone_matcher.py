@@ -0,0 +1,128 @@
+# zone_matcher.py - Bit-Parallel (Shift-And) Query for the Zones a Sequence Opens
+
+import argparse
+
+from engine import CompiledPolicyEngine, ACCEPTED
+from policy_lang import is_expression
+from zones import ZoneConfig
+
+
+class ZoneMatcher:
+    """
+    Answers "which zones would this sequence open?" for every zone at once.
+
+    All fixed policies are laid end to end in one big integer, one bit per
+    policy step. Reading symbol number i keeps bit j alive only if the
+    previous step's bit j-1 was alive and step j expects that symbol, so a
+    whole symbol is one shift and two ANDs over every zone together. When a
+    zone's last bit is alive, that zone's policy has been fully matched.
+
+    By default a zone counts as opened when process_sequence would accept it,
+    i.e. its policy is a prefix of the sequence (symbols after acceptance are
+    ignored). With exact=True the sequence must equal the policy. Expression
+    policies cannot be laid out as bits and are checked on the compiled table.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or ZoneConfig()
+        self.zones = tuple(self.config.zone_policies)
+        self.zone_index = {zone: i for i, zone in enumerate(self.zones)}
+        symbols = tuple(self.config.auth_symbols)
+
+        # symbol -> bits of every policy step expecting it
+        masks = dict.fromkeys(symbols, 0)
+        first_bits = 0
+        last_bits = 0
+        # last bit number -> zones whose policy ends there (identical policies share bits)
+        self._zones_at = {}
+        layout = {}
+        self.expression_zones = []
+        offset = 0
+        for zone in self.zones:
+            policy = self.config.zone_policies[zone]
+            if is_expression(policy):
+                self.expression_zones.append(zone)
+                continue
+            if not policy:
+                continue
+            key = tuple(policy)
+            if key in layout:
+                self._zones_at[layout[key]].append(zone)
+                continue
+            for step, symbol in enumerate(policy):
+                if symbol in masks:
+                    masks[symbol] |= 1 << (offset + step)
+            first_bits |= 1 << offset
+            offset += len(policy)
+            last_bits |= 1 << (offset - 1)
+            layout[key] = offset - 1
+            self._zones_at[offset - 1] = [zone]
+
+        self.masks = masks
+        self.first_bits = first_bits
+        self._not_first_bits = ~first_bits
+        self.last_bits = last_bits
+        self.num_bits = offset
+        self.engine = CompiledPolicyEngine(self.config) if self.expression_zones else None
+
+    def _zones(self, bits):
+        zones = []
+        zones_at = self._zones_at
+        while bits:
+            low = bits & -bits
+            zones.extend(zones_at[low.bit_length() - 1])
+            bits ^= low
+        return zones
+
+    def match_bits(self, sequence, exact=False):
+        """Bitmask of policy end bits matched by sequence (fixed policies only)"""
+        masks = self.masks
+        not_first_bits = self._not_first_bits
+        last_bits = self.last_bits
+        opened = 0
+        alive = None
+        for symbol in sequence:
+            mask = masks.get(symbol, 0)
+            if alive is None:
+                alive = self.first_bits & mask
+            else:
+                # A shift out of one policy's last step must not start the next policy
+                alive = (alive << 1) & not_first_bits & mask
+            if not alive:
+                return 0 if exact else opened
+            opened |= alive & last_bits
+        return (alive or 0) & last_bits if exact else opened
+
+    def matching_zones(self, sequence, exact=False):
+        """Zones (in config order) whose policy the sequence satisfies"""
+        sequence = list(sequence)
+        matched = set(self._zones(self.match_bits(sequence, exact)))
+        for zone in self.expression_zones:
+            if exact:
+                # run() stops at acceptance, so also require that every symbol was used
+                if (sequence and self.engine.run(sequence, zone) == ACCEPTED
+                        and self.engine.run(sequence[:-1], zone) != ACCEPTED):
+                    matched.add(zone)
+            elif self.engine.accepts(sequence, zone):
+                matched.add(zone)
+        return sorted(matched, key=self.zone_index.__getitem__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List the zones an authentication sequence would open")
+    parser.add_argument('symbols', nargs='+', help="Symbols, e.g. C P F V")
+    parser.add_argument('--policies', metavar='PATH', help="Policy store file (default: built-in zones)")
+    parser.add_argument('--exact', action='store_true', help="Require the sequence to equal the policy")
+    args = parser.parse_args()
+
+    if args.policies:
+        from policy_store import PolicyStore
+        config = PolicyStore.load(args.policies)
+    else:
+        config = ZoneConfig()
+
+    zones = ZoneMatcher(config).matching_zones(args.symbols, args.exact)
+    print('\n'.join(zones) if zones else "No zone is opened by this sequence")
+
+if __name__ == "__main__":
+    main()
@@ -29,6 +29,9 @@ class ZoneConfig:
     def get_zones(self):
         return list(self.zone_policies.keys())
     
+    def has_zone(self, zone):
+        return zone in self.zone_policies
+    
     def get_policy(self, zone):
         return self.zone_policies.get(zone, [])
     